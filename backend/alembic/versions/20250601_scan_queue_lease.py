@@ -0,0 +1,35 @@
+"""Durable OCR job queue — lease/heartbeat columns on receiptscan
+
+Revision ID: 20250601_scan_queue_lease
+Revises: 20250511_scan_status_enum
+Create Date: 2026-06-01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20250601_scan_queue_lease"
+down_revision: Union[str, Sequence[str], None] = "20250511_scan_status_enum"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("receiptscan", sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("receiptscan", sa.Column("locked_by", sa.String(), nullable=True))
+    op.add_column("receiptscan", sa.Column("lease_expires_at", sa.DateTime(), nullable=True))
+    op.add_column("receiptscan", sa.Column("heartbeat_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_receiptscan_status_lease", "receiptscan", ["status", "lease_expires_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_receiptscan_status_lease", table_name="receiptscan")
+    op.drop_column("receiptscan", "heartbeat_at")
+    op.drop_column("receiptscan", "lease_expires_at")
+    op.drop_column("receiptscan", "locked_by")
+    op.drop_column("receiptscan", "attempts")
@@ -0,0 +1,42 @@
+"""Description → category memo for bank imports
+
+Revision ID: 20250615_category_memo
+Revises: 20250601_scan_queue_lease
+Create Date: 2026-06-15
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20250615_category_memo"
+down_revision: Union[str, Sequence[str], None] = "20250601_scan_queue_lease"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "category_memo",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("budget_id", sa.Integer(), nullable=False),
+        sa.Column("normalized_description", sa.String(), nullable=False),
+        sa.Column("category_id", sa.Integer(), nullable=False),
+        sa.Column("hit_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_used", sa.DateTime(), nullable=False),
+        sa.Column("source", sa.String(), nullable=False, server_default="ai"),
+        sa.ForeignKeyConstraint(["budget_id"], ["budget.id"]),
+        sa.ForeignKeyConstraint(["category_id"], ["category.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("budget_id", "normalized_description", name="uq_category_memo_budget_description"),
+    )
+    op.create_index("ix_category_memo_budget_id", "category_memo", ["budget_id"], unique=False)
+    op.create_index("ix_category_memo_category_id", "category_memo", ["category_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_category_memo_category_id", table_name="category_memo")
+    op.drop_index("ix_category_memo_budget_id", table_name="category_memo")
+    op.drop_table("category_memo")
@@ -0,0 +1,47 @@
+"""Append-only corrections recorded at receipt verification
+
+Revision ID: 20250620_verification_correction
+Revises: 20250615_category_memo
+Create Date: 2026-06-20
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "20250620_verification_correction"
+down_revision: Union[str, Sequence[str], None] = "20250615_category_memo"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "verification_correction",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("budget_id", sa.Integer(), nullable=False),
+        sa.Column("transaction_id", sa.Integer(), nullable=True),
+        sa.Column("field", sa.String(), nullable=False),
+        sa.Column("line_index", sa.Integer(), nullable=True),
+        sa.Column("original", sa.String(), nullable=True),
+        sa.Column("corrected", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["budget_id"], ["budget.id"]),
+        sa.ForeignKeyConstraint(["transaction_id"], ["transaction.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_verification_correction_lookup", "verification_correction",
+        ["budget_id", "field", "original"], unique=False,
+    )
+    op.create_index(
+        "ix_verification_correction_transaction_id", "verification_correction", ["transaction_id"], unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_verification_correction_transaction_id", table_name="verification_correction")
+    op.drop_index("ix_verification_correction_lookup", table_name="verification_correction")
+    op.drop_table("verification_correction")
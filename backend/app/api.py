@@ -4,14 +4,11 @@ import logging
 import shutil
 import os
 import hashlib
-import csv
-import io
 import re
 import time
-from pypdf import PdfReader
 from uuid import uuid4
 from datetime import datetime, timezone, timedelta
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, BackgroundTasks, Path
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Path, Query
 from fastapi.responses import FileResponse
 from sqlmodel import Session, select, desc, col
 from sqlalchemy import extract, func
@@ -26,15 +23,23 @@ from .models import (
     BudgetMemberCreate, BudgetMemberRead
 )
 from .database import get_session, get_ops_session, operations_engine
-from .services import AIService
+from .services import AIService, AsyncAIService, BankStatementError
+from .scan_queue import enqueue_scan
+from .ocr_executor import get_ocr_executor
+from .ocr_batcher import extract_ocr_batched, get_vision_batcher
+from .ocr_pipeline import ReceiptSource, ReceiptSourceDetector, is_transport_error
+from .ocr_cache import cache_stats, get_ocr_archive, get_ocr_cache
+from .reparse import apply_parsed_receipt, reparse_scans
+from .bank_formats import coerce_rows, parse_statement
+from .category_memo import forget_categories, import_description, lookup_categories, remember_categories
+from .category_classifier import classify_descriptions, learn_examples, learn_verified_transaction
+from .corrections import detach_corrections, record_corrections, snapshot
 from .auth import get_current_user, hash_password, verify_password, create_access_token
 from .config import settings
 from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
-_semaphore = asyncio.Semaphore(settings.OCR_WORKER_CONCURRENCY)
-
 router = APIRouter()
 # Ensure UPLOAD_DIR is robustly handled
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -46,6 +51,16 @@ def health_check():
     return {"status": "ok", "message": "Backend is running!"}
 
 
+@router.get("/ocr/cache/stats")
+def ocr_cache_stats(current_user: User = Depends(get_current_user)):
+    """OCR result cache: per-stage hit/miss counters (this process) and on-disk store size."""
+    cache = get_ocr_cache()
+    return {
+        "stages": cache_stats.snapshot(),
+        "store": cache.stats() if cache else None,
+    }
+
+
 # --- DEPENDENCY: resolve current user's budget (lazy-create if missing) ---
 
 def get_current_budget(
@@ -159,6 +174,45 @@ def _set_scan_status(scan_id: int, status: ScanStatus, error_message: str | None
             s.commit()
 
 
+async def _run_receipt_pipeline(scan_id: int, image_path: str, cat_dicts: list[dict]) -> Optional[dict]:
+    # Dedicated executor: on job timeout the pipeline process is killed, not left running
+    executor = get_ocr_executor()
+    batcher = get_vision_batcher()
+    # PDFs are read from their text layer inside the pipeline — nothing to batch
+    if batcher is None or ReceiptSourceDetector.detect(image_path) == ReceiptSource.PDF_TEXT:
+        return await executor.run(AIService.parse_receipt, image_path, cat_dicts)
+
+    # OCR joins a shared Vision batch on this loop; parsing still runs on the executor
+    try:
+        with open(image_path, "rb") as f:
+            image_bytes = f.read()
+    except OSError as e:
+        logger.error("Error reading image", extra={"scan_id": scan_id, "error": str(e)})
+        return None
+    try:
+        result, cache_hit = await extract_ocr_batched(batcher, image_bytes)
+    except Exception as e:
+        # A failed transport is worth retrying with Vision
+        if is_transport_error(e):
+            logger.warning("Vision batch unreachable, using single-image pipeline", extra={"scan_id": scan_id, "error": str(e)})
+            return await executor.run(AIService.parse_receipt, image_path, cat_dicts)
+        # A per-image annotate error would fail again: AI vision, as the single-image pipeline does
+        if isinstance(e, RuntimeError):
+            logger.warning("Batched OCR failed, falling back to AI vision", extra={"scan_id": scan_id, "error": str(e)})
+            return await executor.run(AIService.ai_vision_fallback_for_upload, image_bytes, cat_dicts)
+        logger.error("Batched OCR failed", extra={"scan_id": scan_id, "error": str(e)})
+        return None
+
+    try:
+        data = await executor.run(AIService.parse_ocr_result, result, cat_dicts)
+    except RuntimeError as e:
+        logger.error("Receipt parsing failed", extra={"scan_id": scan_id, "error": str(e)})
+        return None
+    if data is not None:
+        data["_ocr_cache"] = "hit" if cache_hit else "miss"
+    return data
+
+
 async def _process_scan(scan_id: int, transaction_id: int, image_path: str) -> None:
     _set_scan_status(scan_id, ScanStatus.RUNNING)
     logger.info("OCR job started", extra={"scan_id": scan_id, "transaction_id": transaction_id})
@@ -180,9 +234,7 @@ async def _process_scan(scan_id: int, transaction_id: int, image_path: str) -> N
         cat_dicts = [{"id": c.id, "name": c.name} for c in db_categories]
 
         stage_start = time.monotonic()
-        data = await asyncio.get_running_loop().run_in_executor(
-            None, lambda: AIService.parse_receipt(image_path, categories=cat_dicts)
-        )
+        data = await _run_receipt_pipeline(scan_id, image_path, cat_dicts)
         logger.info(
             "OCR completed",
             extra={"scan_id": scan_id, "duration_ms": int((time.monotonic() - stage_start) * 1000)},
@@ -193,32 +245,21 @@ async def _process_scan(scan_id: int, transaction_id: int, image_path: str) -> N
             _set_scan_status(scan_id, ScanStatus.FAILED, error_message="pipeline returned no data")
             return
 
-        _set_scan_status(scan_id, ScanStatus.OCR_OK)
-
-        merchant = data.get("merchant_name") or "Unknown"
-        total = data.get("total_amount", 0.0)
+        if "_ocr_cache" in data:
+            cache_stats.record("ocr", hit=data["_ocr_cache"] == "hit")
 
-        validation = data.get("_validation", {})
-        val_is_valid = validation.get("is_valid", True)
-        val_issues = validation.get("issues", [])
-        val_message = validation.get("message")
+        _set_scan_status(scan_id, ScanStatus.OCR_OK)
 
         stage_start = time.monotonic()
         scan2 = session.get(ReceiptScan, scan_id)
         if not scan2:
             return
-        scan2.status = ScanStatus.PARSING_OK
-
-        if not val_is_valid:
-            logger.warning("Validation failed", extra={"scan_id": scan_id, "message": val_message})
-            scan2.status = ScanStatus.FAILED
-            scan2.validation_message = val_message
-            transaction.merchant_name = merchant
-            transaction.total_amount = total
-            transaction.currency = data.get("currency", "PLN")
-            session.add(scan2)
-            session.add(transaction)
-            session.commit()
+        cat_name_to_id = {c.name.lower(): c.id for c in db_categories}
+        is_valid = apply_parsed_receipt(session, scan2, transaction, data, cat_name_to_id)
+        session.commit()
+
+        if not is_valid:
+            logger.warning("Validation failed", extra={"scan_id": scan_id, "message": scan2.validation_message})
             logger.info(
                 "Parsing stage completed (failed validation)",
                 extra={"scan_id": scan_id, "duration_ms": int((time.monotonic() - stage_start) * 1000)},
@@ -226,64 +267,29 @@ async def _process_scan(scan_id: int, transaction_id: int, image_path: str) -> N
             return
 
         logger.info(
-            "Parsing stage completed",
-            extra={"scan_id": scan_id, "duration_ms": int((time.monotonic() - stage_start) * 1000)},
-        )
-
-        stage_start = time.monotonic()
-        transaction.merchant_name = merchant
-        transaction.total_amount = total
-        transaction.currency = data.get("currency", "PLN")
-        scan2.status = ScanStatus.NEEDS_REVIEW
-        scan2.validation_message = val_message if val_issues else None
-
-        ai_date_str = data.get("date")
-        if ai_date_str:
-            try:
-                transaction.date = datetime.strptime(ai_date_str, "%Y-%m-%d")
-            except (ValueError, TypeError):
-                logger.warning("Could not parse AI date", extra={"scan_id": scan_id, "date": ai_date_str})
-
-        cat_name_to_id = {c.name.lower(): c.id for c in db_categories}
-        for item_raw in data.get("items", []):
-            category_name = item_raw.get("category", "")
-            cat_id = cat_name_to_id.get(category_name.lower()) if category_name else None
-            session.add(TransactionLine(
-                name=item_raw.get("name", "Unknown item"),
-                price=float(item_raw.get("price", 0.0)),
-                quantity=float(item_raw.get("quantity", 1.0)),
-                category_id=cat_id,
-                transaction_id=transaction.id,
-            ))
-
-        session.add(transaction)
-        session.add(scan2)
-        session.commit()
-        logger.info(
-            "Categorization stage completed",
+            "Parsing and categorization stages completed",
             extra={"scan_id": scan_id, "duration_ms": int((time.monotonic() - stage_start) * 1000)},
         )
         logger.info("OCR job finished — NEEDS_REVIEW", extra={"scan_id": scan_id, "transaction_id": transaction_id})
 
 
-async def _run_with_semaphore(scan_id: int, transaction_id: int, image_path: str) -> None:
-    async with _semaphore:
-        try:
-            await asyncio.wait_for(
-                _process_scan(scan_id, transaction_id, image_path),
-                timeout=settings.OCR_JOB_TIMEOUT_SECONDS,
-            )
-        except asyncio.TimeoutError:
-            logger.error(
-                "OCR job timed out",
-                extra={"scan_id": scan_id, "timeout_s": settings.OCR_JOB_TIMEOUT_SECONDS},
-            )
-            _set_scan_status(scan_id, ScanStatus.FAILED, error_message="timeout")
+async def _run_with_timeout(scan_id: int, transaction_id: int, image_path: str) -> None:
+    try:
+        await asyncio.wait_for(
+            _process_scan(scan_id, transaction_id, image_path),
+            timeout=settings.OCR_JOB_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        logger.error(
+            "OCR job timed out",
+            extra={"scan_id": scan_id, "timeout_s": settings.OCR_JOB_TIMEOUT_SECONDS},
+        )
+        _set_scan_status(scan_id, ScanStatus.FAILED, error_message="timeout")
 
 
 async def process_transaction_in_background(transaction_id: int, scan_id: int, image_path: str) -> None:
-    """Async entry point for BackgroundTasks — wraps the worker with semaphore and timeout."""
-    await _run_with_semaphore(scan_id, transaction_id, image_path)
+    """Scan queue handler — runs one claimed job with the job timeout (concurrency is capped by the queue)."""
+    await _run_with_timeout(scan_id, transaction_id, image_path)
 
 
 
@@ -345,12 +351,12 @@ def create_manual_transaction(
 
     session.commit()
     session.refresh(transaction)
+    learn_verified_transaction(session, current_budget.id, transaction)
     return transaction
 
 
 @router.post("/transactions/scan", response_model=TransactionRead)
 async def scan_transaction(
-    background_tasks: BackgroundTasks,
     force: bool = False,
     note: Optional[str] = Form(None),
     file: UploadFile = File(...),
@@ -403,17 +409,12 @@ async def scan_transaction(
     scan = ReceiptScan(
         transaction_id=new_transaction.id,
         image_path=file_path,
-        status=ScanStatus.QUEUED,
         content_hash=file_hash,
         # keep_image defaults to False; final decision is made by user at verify time
     )
-    session.add(scan)
+    # Picked up by a ScanQueueWorker (embedded in the API or `python -m app.worker`)
+    enqueue_scan(session, scan)
     session.commit()
-    session.refresh(scan)
-
-    if scan.id is None:
-        raise HTTPException(status_code=500, detail="Failed to create receipt scan")
-    background_tasks.add_task(process_transaction_in_background, new_transaction.id, scan.id, file_path)
 
     session.refresh(new_transaction)
     return new_transaction
@@ -422,7 +423,6 @@ async def scan_transaction(
 @router.post("/transactions/{transaction_id}/retry", response_model=TransactionRead)
 async def retry_transaction(
     transaction_id: int,
-    background_tasks: BackgroundTasks,
     session: Session = Depends(get_ops_session),
     current_user: User = Depends(get_current_user),
     current_budget: Budget = Depends(get_current_budget),
@@ -448,21 +448,38 @@ async def retry_transaction(
     if not scan.image_path or not os.path.exists(scan.image_path):
         raise HTTPException(status_code=404, detail="Original image file not found. Please re-upload.")
 
-    scan.status = ScanStatus.QUEUED
-    scan.error_message = None
-    session.add(scan)
+    enqueue_scan(session, scan)
     session.commit()
     session.refresh(transaction)
 
-    if transaction.id is None:
-        raise HTTPException(status_code=500, detail="Invalid transaction state")
-    if scan.id is None:
-        raise HTTPException(status_code=500, detail="Invalid scan state")
-    background_tasks.add_task(process_transaction_in_background, transaction.id, scan.id, scan.image_path)
-
     return transaction
 
 
+@router.post("/transactions/reparse", response_model=dict)
+def reparse_transactions(
+    apply: bool = False,
+    batch_size: int = Query(200, ge=1, le=1000),
+    session: Session = Depends(get_ops_session),
+    current_user: User = Depends(get_current_user),
+    current_budget: Budget = Depends(get_current_budget),
+):
+    """
+    Re-run deterministic parsers over this budget's receipts from stored OCR words (no OCR/AI calls).
+    Dry run by default; apply=true rewrites unverified scans. Budget owner only.
+    Scans without stored OCR words (OCR'd before they were archived and evicted from the
+    cache) are counted as skipped_no_ocr — retry them to OCR them again.
+    """
+    if not current_budget:
+        raise HTTPException(status_code=404, detail="Budget not found")
+    if current_budget.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the budget owner can re-parse receipts")
+    try:
+        report = reparse_scans(session, budget_id=current_budget.id, batch_size=batch_size, apply=apply)
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return report.to_dict()
+
+
 @router.get("/transactions", response_model=List[TransactionRead])
 async def get_transactions(
     limit: int = 50,
@@ -580,6 +597,8 @@ async def verify_transaction(
     if not scan:
         raise HTTPException(status_code=404, detail="Receipt scan record not found")
 
+    before = snapshot(db_transaction)
+
     # Apply transaction field updates
     update_data = body.transaction_update.model_dump(exclude_unset=True, exclude={"tag_ids"})
     for key, value in update_data.items():
@@ -612,6 +631,11 @@ async def verify_transaction(
     session.commit()
     session.refresh(db_transaction)
 
+    # Learning loop: keep the diff against the parsed values and feed the local classifiers
+    record_corrections(session, db_transaction, before)
+    session.commit()
+    await asyncio.to_thread(learn_verified_transaction, session, current_budget.id, db_transaction)
+
     # Delete image only if user did not request to keep it
     if not scan.keep_image and scan.image_path and os.path.exists(scan.image_path):
         try:
@@ -647,6 +671,11 @@ async def update_transaction(
     for key, value in transaction_data.items():
         setattr(db_transaction, key, value)
 
+    # A category picked by the user for an imported row is remembered for future imports
+    description = import_description(db_transaction)
+    if transaction_data.get("category_id") is not None and description:
+        remember_categories(session, current_budget.id, {description: transaction_data["category_id"]}, source="user")
+
     if transaction_update.tag_ids is not None:
         tags = session.exec(select(Tag).where(col(Tag.id).in_(transaction_update.tag_ids))).all()
         db_transaction.tags = list(tags)
@@ -654,6 +683,10 @@ async def update_transaction(
     session.add(db_transaction)
     session.commit()
     session.refresh(db_transaction)
+    # User-chosen categories (imported rows, manual entries) train the import classifier
+    example = description or (db_transaction.merchant_name if db_transaction.is_manual else None)
+    if transaction_data.get("category_id") is not None and example:
+        await asyncio.to_thread(learn_examples, session, current_budget.id, [(example, transaction_data["category_id"])])
     return db_transaction
 
 
@@ -711,10 +744,16 @@ async def delete_transaction(
                 os.remove(scan.image_path)
             except OSError:
                 pass
+        archive = get_ocr_archive()
+        if archive and scan.content_hash and not session.exec(
+            select(ReceiptScan.id).where(ReceiptScan.content_hash == scan.content_hash, ReceiptScan.id != scan.id)
+        ).first():
+            archive.delete(scan.content_hash)
         session.delete(scan)
 
     for line in transaction.lines:
         session.delete(line)
+    detach_corrections(session, transaction_id)
 
     session.delete(transaction)
     session.commit()
@@ -723,80 +762,23 @@ async def delete_transaction(
 
 # --- IMPORT ---
 
-def parse_ing_pdf_text(text: str) -> list[dict]:
-    """
-    Robust multiline parser for ING individual bank statements.
-    Refined to strictly separate Contractor, Title, and Amount.
-    """
-    transactions = []
-    
-    # 1. Pattern starts with two dates (DD.MM.YYYY)
-    # 2. Mid text is captured lazily
-    # 3. Amount is strictly matched: optional minus, then 1-3 digits, then optional groups of 3 digits separated by space, then comma, then 2 digits.
-    # This prevents merging long transaction IDs with the amount.
-    pattern = re.compile(
-        r"(\d{2}\.\d{2}\.\d{4})\s+(\d{2}\.\d{2}\.\d{4})\s+(.*?)\s+(-?\d{1,3}(?:[\s\xa0]\d{3})*[.,]\d{2})\s+PLN",
-        re.DOTALL | re.MULTILINE
-    )
-    
-    for match in pattern.finditer(text):
-        date_str, posting_date, mid_text, amount_str = match.groups()
-        
-        # Clean amount: "1 234,56" -> "1234.56"
-        clean_amount = amount_str.replace(",", ".").replace(" ", "").replace("\xa0", "")
-        try:
-            amount = float(clean_amount)
-        except ValueError:
-            continue
+def _import_row(row: dict) -> dict:
+    """A parsed statement row with its deduplication hash."""
+    date_str = row["date"]
+    merchant = row["merchant"]
+    title = row["title"]
+    amount = row["amount"]
 
-        # Convert DD.MM.YYYY -> YYYY-MM-DD
-        try:
-            d_parts = date_str.split(".")
-            iso_date = f"{d_parts[2]}-{d_parts[1]}-{d_parts[0]}"
-        except IndexError:
-            continue
-            
-        # --- CLEANING MID_TEXT (Separating Contractor and Title) ---
-        lines = [line.strip() for line in mid_text.split("\n") if line.strip()]
-        
-        # Noise filters for technical bank data:
-        noise_patterns = [
-            r"^\d{8}-\d+.*",           # Technical IDs (10500031-...)
-            r"^\d{10,}.*",             # Long unspaced account numbers or IDs
-            r"^\d{2}[\s\xa0]\d{4}.*",  # Spaced account numbers
-            r"^Nazwa i adres.*",       # Field labels
-            r"^Data księgowania.*",    # Header leftovers
-            r"^Szczegóły / nr.*",      # Header leftovers
-            r"^(TR\.KART|TR\.BLIK|PRZELEW|P\.BLIK|ST\.ZLEC)$", # Transaction types (Details column)
-        ]
-        
-        clean_lines = []
-        for line in lines:
-            # Check if line is purely technical noise
-            is_noise = any(re.match(p, line, re.IGNORECASE) for p in noise_patterns)
-            if not is_noise:
-                # Remove static labels if they appear inline
-                line = re.sub(r"Nazwa i adres (odbiorcy|płatnika):\s*", "", line, flags=re.IGNORECASE)
-                clean_lines.append(line.strip())
-        
-        if not clean_lines:
-            merchant = "Przelew/Transakcja"
-            title = mid_text.strip().replace("\n", " ")[:100]
-        else:
-            # First line is usually the Contractor/Merchant
-            merchant = clean_lines[0]
-            # Rest is the Title/Description
-            title = " ".join(clean_lines[1:]) if len(clean_lines) > 1 else merchant
-        
-        transactions.append({
-            "date": iso_date,
-            "merchant": merchant[:100],
-            "title": title[:200],
-            "amount": amount,
-            "currency": "PLN"
-        })
-        
-    return transactions
+    # Unique hash for deduplication (formats read before the registry keep their raw-cell key)
+    raw_hash = (row.get("dedup_key") or f"{date_str}_{amount}_{merchant}_{title}").strip()
+    return {
+        "date_str": date_str,
+        "amount": amount,
+        "merchant": merchant,
+        "title": title,
+        "currency": row["currency"],
+        "hash": hashlib.sha256(raw_hash.encode()).hexdigest()
+    }
 
 
 def detect_transaction_type(merchant: str, title: str, amount: float, user_names: list[str]) -> str:
@@ -855,111 +837,30 @@ async def import_transactions(
         user_names.append(f"{name_parts[0]} {name_parts[1]}")
         user_names.append(f"{name_parts[1]} {name_parts[0]}")
     
-    rows_to_process = []
-    
-    if filename.lower().endswith(".pdf"):
-        # --- PDF Functional Parsing ---
-        try:
-            reader = PdfReader(io.BytesIO(content))
-            full_text = ""
-            for page in reader.pages:
-                full_text += page.extract_text() + "\n"
-            
-            # Use regex-based parser (no AI here)
-            extracted_rows = parse_ing_pdf_text(full_text)
-            
-            for row in extracted_rows:
-                date_str = row["date"]
-                merchant = row["merchant"]
-                title = row["title"]
-                amount = row["amount"]
-                currency = row["currency"]
-                
-                # Unique hash for deduplication
-                raw_hash = f"{date_str}_{amount}_{merchant}_{title}".strip()
-                row_hash = hashlib.sha256(raw_hash.encode()).hexdigest()
-                
-                rows_to_process.append({
-                    "date_str": date_str,
-                    "amount": amount,
-                    "merchant": merchant,
-                    "title": title,
-                    "currency": currency,
-                    "hash": row_hash
-                })
-        except Exception as e:
-            print(f"❌ PDF Parse Error: {e}")
-            raise HTTPException(status_code=400, detail=f"Failed to parse PDF: {str(e)}")
-            
+    # --- Deterministic parsers (bank_formats registry); AI only for unrecognised files ---
+    try:
+        statement = await asyncio.to_thread(parse_statement, content, filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Statement Parse Error: {e}")
+        raise HTTPException(status_code=400, detail=f"Failed to parse file: {str(e)}")
+
+    if statement.format is not None:
+        print(f"🏦 Statement format: {statement.format} ({len(statement.rows)} rows)")
+        parsed_rows = statement.rows
     else:
-        # --- CSV Parsing logic (ING fallback) ---
-        text_content = ""
-        for encoding in ["utf-8", "windows-1250", "iso-8859-2"]:
-            try:
-                text_content = content.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-                
-        if not text_content:
-            raise HTTPException(status_code=400, detail="Could not decode CSV file. Use UTF-8 or Windows-1250.")
-            
-        f = io.StringIO(text_content)
+        print("🧠 Unrecognised statement format. Falling back to AI extraction...")
         try:
-            dialect = csv.Sniffer().sniff(text_content[:2000]) if len(text_content) > 10 else "excel"
-        except Exception:
-            dialect = "excel"
-            
-        reader = csv.DictReader(f, dialect=dialect)
-        headers = reader.fieldnames or []
-        
-        ing_keys = {
-            "date": ["Data transakcji", "Transaction date", "Data"],
-            "merchant": ["Dane kontrahenta", "Contractor details", "Kontrahent"],
-            "title": ["Tytuł", "Title", "Opis"],
-            "amount": ["Kwota transakcji (waluta)", "Transaction amount", "Kwota"],
-            "currency": ["Waluta", "Currency"]
-        }
-        
-        def find_key(headers, targets):
-            for h in headers:
-                for t in targets:
-                    if t.lower() in h.lower():
-                        return h
-            return None
-
-        mapped_keys = {k: find_key(headers, v) for k, v in ing_keys.items()}
-        
-        if not mapped_keys["date"] or not mapped_keys["amount"]:
-             raise HTTPException(status_code=400, detail=f"Required columns not found. Headers: {headers}")
+            parsed_rows = list(coerce_rows(await AsyncAIService.parse_bank_statement_text(statement.text)))
+        except BankStatementError as e:
+            print(f"❌ AI statement extraction incomplete: {e}")
+            raise HTTPException(
+                status_code=502,
+                detail="Could not read part of the statement. Nothing was imported — please try again.",
+            )
 
-        for row in reader:
-            try:
-                date_str = row.get(mapped_keys["date"])
-                merchant = row.get(mapped_keys["merchant"], "")
-                title = row.get(mapped_keys["title"], "")
-                amount_str = row.get(mapped_keys["amount"], "0")
-                currency = row.get(mapped_keys["currency"], "PLN")
-                
-                if not date_str or not amount_str:
-                    continue
-                    
-                clean_amount = amount_str.replace(",", ".").replace(" ", "").replace("\xa0", "")
-                amount = float(clean_amount)
-                
-                raw_hash = f"{date_str}_{amount}_{merchant}_{title}".strip()
-                row_hash = hashlib.sha256(raw_hash.encode()).hexdigest()
-                
-                rows_to_process.append({
-                    "date_str": date_str,
-                    "amount": amount,
-                    "merchant": merchant,
-                    "title": title,
-                    "currency": currency,
-                    "hash": row_hash
-                })
-            except (ValueError, TypeError):
-                continue
+    rows_to_process = [_import_row(row) for row in parsed_rows]
 
     # --- Common processing (Deduplication, AI Categorization) ---
     
@@ -993,32 +894,36 @@ async def import_transactions(
     ai_mapping = {}
     
     if not is_pdf:
-        # --- LOCAL CACHE: Check history for these descriptions ---
-        # Fetch recent transactions with categories to learn from them
-        history_stmt = select(Transaction.merchant_name, Transaction.category_id).where(
-            Transaction.budget_id == current_budget.id,
-            Transaction.category_id is not None
-        ).order_by(desc(Transaction.date)).limit(500)
-        history = session.exec(history_stmt).all()
-        
-        # Map: "description" -> "category_name"
-        local_mapping = {h[0].lower(): id_to_cat_name.get(h[1]) for h in history if h[1] in id_to_cat_name}
-        
+        # --- LOCAL CACHE: description → category memo (AI answers + user corrections) ---
+        memo_hits = lookup_categories(session, current_budget.id, unique_descriptions)
         descriptions_to_query = []
-        
+
         for desc_text in unique_descriptions:
-            cached_cat = local_mapping.get(desc_text.lower())
+            memo_cat_id = memo_hits.get(desc_text)
+            cached_cat = id_to_cat_name.get(memo_cat_id) if memo_cat_id is not None else None
             if cached_cat:
                 ai_mapping[desc_text] = cached_cat
             else:
                 descriptions_to_query.append(desc_text)
-                
+
+        # --- LOCAL CLASSIFIER: trigram nearest neighbour over the budget's history ---
+        if descriptions_to_query:
+            predicted = classify_descriptions(session, current_budget.id, descriptions_to_query)
+            for desc_text, cat_id in predicted.items():
+                if cat_id in id_to_cat_name:
+                    ai_mapping[desc_text] = id_to_cat_name[cat_id]
+            descriptions_to_query = [d for d in descriptions_to_query if d not in ai_mapping]
+
         # AI Batching ONLY for unknown descriptions
         if descriptions_to_query:
-            print(f"🧠 Asking AI for {len(descriptions_to_query)} new descriptions...")
-            for i in range(0, len(descriptions_to_query), 50):
-                batch = descriptions_to_query[i : i+50]
-                ai_mapping.update(AIService.categorize_descriptions(batch, categories=cat_dicts))
+            print(f"🧠 Asking AI for {len(descriptions_to_query)} new descriptions ({len(ai_mapping)} from memo/classifier)...")
+            ai_answers = await AsyncAIService.categorize_many(descriptions_to_query, categories=cat_dicts)
+            ai_mapping.update(ai_answers)
+            remember_categories(session, current_budget.id, {
+                d: cat_name_to_id[name.lower()]
+                for d, name in ai_answers.items()
+                if isinstance(name, str) and cat_name_to_id.get(name.lower()) is not None
+            }, source="ai")
         else:
             print("⚡ All descriptions found in local cache. Skipping AI.")
     else:
@@ -1434,6 +1339,7 @@ async def delete_category(
         sub.parent_id = target_category_id
         session.add(sub)
 
+    forget_categories(session, [category_id])
     session.delete(category)
     session.commit()
     return None
@@ -0,0 +1,396 @@
+# backend/app/bank_formats.py
+"""
+Registry of bank statement formats for /transactions/import.
+
+Each format has a cheap fingerprint — the CSV header row, or the text of the
+first PDF page — and a deterministic parser that streams rows: CSV records are
+read one at a time, PDF pages as extract_pdf_pages() yields them. Only a file
+no format recognises reaches the AI (AsyncAIService.parse_bank_statement_text).
+
+Rows are {date: "YYYY-MM-DD", merchant, title, amount: float (negative =
+outflow), currency}, plus "dedup_key" for formats the import read before this
+registry: the string its deduplication hash was built from (raw cell values),
+so re-importing an old export still skips the rows already imported.
+
+Adding a bank: subclass CsvBankFormat (header aliases per field) or
+PdfBankFormat (first-page fingerprint + page-stream parser) and decorate it
+with @register_bank_format("<name>"). Formats are tried in registration order,
+so specific formats go before the generic ones.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Any, Callable, ClassVar, Iterable, Iterator, Optional, TypeVar
+
+from .bank_import import extract_pdf_pages, iter_ing_pdf_rows
+
+
+class BankFormat(ABC):
+    """Abstract base for statement formats: a fingerprint check and a row parser."""
+
+    name: ClassVar[str]
+
+    @classmethod
+    @abstractmethod
+    def matches(cls, fingerprint: Any) -> bool:
+        """Whether the file's fingerprint (CSV header row, first PDF page text) is this format's."""
+
+    @abstractmethod
+    def iter_rows(self, source: Iterable[Any]) -> Iterator[dict]:
+        """Parsed rows of the file (CSV records after the header, PDF page texts)."""
+
+
+_F = TypeVar("_F", bound=type[BankFormat])
+
+BANK_FORMATS: dict[str, type[BankFormat]] = {}
+
+
+def register_bank_format(name: str) -> Callable[[_F], _F]:
+    def decorator(format_cls: _F) -> _F:
+        format_cls.name = name
+        BANK_FORMATS[name] = format_cls
+        return format_cls
+    return decorator
+
+
+# ── Value parsing ─────────────────────────────────────────────────────────────
+
+_DATE = re.compile(r"(?:(\d{4})[-.](\d{2})[-.](\d{2})|(\d{2})[-.](\d{2})[-.](\d{4}))\b")
+# "-1 234,56 PLN", "+1234.56", "1.234,56"
+_AMOUNT = re.compile(r"([+-]?)\s*([\d \xa0.,]*\d)\s*([A-Z]{3})?$")
+
+
+def iso_date(text: str) -> str:
+    """YYYY-MM-DD, DD.MM.YYYY or DD-MM-YYYY (time suffix ignored) → YYYY-MM-DD."""
+    m = _DATE.match(text.strip())
+    if not m:
+        raise ValueError(f"Unrecognised date: {text!r}")
+    if m.group(1):
+        return f"{m.group(1)}-{m.group(2)}-{m.group(3)}"
+    return f"{m.group(6)}-{m.group(5)}-{m.group(4)}"
+
+
+def parse_amount(text: str) -> tuple[float, Optional[str]]:
+    """(amount, currency suffix or None). Comma or dot decimals, space/nbsp/dot thousands."""
+    m = _AMOUNT.match(text.strip())
+    if not m:
+        raise ValueError(f"Unrecognised amount: {text!r}")
+    sign, number, currency = m.groups()
+    number = number.replace(" ", "").replace("\xa0", "")
+    if "," in number:
+        if number.rfind(".") > number.rfind(","):
+            number = number.replace(",", "")  # 1,234.56
+        else:
+            number = number.replace(".", "").replace(",", ".")
+    return float(sign + number), currency
+
+
+# ── CSV formats ───────────────────────────────────────────────────────────────
+
+# Exports put an account summary above the header row
+_HEADER_SCAN_ROWS = 40
+_DELIMITERS = (";", ",", "\t")
+
+
+def _find_columns(header: list[str], aliases: tuple[str, ...]) -> list[int]:
+    """Indexes of the header cells containing an alias, in alias (priority) order, exact names first.
+
+    Exact first so "Waluta" maps to the currency column rather than "Kwota transakcji (waluta)".
+    """
+    lowered = [h.strip().lower() for h in header]
+    found: list[int] = []
+    for alias in aliases:
+        alias = alias.lower()
+        for exact in (True, False):
+            for i, h in enumerate(lowered):
+                if (h == alias if exact else alias in h) and i not in found:
+                    found.append(i)
+    return found
+
+
+class CsvBankFormat(BankFormat):
+    """Column-mapped CSV export; subclasses only set the class attributes below."""
+
+    # Header cells (substrings, case-insensitive) that must all be present
+    fingerprint: ClassVar[tuple[str, ...]]
+    # field → header aliases in priority order; the first non-empty column wins.
+    # Fields: date and amount (required), merchant, title, currency
+    columns: ClassVar[dict[str, tuple[str, ...]]]
+    currency: ClassVar[str] = "PLN"
+    # Rows carry the pre-registry dedup_key (formats the import already read before)
+    legacy_dedup_key: ClassVar[bool] = False
+
+    def __init__(self, header: list[str]):
+        self.header = header
+        self.index = {f: _find_columns(header, aliases) for f, aliases in self.columns.items()}
+
+    @classmethod
+    def matches(cls, header: list[str]) -> bool:
+        return (
+            all(_find_columns(header, (alias,)) for alias in cls.fingerprint)
+            and bool(_find_columns(header, cls.columns["date"]))
+            and bool(_find_columns(header, cls.columns["amount"]))
+        )
+
+    def _cell(self, record: list[str], f: str) -> str:
+        """The field's first non-empty cell, as exported."""
+        for i in self.index.get(f, ()):
+            if i < len(record) and record[i].strip():
+                return record[i]
+        return ""
+
+    def _value(self, record: list[str], f: str) -> str:
+        return self._cell(record, f).strip()
+
+    def describe(self, record: list[str]) -> tuple[str, str]:
+        """(merchant, title) of a record."""
+        return self._value(record, "merchant"), self._value(record, "title")
+
+    def row(self, record: list[str]) -> Optional[dict]:
+        date_text, amount_text = self._value(record, "date"), self._value(record, "amount")
+        if not date_text or not amount_text:
+            return None
+        try:
+            date = iso_date(date_text)
+            amount, amount_currency = parse_amount(amount_text)
+        except ValueError:
+            return None
+        merchant, title = self.describe(record)
+        row = {
+            "date": date,
+            "merchant": merchant,
+            "title": title,
+            "amount": amount,
+            "currency": self._value(record, "currency") or amount_currency or self.currency,
+        }
+        if self.legacy_dedup_key:
+            row["dedup_key"] = (
+                f"{self._cell(record, 'date')}_{amount}_{self._cell(record, 'merchant')}_{self._cell(record, 'title')}"
+            )
+        return row
+
+    def iter_rows(self, records: Iterable[list[str]]) -> Iterator[dict]:
+        for record in records:
+            row = self.row(record)
+            if row is not None:
+                yield row
+
+
+@register_bank_format("ing_csv")
+class IngCsvFormat(CsvBankFormat):
+    """ING Bank Śląski "Historia transakcji" CSV (semicolon, account summary above the header)."""
+
+    fingerprint = ("Dane kontrahenta", "Kwota transakcji")
+    legacy_dedup_key = True
+    columns = {
+        "date": ("Data transakcji",),
+        "merchant": ("Dane kontrahenta",),
+        "title": ("Tytuł",),
+        "amount": ("Kwota transakcji (waluta)",),
+        "currency": ("Waluta",),
+    }
+
+
+@register_bank_format("mbank_csv")
+class MbankCsvFormat(CsvBankFormat):
+    """mBank "Lista operacji" CSV: '#'-prefixed headers, amounts like "-12,34 PLN"."""
+
+    fingerprint = ("#Data operacji", "#Opis operacji")
+    columns = {
+        "date": ("#Data operacji",),
+        "merchant": ("#Nadawca/Odbiorca", "#Tytuł", "#Opis operacji"),
+        "title": ("#Tytuł", "#Opis operacji"),
+        "amount": ("#Kwota",),
+    }
+
+
+_PKO_FIELD = re.compile(r"^(Tytuł|Nazwa odbiorcy|Nazwa nadawcy|Lokalizacja):\s*(.*)$", re.IGNORECASE)
+_PKO_ADDRESS = re.compile(r"Adres:\s*(.*?)\s*(?:Miasto:|Kraj:|$)")
+
+
+@register_bank_format("pko_csv")
+class PkoCsvFormat(CsvBankFormat):
+    """
+    PKO BP "Historia rachunku" CSV. The description is spread over "Opis
+    transakcji" and the unnamed columns after it, one "Label: value" per cell.
+    """
+
+    fingerprint = ("Data waluty", "Typ transakcji", "Opis transakcji")
+    columns = {
+        "date": ("Data operacji",),
+        "merchant": ("Typ transakcji",),
+        "title": ("Opis transakcji",),
+        "amount": ("Kwota",),
+        "currency": ("Waluta",),
+    }
+
+    def describe(self, record: list[str]) -> tuple[str, str]:
+        start = self.index["title"][0] if self.index["title"] else len(record)
+        details = [cell.strip() for cell in record[start:] if cell.strip()]
+        labelled: dict[str, str] = {}
+        for cell in details:
+            m = _PKO_FIELD.match(cell)
+            if m:
+                labelled[m.group(1).lower()] = m.group(2)
+        address = _PKO_ADDRESS.search(labelled.get("lokalizacja", ""))
+        merchant = (
+            labelled.get("nazwa odbiorcy") or labelled.get("nazwa nadawcy")
+            or (address.group(1) if address else "") or self._value(record, "merchant")
+        )
+        return merchant, labelled.get("tytuł") or " ".join(details)
+
+
+@register_bank_format("santander_csv")
+class SantanderCsvFormat(CsvBankFormat):
+    """Santander Bank Polska "Historia operacji" CSV."""
+
+    fingerprint = ("Nazwa nadawcy/odbiorcy", "Opis transakcji")
+    columns = {
+        "date": ("Data operacji",),
+        "merchant": ("Nazwa nadawcy/odbiorcy",),
+        "title": ("Opis transakcji",),
+        "amount": ("Kwota",),
+        "currency": ("Waluta",),
+    }
+
+
+@register_bank_format("generic_csv")
+class GenericCsvFormat(CsvBankFormat):
+    """Any CSV with recognisable date and amount columns (the import's historical header aliases)."""
+
+    fingerprint = ()
+    legacy_dedup_key = True
+    columns = {
+        "date": ("Data transakcji", "Transaction date", "Data"),
+        "merchant": ("Dane kontrahenta", "Contractor details", "Kontrahent"),
+        "title": ("Tytuł", "Title", "Opis"),
+        "amount": ("Kwota transakcji (waluta)", "Transaction amount", "Kwota"),
+        "currency": ("Waluta", "Currency"),
+    }
+
+
+def detect_csv_format(header: list[str]) -> Optional[type[CsvBankFormat]]:
+    for format_cls in BANK_FORMATS.values():
+        if issubclass(format_cls, CsvBankFormat) and format_cls.matches(header):
+            return format_cls
+    return None
+
+
+def _csv_records(text: str, delimiter: str) -> Iterator[list[str]]:
+    return csv.reader(io.StringIO(text), delimiter=delimiter)
+
+
+def _delimiters(text: str) -> list[str]:
+    try:
+        sniffed = csv.Sniffer().sniff(text[:2000], delimiters="".join(_DELIMITERS)).delimiter
+    except csv.Error:
+        sniffed = _DELIMITERS[0]
+    return [sniffed] + [d for d in _DELIMITERS if d != sniffed]
+
+
+def parse_csv_statement(text: str) -> tuple[Optional[str], Iterator[dict]]:
+    """(format name, rows) — the header row is looked up among the first rows; (None, empty) if no format matches."""
+    for delimiter in _delimiters(text):
+        records = _csv_records(text, delimiter)
+        for _, header in zip(range(_HEADER_SCAN_ROWS), records):
+            format_cls = detect_csv_format(header)
+            if format_cls is not None:
+                # The reader continues right after the header row
+                return format_cls.name, format_cls(header).iter_rows(records)
+    return None, iter(())
+
+
+def decode_statement(content: bytes) -> str:
+    for encoding in ("utf-8-sig", "windows-1250", "iso-8859-2"):
+        try:
+            return content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    raise ValueError("Could not decode CSV file. Use UTF-8 or Windows-1250.")
+
+
+# ── PDF formats ───────────────────────────────────────────────────────────────
+
+class PdfBankFormat(BankFormat):
+    # Searched in the first page's text
+    fingerprint: ClassVar[re.Pattern[str]]
+
+    @classmethod
+    def matches(cls, first_page: str) -> bool:
+        return bool(cls.fingerprint.search(first_page))
+
+    @abstractmethod
+    def iter_rows(self, pages: Iterable[str]) -> Iterator[dict]:
+        ...
+
+
+@register_bank_format("ing_pdf")
+class IngPdfFormat(PdfBankFormat):
+    # Bank name, BIC, or the statement table header (first pages without the bank name).
+    # Row shapes are no fingerprint: other banks' statements also print "date date … amount PLN".
+    fingerprint = re.compile(
+        r"ING\s+Bank\s+Śląski|INGBPLPW|Data\s+księgowania\s+Data\s+transakcji\s+Dane\s+kontrahenta",
+        re.IGNORECASE,
+    )
+
+    def iter_rows(self, pages: Iterable[str]) -> Iterator[dict]:
+        return iter_ing_pdf_rows(pages)
+
+
+def detect_pdf_format(first_page: str) -> Optional[type[PdfBankFormat]]:
+    for format_cls in BANK_FORMATS.values():
+        if issubclass(format_cls, PdfBankFormat) and format_cls.matches(first_page):
+            return format_cls
+    return None
+
+
+# ── Entry point ───────────────────────────────────────────────────────────────
+
+@dataclass
+class ParsedStatement:
+    # None when no format matched; `text` is then what the AI fallback gets
+    format: Optional[str]
+    rows: list[dict] = field(default_factory=list)
+    text: str = ""
+
+
+def parse_statement(content: bytes, filename: str) -> ParsedStatement:
+    """Fingerprint and parse an uploaded statement (blocking: run it off the event loop)."""
+    if filename.lower().endswith(".pdf"):
+        pages = extract_pdf_pages(content)
+        first_page = next(pages, "")
+        pdf_format = detect_pdf_format(first_page)
+        if pdf_format is None:
+            return ParsedStatement(None, text="\n".join(chain([first_page], pages)))
+        return ParsedStatement(pdf_format.name, list(pdf_format().iter_rows(chain([first_page], pages))))
+
+    text = decode_statement(content)
+    name, rows = parse_csv_statement(text)
+    if name is None:
+        return ParsedStatement(None, text=text)
+    return ParsedStatement(name, list(rows))
+
+
+def coerce_rows(rows: Iterable[dict]) -> Iterator[dict]:
+    """AI-extracted rows in the parser row shape; rows without a usable date or amount are dropped."""
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        try:
+            date = iso_date(str(row.get("date") or ""))
+            amount = row.get("amount")
+            amount = float(amount) if isinstance(amount, (int, float)) else parse_amount(str(amount or ""))[0]
+        except (ValueError, TypeError):
+            continue
+        yield {
+            "date": date,
+            "merchant": str(row.get("merchant") or ""),
+            "title": str(row.get("title") or ""),
+            "amount": amount,
+            "currency": str(row.get("currency") or "PLN"),
+        }
@@ -0,0 +1,54 @@
+# backend/app/biedronka_parser.py
+import re
+
+from .parser_engine import LineRule, RuleAction, RuleBasedParser
+
+_AMOUNT = r"\d+[.,]\d{2}"
+_QTY = r"\d+(?:[.,]\d+)?"
+_PTU = r"[A-G]"
+
+
+class BiedronkaReceiptParser(RuleBasedParser):
+    """
+    Biedronka (Jeronimo Martins) fiscal receipts.
+
+    Structure:
+      HEADER   — company, store, NIP, date, "PARAGON FISKALNY"
+      PRODUCTS — "<name> <PTU> <qty> x<unit price> <total><PTU>", the numbers
+                 sometimes on their own line below the name; a discount is
+                 "Rabat -1,00C" followed by the line total after the discount
+      SUMMARY  — "SPRZEDAŻ OPODATKOWANA", PTU breakdown, "SUMA PLN", payment
+    """
+
+    merchant_name = "Biedronka"
+    products_start = re.compile(r"PARAGON\s+FISKALNY", re.IGNORECASE)
+    summary_start = re.compile(
+        r"^(Sprzeda[żz]\s+opodatk|Suma\s+PTU|Suma\s*:?\s*PLN|Suma\b|PTU\s+" + _PTU + r"\b|Razem\b)",
+        re.IGNORECASE,
+    )
+    total_pattern = re.compile(r"Suma\s*:?\s*PLN\s*(?P<total>" + _AMOUNT + r")", re.IGNORECASE)
+    date_patterns = (
+        re.compile(r"\b(?P<y>20\d{2})-(?P<m>\d{2})-(?P<d>\d{2})\b"),
+        re.compile(r"\b(?P<d>\d{2})\.(?P<m>\d{2})\.(?P<y>20\d{2})\b"),
+    )
+    product_rules = (
+        # "Mleko UHT 3,2% 1L C 2 x3,49 6,98C"
+        LineRule(re.compile(
+            r"^(?P<name>.+?)\s+" + _PTU + r"\s+(?P<qty>" + _QTY + r")\s*[x×*]\s*(?P<unit>" + _AMOUNT + r")\s+"
+            r"(?P<total>" + _AMOUNT + r")\s*" + _PTU + r"$",
+            re.IGNORECASE,
+        ), RuleAction.ITEM),
+        # "C 0,842 x5,99 5,04C" under the name line
+        LineRule(re.compile(
+            r"^(?:" + _PTU + r"\s+)?(?P<qty>" + _QTY + r")\s*[x×*]\s*(?P<unit>" + _AMOUNT + r")\s+"
+            r"(?P<total>" + _AMOUNT + r")\s*" + _PTU + r"$",
+            re.IGNORECASE,
+        ), RuleAction.ITEM),
+        # "Rabat -1,00C" / "Obniżka Moje Biedronka -0,50 C"
+        LineRule(re.compile(
+            r"^(?P<name>(?:Rabat|Obni[żz]ka|Upust)\b.*?)\s+(?P<amount>-" + _AMOUNT + r")\s*(?:" + _PTU + r")?$",
+            re.IGNORECASE,
+        ), RuleAction.DISCOUNT),
+        # "4,98C" — the line total after the discount above, already counted
+        LineRule(re.compile(r"^" + _AMOUNT + r"\s*" + _PTU + r"$", re.IGNORECASE), RuleAction.SKIP),
+    )
@@ -0,0 +1,377 @@
+# backend/app/category_classifier.py
+"""
+Local per-budget category classifier for bank-import descriptions.
+
+Character trigram TF-IDF, nearest neighbour (cosine) over the unique normalized
+descriptions of the budget's own trusted history. import_transactions asks it
+after the category memo and only sends descriptions it is not confident about
+(< AI_LOCAL_CLASSIFIER_MIN_CONFIDENCE) to the AI.
+
+Only categories a person chose or confirmed are learned: "user" memo entries
+(categories picked for imported rows), verified receipts and manual
+transactions, and their verified lines. AI answers, the "Other" default of a
+failed AI batch and the classifier's own predictions never are, so mistakes do
+not reinforce themselves.
+
+Categories change after a row is created (verification, edits), so no id
+watermark can follow them: a model is built once from history and afterwards
+fed by the endpoints that set a trusted category (learn_examples(),
+learn_verified_transaction()). It is written back to one gzip'd JSON file per
+budget (temp file + os.replace) at most every CATEGORY_CLASSIFIER_SAVE_SECONDS;
+examples learned in between are flushed by run_flusher() / flush_classifiers()
+and replayed if another process saved the file first. The database stays the
+source of truth — a missing or unreadable file only means a rebuild from history.
+
+ItemCategoryIndex is the same structure over verified receipt line names; it
+fills item categories the deterministic receipt parsers leave empty.
+"""
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+from sqlmodel import Session, col, or_, select
+
+from .category_memo import import_description, normalize_description
+from .config import settings
+from .models import CategoryMemo, ReceiptScan, ScanStatus, Transaction, TransactionLine
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 2
+
+
+def trigrams(text: str) -> set[str]:
+    normalized = normalize_description(text)
+    if not normalized:
+        return set()
+    padded = f" {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CategoryClassifier:
+    """Incremental trigram nearest-neighbour classifier. Not thread-safe; see get_classifier()."""
+
+    kind = "budget"
+
+    def __init__(self) -> None:
+        self.docs: list[str] = []                       # unique normalized descriptions
+        self.labels: list[dict[int, int]] = []          # per doc: {category_id: times seen}
+        self._doc_ids: dict[str, int] = {}
+        self.index: dict[str, list[int]] = defaultdict(list)   # trigram → doc ids
+        self.built = False
+        self._norms: Optional[list[float]] = None
+        self.saved_mtime = 0.0
+        self.saved_at = 0.0                             # time.monotonic() of the last save
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def learn(self, text: str, category_id: int) -> None:
+        key = normalize_description(text)
+        doc_id = self._doc_ids.get(key)
+        if doc_id is None:
+            grams = trigrams(key)
+            if not grams:
+                return
+            doc_id = self._doc_ids[key] = len(self.docs)
+            self.docs.append(key)
+            self.labels.append({})
+            for gram in grams:
+                self.index[gram].append(doc_id)
+            self._norms = None
+        label = self.labels[doc_id]
+        label[category_id] = label.get(category_id, 0) + 1
+
+    def _idf(self, df: int) -> float:
+        return math.log((1 + len(self.docs)) / (1 + df)) + 1.0
+
+    def _doc_norms(self) -> list[float]:
+        if self._norms is None:
+            squares = [0.0] * len(self.docs)
+            for doc_ids in self.index.values():
+                weight = self._idf(len(doc_ids)) ** 2
+                for doc_id in doc_ids:
+                    squares[doc_id] += weight
+            self._norms = [math.sqrt(s) for s in squares]
+        return self._norms
+
+    def predict(self, text: str) -> Optional[tuple[int, float]]:
+        """(category_id, confidence) of the most similar known description, or None.
+
+        confidence = cosine similarity × the share of that description's majority category.
+        """
+        grams = trigrams(text)
+        if not grams or not self.docs:
+            return None
+        norms = self._doc_norms()
+        scores: dict[int, float] = defaultdict(float)
+        query_square = 0.0
+        for gram in grams:
+            doc_ids = self.index.get(gram)
+            weight = self._idf(len(doc_ids) if doc_ids else 0) ** 2
+            query_square += weight
+            for doc_id in doc_ids or ():
+                scores[doc_id] += weight
+        if not scores:
+            return None
+        query_norm = math.sqrt(query_square)
+        doc_id, score = max(scores.items(), key=lambda item: item[1] / norms[item[0]])
+        label = self.labels[doc_id]
+        category_id, seen = max(label.items(), key=lambda item: item[1])
+        return category_id, score / (query_norm * norms[doc_id]) * seen / sum(label.values())
+
+    # ── Training from history ─────────────────────────────────────────────────
+
+    def update_from_history(self, session: Session, budget_id: int) -> int:
+        """Build the model from history on first use. Returns the number of examples learned."""
+        if self.built:
+            return 0
+        examples = self.history(session, budget_id)
+        for text, category_id in examples:
+            self.learn(text, category_id)
+        self.built = True
+        # Built (possibly empty): worth saving either way
+        return len(examples) or 1
+
+    @classmethod
+    def history(cls, session: Session, budget_id: int) -> list[tuple[str, int]]:
+        """(description, category_id) pairs a person chose or confirmed."""
+        memos = session.exec(
+            select(CategoryMemo.normalized_description, CategoryMemo.category_id).where(
+                CategoryMemo.budget_id == budget_id, CategoryMemo.source == "user",
+            ).order_by(col(CategoryMemo.id))
+        ).all()
+        transactions = session.exec(
+            select(Transaction.merchant_name, Transaction.category_id)
+            .outerjoin(ReceiptScan, col(ReceiptScan.transaction_id) == col(Transaction.id))
+            .where(
+                Transaction.budget_id == budget_id,
+                col(Transaction.category_id).is_not(None),
+                _verified(),
+            ).order_by(col(Transaction.id))
+        ).all()
+        examples = [(text, category_id) for text, category_id in [*memos, *transactions] if text and category_id]
+        return examples + _verified_lines(session, budget_id)
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+
+    def to_dict(self) -> dict:
+        return {
+            "v": _FORMAT_VERSION,
+            "built": self.built,
+            "docs": [[doc, {str(k): v for k, v in label.items()}] for doc, label in zip(self.docs, self.labels)],
+        }
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "CategoryClassifier":
+        if payload.get("v") != _FORMAT_VERSION:
+            raise ValueError(f"unsupported classifier format {payload.get('v')!r}")
+        model = cls()
+        model.built = payload["built"]
+        for doc, label in payload["docs"]:
+            for category_id, seen in label.items():
+                model.learn(doc, int(category_id))
+                model.labels[model._doc_ids[doc]][int(category_id)] = seen
+        return model
+
+
+# ── Item categories (receipt lines) ──────────────────────────────────────────
+
+class ItemCategoryIndex(CategoryClassifier):
+    """Product name → category, learned from verified receipt lines only.
+
+    Built once from every verified line (receipt scan in CATEGORIZATION_OK or a
+    manual transaction without a scan) and afterwards fed by verify_transaction
+    through learn_verified_transaction().
+    """
+
+    kind = "items"
+
+    @classmethod
+    def history(cls, session: Session, budget_id: int) -> list[tuple[str, int]]:
+        return _verified_lines(session, budget_id)
+
+
+def _verified():
+    """Transaction filter (with ReceiptScan outer-joined): a verified receipt, or entered by hand."""
+    return or_(
+        ReceiptScan.status == ScanStatus.CATEGORIZATION_OK.value,
+        (col(ReceiptScan.id).is_(None)) & (col(Transaction.import_hash).is_(None)),
+    )
+
+
+def _verified_lines(session: Session, budget_id: int) -> list[tuple[str, int]]:
+    lines = session.exec(
+        select(TransactionLine.name, TransactionLine.category_id)
+        .join(Transaction, col(Transaction.id) == col(TransactionLine.transaction_id))
+        .outerjoin(ReceiptScan, col(ReceiptScan.transaction_id) == col(Transaction.id))
+        .where(
+            Transaction.budget_id == budget_id,
+            col(TransactionLine.category_id).is_not(None),
+            _verified(),
+        ).order_by(col(TransactionLine.id))
+    ).all()
+    return [(name, category_id) for name, category_id in lines if name and category_id is not None]
+
+
+def _path(budget_id: int, kind: str) -> str:
+    return os.path.join(settings.CATEGORY_CLASSIFIER_DIR, f"{kind}_{budget_id}.json.gz")
+
+
+def load_classifier(budget_id: int, model_cls: type[CategoryClassifier] = CategoryClassifier) -> CategoryClassifier:
+    try:
+        with gzip.open(_path(budget_id, model_cls.kind), "rt", encoding="utf-8") as f:
+            return model_cls.from_dict(json.load(f))
+    except FileNotFoundError:
+        return model_cls()
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("Classifier file for budget %s unreadable, rebuilding: %s", budget_id, e)
+        return model_cls()
+
+
+def save_classifier(budget_id: int, model: CategoryClassifier) -> None:
+    path = _path(budget_id, model.kind)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=5) as f:
+            json.dump(model.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+        model.saved_mtime = os.stat(path).st_mtime
+        model.saved_at = time.monotonic()
+    except OSError as e:
+        logger.warning("Could not save classifier for budget %s: %s", budget_id, e)
+
+
+_models: dict[tuple[str, int], CategoryClassifier] = {}
+# Examples learned since the model's last save, per (kind, budget_id)
+_unsaved: dict[tuple[str, int], list[tuple[str, int]]] = {}
+_lock = threading.Lock()
+
+
+def _mtime(budget_id: int, kind: str) -> float:
+    try:
+        return os.stat(_path(budget_id, kind)).st_mtime
+    except OSError:
+        return 0.0
+
+
+def get_classifier(
+    session: Session, budget_id: int, model_cls: type[CategoryClassifier] = CategoryClassifier,
+) -> CategoryClassifier:
+    """The budget's model, loaded from disk (again when another process saved it) and caught up with the database."""
+    with _lock:
+        key = (model_cls.kind, budget_id)
+        model = _models.get(key)
+        if model is None or model.saved_mtime != _mtime(budget_id, model_cls.kind):
+            model = _models[key] = load_classifier(budget_id, model_cls)
+            model.saved_mtime = _mtime(budget_id, model_cls.kind)
+            # Another process saved first — keep what this one learned but has not written yet
+            for text, category_id in _unsaved.get(key, []):
+                model.learn(text, category_id)
+        if model.update_from_history(session, budget_id):
+            save_classifier(budget_id, model)
+        return model
+
+
+def classify_descriptions(
+    session: Session, budget_id: int, descriptions: list[str], min_confidence: Optional[float] = None,
+) -> dict[str, int]:
+    """{description: category_id} for descriptions classified at or above min_confidence."""
+    if not descriptions:
+        return {}
+    threshold = settings.AI_LOCAL_CLASSIFIER_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    model = get_classifier(session, budget_id)
+    found: dict[str, int] = {}
+    with _lock:
+        for description in descriptions:
+            prediction = model.predict(description)
+            if prediction is not None and prediction[1] >= threshold:
+                found[description] = prediction[0]
+    return found
+
+
+def suggest_item_categories(
+    session: Session, budget_id: int, names: list[str], min_confidence: Optional[float] = None,
+) -> dict[str, int]:
+    """{item name: category_id} from the budget's verified receipt lines, at or above min_confidence."""
+    if not names:
+        return {}
+    threshold = settings.ITEM_CATEGORY_MIN_CONFIDENCE if min_confidence is None else min_confidence
+    model = get_classifier(session, budget_id, ItemCategoryIndex)
+    found: dict[str, int] = {}
+    with _lock:
+        for name in names:
+            prediction = model.predict(name)
+            if prediction is not None and prediction[1] >= threshold:
+                found[name] = prediction[0]
+    return found
+
+
+def learn_examples(
+    session: Session, budget_id: int, examples: list[tuple[str, int]],
+    model_cls: type[CategoryClassifier] = CategoryClassifier,
+) -> None:
+    """
+    Teach the budget's model (description, category_id) pairs confirmed by the user.
+    Blocking (history rebuild, file write) — async endpoints run it via asyncio.to_thread.
+    """
+    if not examples:
+        return
+    model = get_classifier(session, budget_id, model_cls)
+    key = (model_cls.kind, budget_id)
+    with _lock:
+        for text, category_id in examples:
+            model.learn(text, category_id)
+        _unsaved.setdefault(key, []).extend(examples)
+        if time.monotonic() - model.saved_at >= settings.CATEGORY_CLASSIFIER_SAVE_SECONDS:
+            save_classifier(budget_id, model)
+            _unsaved.pop(key, None)
+
+
+def learn_verified_transaction(session: Session, budget_id: int, transaction: Transaction) -> None:
+    """Feed both models with a transaction the user has just verified or entered by hand."""
+    lines = [(line.name, line.category_id) for line in transaction.lines if line.category_id is not None and line.name]
+    learn_examples(session, budget_id, lines, ItemCategoryIndex)
+    if transaction.category_id is not None and transaction.merchant_name:
+        lines = [(transaction.merchant_name, transaction.category_id), *lines]
+    learn_examples(session, budget_id, lines)
+
+
+def flush_classifiers() -> int:
+    """Write every model with examples learned since its last save. Returns how many were written."""
+    with _lock:
+        written = 0
+        for key in list(_unsaved):
+            model = _models.get(key)
+            if model is not None:
+                save_classifier(key[1], model)
+                written += 1
+            del _unsaved[key]
+        return written
+
+
+async def run_flusher(interval: float = settings.CATEGORY_CLASSIFIER_SAVE_SECONDS) -> None:
+    """Periodic flush loop — started from the API lifespan, so quiet budgets still get saved."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(flush_classifiers)
+        except Exception:
+            logger.exception("Classifier flush failed")
+
+
+def reset_classifiers() -> None:
+    """Drop the in-process models and their unsaved examples (tests, budget deletion)."""
+    with _lock:
+        _models.clear()
+        _unsaved.clear()
@@ -0,0 +1,105 @@
+# backend/app/category_memo.py
+"""
+Per-budget memo of bank-import descriptions ("merchant title") → category.
+
+Consulted by import_transactions before any AI call; AI answers and user
+corrections (changing the category of an imported transaction) are written
+back, so recurring merchants are categorized locally from the second import on.
+
+Descriptions are normalized (case, whitespace, digit runs such as dates, card
+and reference numbers), so "BIEDRONKA 1234 Płatność kartą 03.02.2025" and the
+same shop next month share one entry. A "user" entry always wins over "ai".
+"""
+from __future__ import annotations
+
+import re
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlmodel import Session, col, select
+
+from .models import CategoryMemo, Transaction
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_description(description: str) -> str:
+    return _SPACES.sub(" ", _DIGITS.sub("#", description.lower())).strip()
+
+
+def import_description(transaction: Transaction) -> Optional[str]:
+    """Rebuild the import description ("merchant title") of an imported transaction."""
+    if not transaction.import_hash:
+        return None
+    merchant, title = transaction.merchant_name, transaction.note
+    # import_transactions stores the title as merchant_name when the merchant is empty
+    if not title or merchant == title:
+        return merchant
+    return f"{merchant} {title}"
+
+
+def lookup_categories(session: Session, budget_id: int, descriptions: list[str]) -> dict[str, int]:
+    """{description: category_id} for memoized descriptions; bumps hit_count / last_used. Caller commits."""
+    by_key: dict[str, list[str]] = {}
+    for description in descriptions:
+        by_key.setdefault(normalize_description(description), []).append(description)
+    if not by_key:
+        return {}
+
+    now = datetime.now(timezone.utc)
+    found: dict[str, int] = {}
+    keys = list(by_key)
+    # Chunked IN (...) — SQLite's bound-parameter limit
+    for i in range(0, len(keys), 500):
+        memos = session.exec(
+            select(CategoryMemo).where(
+                CategoryMemo.budget_id == budget_id,
+                col(CategoryMemo.normalized_description).in_(keys[i:i + 500]),
+            )
+        ).all()
+        for memo in memos:
+            memo.hit_count += 1
+            memo.last_used = now
+            session.add(memo)
+            for description in by_key[memo.normalized_description]:
+                found[description] = memo.category_id
+    return found
+
+
+def remember_categories(session: Session, budget_id: int, mapping: dict[str, int], source: str) -> None:
+    """Upsert {description: category_id}. AI results never replace a user entry. Caller commits."""
+    by_key = {normalize_description(d): category_id for d, category_id in mapping.items() if d.strip()}
+    if not by_key:
+        return
+
+    now = datetime.now(timezone.utc)
+    keys = list(by_key)
+    existing: dict[str, CategoryMemo] = {}
+    for i in range(0, len(keys), 500):
+        for memo in session.exec(
+            select(CategoryMemo).where(
+                CategoryMemo.budget_id == budget_id,
+                col(CategoryMemo.normalized_description).in_(keys[i:i + 500]),
+            )
+        ).all():
+            existing[memo.normalized_description] = memo
+
+    for key, category_id in by_key.items():
+        memo = existing.get(key)
+        if memo is None:
+            memo = CategoryMemo(budget_id=budget_id, normalized_description=key, category_id=category_id, source=source)
+        elif source == "user" or memo.source != "user":
+            memo.category_id = category_id
+            memo.source = source
+            memo.last_used = now
+        else:
+            continue
+        session.add(memo)
+
+
+def forget_categories(session: Session, category_ids: list[int]) -> None:
+    """Drop the memo entries of deleted categories, so imports stop returning their ids. Caller commits."""
+    if category_ids:
+        session.execute(delete(CategoryMemo).where(col(CategoryMemo.category_id).in_(category_ids)))
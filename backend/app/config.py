@@ -5,5 +5,94 @@ class Settings:
     OCR_WORKER_CONCURRENCY: int = int(os.getenv("OCR_WORKER_CONCURRENCY", "3"))
     OCR_JOB_TIMEOUT_SECONDS: int = int(os.getenv("OCR_JOB_TIMEOUT_SECONDS", "180"))
 
+    # Dedicated pipeline executor (ocr_executor.py) — kept off the default thread pool.
+    # "process": worker processes killed on timeout; "thread": separate bounded thread pool.
+    OCR_EXECUTOR_MODE: str = os.getenv("OCR_EXECUTOR_MODE", "process")
+    OCR_EXECUTOR_WORKERS: int = int(os.getenv("OCR_EXECUTOR_WORKERS", os.getenv("OCR_WORKER_CONCURRENCY", "3")))
+
+    # Shared Google Vision clients per process (ocr_pipeline.vision_clients); each holds one gRPC channel.
+    OCR_VISION_CLIENT_POOL_SIZE: int = int(os.getenv("OCR_VISION_CLIENT_POOL_SIZE", "1"))
+    # Concurrent jobs share one batch_annotate_images request (ocr_batcher.py); max 16, 1 disables.
+    OCR_VISION_BATCH_SIZE: int = int(os.getenv("OCR_VISION_BATCH_SIZE", "16"))
+    OCR_VISION_BATCH_MAX_WAIT_MS: int = int(os.getenv("OCR_VISION_BATCH_MAX_WAIT_MS", "200"))
+
+    # Image pre-processing before OCR (ocr_pipeline.preprocess_image, needs Pillow):
+    # EXIF orientation, downscale, grayscale, JPEG re-encode. Uploads below MIN_BYTES are sent as-is.
+    OCR_PREPROCESS_ENABLED: bool = os.getenv("OCR_PREPROCESS_ENABLED", "true").lower() == "true"
+    OCR_PREPROCESS_MIN_BYTES: int = int(os.getenv("OCR_PREPROCESS_MIN_BYTES", str(1024 * 1024)))
+    OCR_PREPROCESS_MAX_PIXELS: int = int(os.getenv("OCR_PREPROCESS_MAX_PIXELS", "4000000"))
+    OCR_PREPROCESS_JPEG_QUALITY: int = int(os.getenv("OCR_PREPROCESS_JPEG_QUALITY", "85"))
+    OCR_PREPROCESS_WORKERS: int = int(os.getenv("OCR_PREPROCESS_WORKERS", "2"))
+
+    # OpenAI requests (services.py): per-operation timeouts; AsyncAIService also caps
+    # in-flight requests per event loop and shares one HTTP connection pool.
+    AI_TIMEOUT_STRUCTURIZE_SECONDS: float = float(os.getenv("AI_TIMEOUT_STRUCTURIZE_SECONDS", "60"))
+    AI_TIMEOUT_VISION_SECONDS: float = float(os.getenv("AI_TIMEOUT_VISION_SECONDS", "90"))
+    AI_TIMEOUT_CATEGORIZE_SECONDS: float = float(os.getenv("AI_TIMEOUT_CATEGORIZE_SECONDS", "30"))
+    AI_TIMEOUT_BANK_STATEMENT_SECONDS: float = float(os.getenv("AI_TIMEOUT_BANK_STATEMENT_SECONDS", "120"))
+    AI_MAX_CONCURRENCY: int = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+    AI_HTTP_MAX_CONNECTIONS: int = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20"))
+    # Import categorization: parallel batches of 50 and per-batch retries before a batch is left uncategorized.
+    AI_CATEGORIZE_CONCURRENCY: int = int(os.getenv("AI_CATEGORIZE_CONCURRENCY", "4"))
+    AI_CATEGORIZE_RETRIES: int = int(os.getenv("AI_CATEGORIZE_RETRIES", "2"))
+    # Local trigram classifier (category_classifier.py) answers before the AI at or above
+    # this confidence (0..1); set above 1 to always ask the AI.
+    AI_LOCAL_CLASSIFIER_MIN_CONFIDENCE: float = float(os.getenv("AI_LOCAL_CLASSIFIER_MIN_CONFIDENCE", "0.75"))
+    # Receipt items left uncategorized by the parser get the category of a similar verified line.
+    ITEM_CATEGORY_MIN_CONFIDENCE: float = float(os.getenv("ITEM_CATEGORY_MIN_CONFIDENCE", "0.6"))
+    # A parsed merchant name renamed this many times at verification is replaced automatically (corrections.py).
+    CORRECTION_ALIAS_MIN_COUNT: int = int(os.getenv("CORRECTION_ALIAS_MIN_COUNT", "2"))
+    CATEGORY_CLASSIFIER_DIR: str = os.getenv("CATEGORY_CLASSIFIER_DIR", "./data/category_classifier")
+    # Learned examples are written to the model file at most once per interval (and at shutdown).
+    CATEGORY_CLASSIFIER_SAVE_SECONDS: int = int(os.getenv("CATEGORY_CLASSIFIER_SAVE_SECONDS", "30"))
+
+    # AI structurizer (services.AIService._ai_structurize_lines): receipts longer than
+    # WINDOW_LINES are structured in overlapping line windows, CONCURRENCY requests at a time.
+    AI_STRUCTURIZE_WINDOW_LINES: int = int(os.getenv("AI_STRUCTURIZE_WINDOW_LINES", "60"))
+    AI_STRUCTURIZE_OVERLAP_LINES: int = int(os.getenv("AI_STRUCTURIZE_OVERLAP_LINES", "4"))
+    AI_STRUCTURIZE_CONCURRENCY: int = int(os.getenv("AI_STRUCTURIZE_CONCURRENCY", "4"))
+
+    # AI bank statement extraction (AsyncAIService.parse_bank_statement_text, files no bank format
+    # recognises): statements longer than CHUNK_CHARS are cut at transaction starts into chunks
+    # with OVERLAP_LINES of context, CONCURRENCY requests at a time, each retried RETRIES times.
+    # A chunk whose response hits max_tokens is split in two; one still failing fails the import.
+    AI_BANK_STATEMENT_CHUNK_CHARS: int = int(os.getenv("AI_BANK_STATEMENT_CHUNK_CHARS", "6000"))
+    AI_BANK_STATEMENT_OVERLAP_LINES: int = int(os.getenv("AI_BANK_STATEMENT_OVERLAP_LINES", "3"))
+    AI_BANK_STATEMENT_CONCURRENCY: int = int(os.getenv("AI_BANK_STATEMENT_CONCURRENCY", "4"))
+    AI_BANK_STATEMENT_RETRIES: int = int(os.getenv("AI_BANK_STATEMENT_RETRIES", "1"))
+
+    # Bank statement PDF import (bank_import.py): page text is extracted on a process pool
+    # for files with at least PARALLEL_MIN_PAGES pages.
+    BANK_PDF_WORKERS: int = int(os.getenv("BANK_PDF_WORKERS", "2"))
+    BANK_PDF_PARALLEL_MIN_PAGES: int = int(os.getenv("BANK_PDF_PARALLEL_MIN_PAGES", "40"))
+
+    # OCR result cache keyed by image SHA-256 (ocr_cache.py); 0 disables it.
+    OCR_CACHE_DIR: str = os.getenv("OCR_CACHE_DIR", "./data/ocr_cache")
+    OCR_CACHE_MAX_MB: int = int(os.getenv("OCR_CACHE_MAX_MB", "256"))
+    # Durable OCR words per scan (ocr_cache.OCRArchive) for bulk re-parse; never evicted,
+    # removed with the transaction. Empty disables it.
+    OCR_ARCHIVE_DIR: str = os.getenv("OCR_ARCHIVE_DIR", "./data/ocr_archive")
+
+    # Durable scan queue (receiptscan table)
+    # Global cap on RUNNING scans across all API/worker processes.
+    OCR_GLOBAL_CONCURRENCY: int = int(os.getenv("OCR_GLOBAL_CONCURRENCY", os.getenv("OCR_WORKER_CONCURRENCY", "3")))
+    OCR_QUEUE_POLL_INTERVAL_SECONDS: float = float(os.getenv("OCR_QUEUE_POLL_INTERVAL_SECONDS", "1.0"))
+    # Visibility timeout — a RUNNING scan without a heartbeat for this long is reclaimable.
+    OCR_QUEUE_LEASE_SECONDS: int = int(os.getenv("OCR_QUEUE_LEASE_SECONDS", "60"))
+    OCR_QUEUE_HEARTBEAT_SECONDS: int = int(os.getenv("OCR_QUEUE_HEARTBEAT_SECONDS", "15"))
+    OCR_QUEUE_MAX_ATTEMPTS: int = int(os.getenv("OCR_QUEUE_MAX_ATTEMPTS", "3"))
+    # Orphan sweeper — runs at startup and then every interval.
+    OCR_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("OCR_SWEEP_INTERVAL_SECONDS", "300"))
+    # QUEUED rows (and legacy RUNNING rows without a lease) older than this are checked.
+    OCR_SWEEP_STALE_SECONDS: int = int(os.getenv("OCR_SWEEP_STALE_SECONDS", "900"))
+    # Drain the queue inside the API process (disable when running dedicated workers).
+    OCR_EMBEDDED_WORKER: bool = os.getenv("OCR_EMBEDDED_WORKER", "true").lower() == "true"
+
+    # Worker process (`python -m app.worker`)
+    # Extra jobs leased ahead of free slots; they count against OCR_GLOBAL_CONCURRENCY.
+    OCR_WORKER_PREFETCH: int = int(os.getenv("OCR_WORKER_PREFETCH", "0"))
+    # On SIGTERM: how long running jobs may finish before they are requeued.
+    OCR_WORKER_DRAIN_SECONDS: int = int(os.getenv("OCR_WORKER_DRAIN_SECONDS", "30"))
+
 
 settings = Settings()
@@ -0,0 +1,107 @@
+# backend/app/corrections.py
+"""
+Append-only store of the edits users make when verifying a scanned receipt.
+
+verify_transaction snapshots the parsed transaction before applying the user's
+changes and records one VerificationCorrection row per changed value
+(original → confirmed, as strings). Nothing is updated or deleted — deleting
+the transaction only unlinks its rows — so the table is a faithful history of
+parser/AI mistakes.
+
+Consumers aggregate with a GROUP BY over the (budget_id, field, original) index,
+restricted to the values at hand — cheap enough to run on every scan/verify:
+- merchant_aliases(): a parsed merchant name the user renamed at least
+  CORRECTION_ALIAS_MIN_COUNT times is replaced by its most frequent correction.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import func, update
+from sqlmodel import Session, col, select
+
+from .config import settings
+from .models import Transaction, VerificationCorrection
+
+_TRANSACTION_FIELDS = ("merchant_name", "total_amount", "date", "category_id")
+_LINE_FIELDS = ("name", "price", "quantity", "category_id")
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return str(value)
+
+
+def snapshot(transaction: Transaction) -> dict:
+    """The values a verification may change, in the order verify_transaction applies line updates."""
+    return {
+        **{f: getattr(transaction, f) for f in _TRANSACTION_FIELDS},
+        "lines": [{f: getattr(line, f) for f in _LINE_FIELDS} for line in transaction.lines],
+    }
+
+
+def diff_snapshots(before: dict, after: dict) -> list[tuple[str, Optional[int], Optional[str], Optional[str]]]:
+    """[(field, line_index, original, corrected)] for every value that changed."""
+    changes = []
+    for f in _TRANSACTION_FIELDS:
+        original, corrected = _as_text(before[f]), _as_text(after[f])
+        if original != corrected:
+            changes.append((f, None, original, corrected))
+    lines_before, lines_after = before["lines"], after["lines"]
+    for i in range(max(len(lines_before), len(lines_after))):
+        old = lines_before[i] if i < len(lines_before) else {}
+        new = lines_after[i] if i < len(lines_after) else {}
+        for f in _LINE_FIELDS:
+            original, corrected = _as_text(old.get(f)), _as_text(new.get(f))
+            if original != corrected:
+                changes.append((f"line.{f}", i, original, corrected))
+    return changes
+
+
+def record_corrections(session: Session, transaction: Transaction, before: dict) -> list[VerificationCorrection]:
+    """Append the diff between `before` and the transaction's current values. Caller commits."""
+    if transaction.id is None or transaction.budget_id is None:
+        return []
+    rows = [
+        VerificationCorrection(
+            budget_id=transaction.budget_id, transaction_id=transaction.id,
+            field=f, line_index=line_index, original=original, corrected=corrected,
+        )
+        for f, line_index, original, corrected in diff_snapshots(before, snapshot(transaction))
+    ]
+    session.add_all(rows)
+    return rows
+
+
+def detach_corrections(session: Session, transaction_id: int) -> None:
+    """Unlink a transaction's corrections before it is deleted; the rows stay in the history. Caller commits."""
+    session.execute(
+        update(VerificationCorrection)
+        .where(col(VerificationCorrection.transaction_id) == transaction_id)
+        .values(transaction_id=None)
+    )
+
+
+def merchant_aliases(session: Session, budget_id: int, names: list[str]) -> dict[str, str]:
+    """{parsed merchant name: confirmed name} for names users corrected often enough."""
+    if not names:
+        return {}
+    counts = session.exec(
+        select(
+            VerificationCorrection.original, VerificationCorrection.corrected, func.count(),
+        ).where(
+            VerificationCorrection.budget_id == budget_id,
+            VerificationCorrection.field == "merchant_name",
+            col(VerificationCorrection.original).in_(names),
+            col(VerificationCorrection.corrected).is_not(None),
+        ).group_by(col(VerificationCorrection.original), col(VerificationCorrection.corrected))
+    ).all()
+    aliases: dict[str, tuple[str, int]] = {}
+    for original, corrected, count in counts:
+        if count >= settings.CORRECTION_ALIAS_MIN_COUNT and count > aliases.get(original, ("", 0))[1]:
+            aliases[original] = (corrected, count)
+    return {original: corrected for original, (corrected, _) in aliases.items()}
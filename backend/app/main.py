@@ -3,13 +3,21 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from sqlmodel import Session, select, SQLModel
 
-from .api import router
+from .api import router, process_transaction_in_background
 from .database import operations_engine, identity_engine
 from .models import User
 from .auth import hash_password
+from .config import settings
+from .scan_queue import ScanQueueWorker, run_sweeper, sweep_stale_scans
+from .ocr_executor import shutdown_ocr_executor
+from .ocr_pipeline import shutdown_preprocess_pool
+from .bank_import import shutdown_pdf_pool
+from .category_classifier import flush_classifiers, run_flusher
+from .services import close_async_clients
 
 TEST_USER_EMAIL = "test@example.com"
 TEST_USER_PASSWORD = "password123"
@@ -42,8 +50,35 @@ async def lifespan(app: FastAPI):
     # Seeding
     if os.getenv("ENVIRONMENT") == "development":
         seed_test_user()
+
+    # Recover scans orphaned by the previous shutdown, then keep sweeping
+    with Session(operations_engine) as session:
+        swept = sweep_stale_scans(session)
+    if swept.requeued or swept.failed:
+        print(f"🧹 Orphaned scans: {swept.requeued} requeued, {swept.failed} marked FAILED")
+    sweeper_task = asyncio.create_task(run_sweeper())
+    classifier_flusher_task = asyncio.create_task(run_flusher())
+
+    # OCR queue — drained in-process unless dedicated workers are deployed
+    worker: ScanQueueWorker | None = None
+    worker_task: asyncio.Task | None = None
+    if settings.OCR_EMBEDDED_WORKER:
+        worker = ScanQueueWorker(process_transaction_in_background)
+        worker_task = asyncio.create_task(worker.run())
+
     yield
 
+    sweeper_task.cancel()
+    classifier_flusher_task.cancel()
+    if worker and worker_task:
+        await worker.drain(settings.OCR_WORKER_DRAIN_SECONDS)
+        await worker_task
+    shutdown_ocr_executor()
+    shutdown_preprocess_pool()
+    shutdown_pdf_pool()
+    flush_classifiers()
+    await close_async_clients()
+
 app = FastAPI(
     title="Smart Budget AI API",
     version="1.0.0",
@@ -145,6 +145,9 @@ class Transaction(TransactionBase, table=True):
 
 class ReceiptScan(SQLModel, table=True):
     __tablename__: str = "receiptscan"  # type: ignore
+    __table_args__ = (
+        Index("ix_receiptscan_status_lease", "status", "lease_expires_at"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     transaction_id: int = Field(foreign_key="transaction.id", index=True)
@@ -158,6 +161,13 @@ class ReceiptScan(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     validation_message: Optional[str] = Field(default=None)
 
+    # Durable job queue (see scan_queue.py) — a QUEUED row is a pending job,
+    # a RUNNING row is leased by `locked_by` until `lease_expires_at`.
+    attempts: int = Field(default=0)
+    locked_by: Optional[str] = Field(default=None)
+    lease_expires_at: Optional[datetime] = Field(default=None)
+    heartbeat_at: Optional[datetime] = Field(default=None)
+
     transaction: Optional[Transaction] = Relationship(back_populates="receipt_scan")
 
 
@@ -197,6 +207,42 @@ class EnvelopeAllocation(SQLModel, table=True):
     budget: Optional[Budget] = Relationship(back_populates="envelope_allocations")
     category: Optional["Category"] = Relationship(back_populates="envelope_allocations")
 
+# ─── CategoryMemo (import description → category, see category_memo.py) ───────
+
+class CategoryMemo(SQLModel, table=True):
+    __tablename__: str = "category_memo"  # type: ignore
+    __table_args__ = (
+        UniqueConstraint("budget_id", "normalized_description", name="uq_category_memo_budget_description"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    budget_id: int = Field(foreign_key="budget.id", index=True)
+    normalized_description: str
+    category_id: int = Field(foreign_key="category.id", index=True)
+    hit_count: int = Field(default=0)
+    last_used: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    source: str = Field(default="ai")  # ai | user — user entries are never overwritten by AI
+
+
+# ─── VerificationCorrection (append-only, see corrections.py) ─────────────────
+
+class VerificationCorrection(SQLModel, table=True):
+    __tablename__: str = "verification_correction"  # type: ignore
+    __table_args__ = (
+        Index("ix_verification_correction_lookup", "budget_id", "field", "original"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    budget_id: int = Field(foreign_key="budget.id")
+    # Kept (unlinked) when the transaction is deleted — the history still feeds merchant_aliases()
+    transaction_id: Optional[int] = Field(default=None, foreign_key="transaction.id", index=True, ondelete="SET NULL")
+    field: str                                   # merchant_name | total_amount | date | category_id | line.<name>
+    line_index: Optional[int] = Field(default=None)
+    original: Optional[str] = Field(default=None)
+    corrected: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
 # ─── API DTOs ────────────────────────────────────────────────────────────────
 
 class EnvelopeAllocationRead(SQLModel):
@@ -0,0 +1,138 @@
+# backend/app/ocr_batcher.py
+"""
+Micro-batching of Google Vision calls for bursts of uploads.
+
+Concurrent scan jobs in one process submit their image bytes here instead of
+each issuing its own document_text_detection call. Submissions are collected
+until OCR_VISION_BATCH_SIZE images are pending (Vision accepts at most 16 per
+batch_annotate_images request) or OCR_VISION_BATCH_MAX_WAIT_MS has passed since
+the first one, then sent as one async request. Responses come back in request
+order and are handed to the matching job; a per-image error only fails that job
+(the caller falls back to AI vision for it rather than re-sending it to Vision).
+
+The OCR result cache is checked before a job joins a batch, so cache hits never
+wait. A batch can never be larger than the number of jobs running concurrently
+in the process (OCR_WORKER_CONCURRENCY + prefetch).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from typing import Any, Optional
+
+from .config import settings
+from .ocr_cache import archive_ocr_result, get_ocr_cache
+from .ocr_pipeline import (
+    OCRResult, _parse_document_response, is_transport_error, preprocess_image_async, vision_clients,
+)
+
+logger = logging.getLogger(__name__)
+
+# Hard limit of images per batch_annotate_images request
+VISION_MAX_BATCH = 16
+
+
+class VisionBatcher:
+    def __init__(self, max_batch_size: int, max_wait: float) -> None:
+        self.max_batch_size = max(1, min(max_batch_size, VISION_MAX_BATCH))
+        self.max_wait = max(0.0, max_wait)
+        self._pending: list[tuple[bytes, asyncio.Future[OCRResult]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: set[asyncio.Task[None]] = set()
+
+    async def submit(self, image_bytes: bytes) -> OCRResult:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[OCRResult] = loop.create_future()
+        self._pending.append((image_bytes, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Jobs cancelled (timed out) while waiting are not sent
+        batch = [(image, fut) for image, fut in self._pending if not fut.done()]
+        self._pending = []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._send(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: list[tuple[bytes, asyncio.Future[OCRResult]]]) -> None:
+        try:
+            responses = await self._annotate([image for image, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        logger.info("Vision batch annotated", extra={"images": len(batch)})
+        for (_, fut), response in zip(batch, responses):
+            if fut.done():
+                continue
+            try:
+                fut.set_result(_parse_document_response(response))
+            except Exception as e:
+                fut.set_exception(e)
+
+    @staticmethod
+    async def _annotate(images: list[bytes]) -> list[Any]:
+        client = vision_clients.acquire_async(asyncio.get_running_loop())
+        vision = vision_clients.vision
+        if client is None or vision is None:
+            raise RuntimeError("google-cloud-vision is not installed")
+
+        feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+        requests = [vision.AnnotateImageRequest(image=vision.Image(content=image), features=[feature]) for image in images]
+        try:
+            batch = await client.batch_annotate_images(requests=requests)
+        except Exception as e:
+            if is_transport_error(e):
+                vision_clients.discard(client)
+            raise
+        return list(batch.responses)
+
+
+_batchers: dict[asyncio.AbstractEventLoop, VisionBatcher] = {}
+
+
+def get_vision_batcher() -> Optional[VisionBatcher]:
+    """Batcher for the running loop, or None when batching is off or the Vision SDK is missing."""
+    if settings.OCR_VISION_BATCH_SIZE <= 1 or vision_clients.vision is None:
+        return None
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        for stale in [lp for lp in _batchers if lp.is_closed()]:
+            del _batchers[stale]
+        batcher = VisionBatcher(settings.OCR_VISION_BATCH_SIZE, settings.OCR_VISION_BATCH_MAX_WAIT_MS / 1000)
+        _batchers[loop] = batcher
+    return batcher
+
+
+async def extract_ocr_batched(batcher: VisionBatcher, image_bytes: bytes) -> tuple[OCRResult, bool]:
+    """Async counterpart of AIService._extract_ocr: cache first, then a shared Vision batch. Returns (result, cache_hit)."""
+    cache = get_ocr_cache()
+    content_hash = hashlib.sha256(image_bytes).hexdigest()
+    # Cache and archive I/O (and the cache's eviction scan) run on the default thread pool, off the loop
+    if cache:
+        cached = await asyncio.to_thread(cache.get, content_hash)
+        if cached is not None:
+            await asyncio.to_thread(archive_ocr_result, content_hash, cached)
+            return cached, True
+
+    result = await batcher.submit(await preprocess_image_async(image_bytes))
+    if cache:
+        try:
+            await asyncio.to_thread(cache.put, content_hash, result)
+        except OSError as e:
+            logger.warning("Could not store OCR result in cache", extra={"error": str(e)})
+    await asyncio.to_thread(archive_ocr_result, content_hash, result)
+    return result, False
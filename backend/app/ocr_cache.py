@@ -0,0 +1,257 @@
+# backend/app/ocr_cache.py
+"""
+On-disk OCR result cache keyed by the SHA-256 of the image bytes
+(the same value stored as ReceiptScan.content_hash).
+
+Retries, forced re-uploads and parser re-runs reuse the stored OCRResult instead
+of calling Google Vision again. One gzip'd JSON file per entry, words stored
+columnar (OCRWordTable): a text list plus the base64 of the little-endian float32
+coordinate array, decoded without per-word objects. Eviction is LRU by
+file mtime (touched on every hit) once the directory exceeds max_bytes.
+
+Safe to share between processes: writes go through a temp file + os.replace.
+
+The cache may evict what bulk re-parse needs, so every OCR result is also kept
+in OCRArchive (OCR_ARCHIVE_DIR): same file format, one entry per scanned
+content hash, never evicted, deleted together with the last transaction whose
+scan references it.
+"""
+from __future__ import annotations
+
+import base64
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+from array import array
+from typing import Optional
+
+from .config import settings
+from .ocr_pipeline import OCRResult, OCRWordTable
+
+logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 2
+_SUFFIX = ".ocr.json.gz"
+
+
+# ── Serialization ──────────────────────────────────────────────────────────────
+
+def _coords_to_le_bytes(coords: array) -> bytes:
+    if sys.byteorder == "little":
+        return coords.tobytes()
+    swapped = array("f", coords)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _coords_from_le_bytes(blob: bytes) -> array:
+    coords = array("f")
+    coords.frombytes(blob)
+    if sys.byteorder != "little":
+        coords.byteswap()
+    return coords
+
+
+def encode_result(result: OCRResult) -> bytes:
+    table = result.words if isinstance(result.words, OCRWordTable) else OCRWordTable.from_words(result.words)
+    payload = {
+        "v": _FORMAT_VERSION,
+        "engine": result.source_engine,
+        "raw_text": result.raw_text,
+        "texts": table.texts,
+        "coords": base64.b64encode(_coords_to_le_bytes(table.coords)).decode("ascii"),
+    }
+    return gzip.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_result(blob: bytes) -> OCRResult:
+    payload = json.loads(gzip.decompress(blob))
+    if payload.get("v") == _FORMAT_VERSION:
+        words = OCRWordTable(payload["texts"], _coords_from_le_bytes(base64.b64decode(payload["coords"])))
+    elif payload.get("v") == 1:
+        # Row format [text, x_min, y_min, x_max, y_max, confidence] — still read so
+        # older entries remain usable for bulk re-parse.
+        words = OCRWordTable()
+        for row in payload["words"]:
+            words.append(*row)
+    else:
+        raise ValueError(f"Unsupported OCR cache format: {payload.get('v')}")
+    return OCRResult(
+        words=words,
+        raw_text=payload["raw_text"],
+        source_engine=payload["engine"],
+    )
+
+
+# ── Stats ──────────────────────────────────────────────────────────────────────
+
+class CacheStats:
+    """Per-stage hit/miss counters for this process."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts: dict[str, dict[str, int]] = {}
+
+    def record(self, stage: str, hit: bool) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(stage, {"hits": 0, "misses": 0})
+            counts["hits" if hit else "misses"] += 1
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {stage: dict(counts) for stage, counts in self._counts.items()}
+
+
+cache_stats = CacheStats()
+
+
+# ── Store ──────────────────────────────────────────────────────────────────────
+
+class OCRResultCache:
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}{_SUFFIX}")
+
+    def _entries(self) -> list[os.DirEntry]:
+        return [e for e in os.scandir(self.directory) if e.name.endswith(_SUFFIX)]
+
+    def get(self, content_hash: str) -> Optional[OCRResult]:
+        path = self._path(content_hash)
+        try:
+            with open(path, "rb") as f:
+                result = decode_result(f.read())
+            os.utime(path)  # LRU: a hit makes the entry most recently used
+            return result
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Dropping unreadable OCR cache entry", extra={"hash": content_hash, "error": str(e)})
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def put(self, content_hash: str, result: OCRResult) -> None:
+        blob = encode_result(result)
+        path = self._path(content_hash)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = sum(e.stat().st_size for e in self._entries())
+            else:
+                self._approx_bytes += len(blob)
+            if self._approx_bytes > self.max_bytes:
+                self._approx_bytes = self._evict()
+
+    def _evict(self) -> int:
+        """Delete least recently used entries until the store fits in 90% of max_bytes."""
+        entries = []
+        for e in self._entries():
+            try:
+                st = e.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+    def stats(self) -> dict[str, int]:
+        entries = self._entries()
+        return {"entries": len(entries), "bytes": sum(e.stat().st_size for e in entries), "max_bytes": self.max_bytes}
+
+
+_cache: Optional[OCRResultCache] = None
+
+
+class OCRArchive:
+    """Durable OCR results keyed by ReceiptScan.content_hash (no size limit, no LRU)."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}{_SUFFIX}")
+
+    def get(self, content_hash: str) -> Optional[OCRResult]:
+        try:
+            with open(self._path(content_hash), "rb") as f:
+                return decode_result(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Unreadable OCR archive entry", extra={"hash": content_hash, "error": str(e)})
+            return None
+
+    def put(self, content_hash: str, result: OCRResult) -> None:
+        """Write once — an existing entry for the same bytes is the same OCR."""
+        path = self._path(content_hash)
+        if os.path.exists(path):
+            return
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(encode_result(result))
+        os.replace(tmp, path)
+
+    def delete(self, content_hash: str) -> None:
+        try:
+            os.remove(self._path(content_hash))
+        except FileNotFoundError:
+            pass
+
+
+def get_ocr_cache() -> Optional[OCRResultCache]:
+    """Process-wide cache, or None when disabled (OCR_CACHE_MAX_MB=0)."""
+    global _cache
+    if settings.OCR_CACHE_MAX_MB <= 0:
+        return None
+    if _cache is None or _cache.directory != settings.OCR_CACHE_DIR:
+        _cache = OCRResultCache(settings.OCR_CACHE_DIR, settings.OCR_CACHE_MAX_MB * 1024 * 1024)
+    return _cache
+
+
+_archive: Optional[OCRArchive] = None
+
+
+def get_ocr_archive() -> Optional[OCRArchive]:
+    """Process-wide archive, or None when disabled (OCR_ARCHIVE_DIR empty)."""
+    global _archive
+    if not settings.OCR_ARCHIVE_DIR:
+        return None
+    if _archive is None or _archive.directory != settings.OCR_ARCHIVE_DIR:
+        _archive = OCRArchive(settings.OCR_ARCHIVE_DIR)
+    return _archive
+
+
+def archive_ocr_result(content_hash: str, result: OCRResult) -> None:
+    """Keep an OCR result for re-parse; also backfills entries that so far only lived in the cache."""
+    archive = get_ocr_archive()
+    if archive is None:
+        return
+    try:
+        archive.put(content_hash, result)
+    except OSError as e:
+        logger.warning("Could not archive OCR result", extra={"hash": content_hash, "error": str(e)})
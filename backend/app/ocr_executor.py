@@ -0,0 +1,218 @@
+# backend/app/ocr_executor.py
+"""
+Dedicated, bounded executor for the receipt pipeline (AIService.parse_receipt).
+
+The pipeline used to run on the loop's default thread pool. When a job timed out
+the coroutine was cancelled but the thread kept running, holding a Vision/OpenAI
+connection — and the same pool serves FastAPI's sync endpoints.
+
+Mode "process" (default): a fixed set of long-lived worker processes, one task
+at a time each. A task that times out or whose awaiting coroutine is cancelled
+gets its process killed and replaced, so nothing keeps running in the background.
+The event loop never blocks on a worker: tasks are sent on a thread, results are
+read without blocking by a loop reader, and killed processes are reaped on a thread.
+Mode "thread": a separate bounded ThreadPoolExecutor — no kill, but isolated
+from the default pool.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _slot_main(tasks: multiprocessing.connection.Connection, results: multiprocessing.connection.Connection) -> None:
+    """Worker process loop: receive (fn, args), send back ("ok", result) | ("error", message)."""
+    while True:
+        try:
+            fn, args = tasks.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        try:
+            results.send(("ok", fn(*args)))
+        except Exception as e:
+            results.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _ProcessSlot:
+    def __init__(self, ctx: Any) -> None:
+        # One-way pipes: `tasks` stays blocking (written on a thread), `results` is
+        # non-blocking so the loop reader can take a large result in pieces.
+        child_tasks, self.tasks = ctx.Pipe(duplex=False)
+        self.results, child_results = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(target=_slot_main, args=(child_tasks, child_results), daemon=True)
+        self.process.start()
+        child_tasks.close()
+        child_results.close()
+        os.set_blocking(self.results.fileno(), False)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        """SIGKILL the process — returns at once; reap() waits for it."""
+        self.process.kill()
+
+    def reap(self) -> None:
+        """Blocking: wait for the killed process and close the pipes. Run it on a thread from the loop."""
+        self.process.join(timeout=5)
+        self.tasks.close()
+        self.results.close()
+
+
+class _MessageReader:
+    """
+    Reassembles one multiprocessing.Connection message from a non-blocking fd:
+    a big-endian int32 length (-1 → uint64 length follows), then the pickle.
+    """
+
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+        self.buf = bytearray()
+
+    def read(self) -> Optional[bytes]:
+        """The message once complete, None while more bytes are expected. EOFError if the writer is gone."""
+        while True:
+            try:
+                chunk = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                return None
+            if not chunk:
+                raise EOFError
+            self.buf += chunk
+            header, size = self._header()
+            if size is not None and len(self.buf) >= header + size:
+                return bytes(self.buf[header:header + size])
+
+    def _header(self) -> tuple[int, Optional[int]]:
+        if len(self.buf) < 4:
+            return 4, None
+        (size,) = struct.unpack("!i", self.buf[:4])
+        if size != -1:
+            return 4, size
+        if len(self.buf) < 12:
+            return 12, None
+        return 12, struct.unpack("!Q", self.buf[4:12])[0]
+
+
+class OCRExecutor:
+    def __init__(self, max_workers: int, mode: str = "process") -> None:
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Unknown OCR executor mode: {mode}")
+        self.max_workers = max(1, max_workers)
+        self.mode = mode
+        self._ctx = multiprocessing.get_context("spawn")
+        self._threads: Optional[ThreadPoolExecutor] = None
+        # Process slots are created lazily; None marks a free place for a new process.
+        self._idle: Optional[asyncio.Queue[Optional[_ProcessSlot]]] = None
+        self._slots: set[_ProcessSlot] = set()
+        self._lock = threading.Lock()
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run fn(*args) off the event loop. `fn` and its result must be picklable in process mode."""
+        if self.mode == "thread":
+            return await self._run_thread(fn, args, timeout)
+        return await self._run_process(fn, args, timeout)
+
+    async def _run_thread(self, fn: Callable[..., Any], args: tuple, timeout: Optional[float]) -> Any:
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ocr")
+        future = asyncio.get_running_loop().run_in_executor(self._threads, fn, *args)
+        return await asyncio.wait_for(future, timeout)
+
+    async def _run_process(self, fn: Callable[..., Any], args: tuple, timeout: Optional[float]) -> Any:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.max_workers):
+                self._idle.put_nowait(None)
+
+        slot = await self._idle.get()
+        healthy = False
+        try:
+            if slot is None or not slot.alive:
+                slot = _ProcessSlot(self._ctx)
+                self._slots.add(slot)
+            result = await asyncio.wait_for(self._call(slot, fn, args), timeout)
+            healthy = True
+        finally:
+            if not healthy and slot is not None:
+                # Timed out, cancelled or crashed — never leave the task running.
+                logger.warning("Killing OCR worker process", extra={"pid": slot.process.pid})
+                slot.kill()
+                asyncio.get_running_loop().run_in_executor(None, slot.reap)
+                self._slots.discard(slot)
+                slot = None
+            self._idle.put_nowait(slot)
+
+        status, payload = result
+        if status == "error":
+            raise RuntimeError(payload)
+        return payload
+
+    @staticmethod
+    async def _call(slot: _ProcessSlot, fn: Callable[..., Any], args: tuple) -> tuple[str, Any]:
+        loop = asyncio.get_running_loop()
+        received: asyncio.Future[bytes] = loop.create_future()
+        reader = _MessageReader(slot.results.fileno())
+
+        def on_readable() -> None:
+            if received.done():
+                return
+            try:
+                message = reader.read()
+            except (EOFError, OSError):
+                received.set_exception(RuntimeError("OCR worker process died"))
+                return
+            if message is not None:
+                received.set_result(message)
+
+        loop.add_reader(reader.fd, on_readable)
+        try:
+            try:
+                await asyncio.to_thread(slot.tasks.send, (fn, args))
+            except BrokenPipeError:
+                raise RuntimeError("OCR worker process died") from None
+            message = await received
+        finally:
+            loop.remove_reader(reader.fd)
+        return pickle.loads(message)
+
+    def shutdown(self) -> None:
+        for slot in list(self._slots):
+            slot.kill()
+            slot.reap()
+        self._slots.clear()
+        self._idle = None
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+
+
+_executor: Optional[OCRExecutor] = None
+
+
+def get_ocr_executor() -> OCRExecutor:
+    global _executor
+    if _executor is None:
+        _executor = OCRExecutor(settings.OCR_EXECUTOR_WORKERS, settings.OCR_EXECUTOR_MODE)
+    return _executor
+
+
+def shutdown_ocr_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
@@ -1,12 +1,20 @@
 # backend/app/ocr_pipeline.py
 from __future__ import annotations
 
+import asyncio
+import io
 import json
 import os
 import re
+import threading
+import weakref
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional
+from typing import Any, Iterable, Iterator, Optional, Sequence, Union, overload
+
+from .config import settings
 
 
 class ReceiptSource(str, Enum):
@@ -18,7 +26,7 @@ class ReceiptSource(str, Enum):
 
 # ── Data types ─────────────────────────────────────────────────────────────────
 
-@dataclass
+@dataclass(slots=True)
 class BoundingBox:
     x_min: float
     y_min: float
@@ -34,16 +42,94 @@ class BoundingBox:
         return self.y_max - self.y_min
 
 
-@dataclass
+@dataclass(slots=True)
 class OCRWord:
     text: str
     bounding_box: BoundingBox
     confidence: float = 1.0
 
 
+class OCRWordTable:
+    """
+    Columnar word storage: texts plus one float32 array with 5 values per word
+    (x_min, y_min, x_max, y_max, confidence).
+
+    GoogleVisionOCRService.extract fills it directly and reconstruct_lines / the OCR
+    cache read the columns without building per-word objects. Indexing or iterating
+    builds OCRWord objects on demand (copies — mutating one does not change the
+    table) and slicing returns a new OCRWordTable, so code reading list[OCRWord]
+    keeps working. Coordinates are float32 — equality is compared at that precision.
+    """
+
+    STRIDE = 5
+    __slots__ = ("texts", "coords")
+
+    def __init__(self, texts: Optional[list[str]] = None, coords: Optional[array] = None) -> None:
+        self.texts: list[str] = texts if texts is not None else []
+        self.coords: array = coords if coords is not None else array("f")
+        if len(self.coords) != len(self.texts) * self.STRIDE:
+            raise ValueError("coords must hold exactly 5 values per text")
+
+    @classmethod
+    def from_words(cls, words: Iterable[OCRWord]) -> "OCRWordTable":
+        table = cls()
+        for w in words:
+            b = w.bounding_box
+            table.append(w.text, b.x_min, b.y_min, b.x_max, b.y_max, w.confidence)
+        return table
+
+    def append(self, text: str, x_min: float, y_min: float, x_max: float, y_max: float, confidence: float = 1.0) -> None:
+        self.texts.append(text)
+        self.coords.extend((x_min, y_min, x_max, y_max, confidence))
+
+    def column(self, index: int) -> array:
+        """A copy of one coordinate column: 0=x_min, 1=y_min, 2=x_max, 3=y_max, 4=confidence."""
+        return self.coords[index::self.STRIDE]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @overload
+    def __getitem__(self, i: int) -> OCRWord: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> "OCRWordTable": ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[OCRWord, "OCRWordTable"]:
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self.texts))
+            if step == 1:
+                return OCRWordTable(self.texts[start:stop], self.coords[start * self.STRIDE:stop * self.STRIDE])
+            table = OCRWordTable()
+            for j in range(start, stop, step):
+                table.texts.append(self.texts[j])
+                table.coords.extend(self.coords[j * self.STRIDE:(j + 1) * self.STRIDE])
+            return table
+        if i < 0:
+            i += len(self.texts)
+        if not 0 <= i < len(self.texts):
+            raise IndexError("OCRWordTable index out of range")
+        x0, y0, x1, y1, conf = self.coords[i * self.STRIDE:(i + 1) * self.STRIDE]
+        return OCRWord(text=self.texts[i], bounding_box=BoundingBox(x0, y0, x1, y1), confidence=conf)
+
+    def __iter__(self) -> Iterator[OCRWord]:
+        for i in range(len(self.texts)):
+            yield self[i]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, OCRWordTable):
+            return self.texts == other.texts and self.coords == other.coords
+        if isinstance(other, list):
+            return self == OCRWordTable.from_words(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"OCRWordTable({len(self)} words)"
+
+
 @dataclass
 class OCRResult:
-    words: list[OCRWord]
+    words: Union[list[OCRWord], OCRWordTable]
     raw_text: str
     source_engine: str
 
@@ -57,7 +143,7 @@ class ReceiptSourceDetector:
         name = (filename or "").lower()
 
         if "pdf" in mime or name.endswith(".pdf"):
-            # PDFTextLayerAdapter will verify if text layer actually exists (#179)
+            # PDFTextLayerAdapter.extract returns None when there is no text layer (→ PDF_IMAGE)
             return ReceiptSource.PDF_TEXT
 
         # All PNG/JPG treated as APP_PNG for now.
@@ -65,31 +151,305 @@ class ReceiptSourceDetector:
         return ReceiptSource.APP_PNG
 
 
+# ── PDF Text Layer ─────────────────────────────────────────────────────────────
+
+# Average glyph advance as a fraction of the font size — used only to place words
+# of a multi-word text run; exact widths don't matter for line reconstruction.
+_PDF_AVG_CHAR_WIDTH = 0.5
+
+
+class PDFTextLayerAdapter:
+    """
+    Builds an OCRResult from a PDF's text layer (e-receipts exported by apps) — no OCR call.
+
+    Positioned text runs come from pypdf's extract_text visitor; each run is split into
+    words with estimated boxes in top-down page coordinates (pages stacked vertically),
+    so the result feeds reconstruct_lines like Vision output.
+    """
+
+    @staticmethod
+    def extract(pdf_bytes: bytes) -> Optional[OCRResult]:
+        """OCRResult from the text layer, or None when there is none (scanned PDF → PDF_IMAGE)."""
+        from pypdf import PdfReader
+
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        words = OCRWordTable()
+        page_texts: list[str] = []
+        page_top = 0.0
+
+        for page in reader.pages:
+            page_height = float(page.mediabox.height)
+
+            # Called synchronously by extract_text below, so page_top/page_height are this page's
+            def visit(text: str, cm: list, tm: list, font_dict: Any, font_size: float) -> None:
+                if not text.strip():
+                    return
+                a = tm[0] * cm[0] + tm[1] * cm[2]
+                b = tm[0] * cm[1] + tm[1] * cm[3]
+                c = tm[2] * cm[0] + tm[3] * cm[2]
+                d = tm[2] * cm[1] + tm[3] * cm[3]
+                x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+                y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+                size = (font_size or 1.0) * ((c * c + d * d) ** 0.5)
+                char_width = _PDF_AVG_CHAR_WIDTH * (font_size or 1.0) * ((a * a + b * b) ** 0.5)
+                y_max = page_top + page_height - y  # baseline, flipped to top-down
+                for match in re.finditer(r"\S+", text):
+                    x_min = x + match.start() * char_width
+                    words.append(match.group(), x_min, y_max - size, x_min + len(match.group()) * char_width, y_max)
+
+            page_texts.append(page.extract_text(visitor_text=visit))
+            page_top += page_height
+
+        if not words:
+            return None
+        return OCRResult(words=words, raw_text="\n".join(page_texts), source_engine="pdf_text_layer")
+
+    @staticmethod
+    def page_image(pdf_bytes: bytes) -> Optional[bytes]:
+        """Largest embedded image on the first page — the scan inside an image-only PDF."""
+        from pypdf import PdfReader
+
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        if not reader.pages:
+            return None
+        try:
+            images = list(reader.pages[0].images)
+        except Exception as e:
+            print(f"⚠️ [Pipeline] Could not read images from PDF: {e}")
+            return None
+        return max((img.data for img in images), key=len, default=None)
+
+
+# ── Image Pre-processing ───────────────────────────────────────────────────────
+
+def preprocess_image(image_bytes: bytes) -> bytes:
+    """
+    Shrink phone photos before OCR / AI vision: apply EXIF orientation, downscale to
+    OCR_PREPROCESS_MAX_PIXELS, convert to grayscale and re-encode as JPEG.
+
+    The whole image is kept (never cropped or tiled). Small uploads (< OCR_PREPROCESS_MIN_BYTES),
+    undecodable input, a missing Pillow install, or a result that is not smaller all
+    return the original bytes. CPU-bound — call from a worker, or via preprocess_image_async.
+    """
+    if not settings.OCR_PREPROCESS_ENABLED or len(image_bytes) < settings.OCR_PREPROCESS_MIN_BYTES:
+        return image_bytes
+    try:
+        from PIL import Image, ImageOps  # type: ignore[import]
+    except ImportError:
+        return image_bytes
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img = ImageOps.exif_transpose(img)
+            pixels = img.width * img.height
+            if pixels > settings.OCR_PREPROCESS_MAX_PIXELS:
+                scale = (settings.OCR_PREPROCESS_MAX_PIXELS / pixels) ** 0.5
+                img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), Image.LANCZOS)
+            img = img.convert("L")
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=settings.OCR_PREPROCESS_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        print(f"⚠️ [Pipeline] Image pre-processing skipped: {e}")
+        return image_bytes
+
+    processed = out.getvalue()
+    return processed if len(processed) < len(image_bytes) else image_bytes
+
+
+_preprocess_pool: Optional[ProcessPoolExecutor] = None
+_preprocess_pool_lock = threading.Lock()
+
+
+async def preprocess_image_async(image_bytes: bytes) -> bytes:
+    """preprocess_image on a dedicated process pool (OCR_PREPROCESS_WORKERS), off the event loop."""
+    global _preprocess_pool
+    if not settings.OCR_PREPROCESS_ENABLED or len(image_bytes) < settings.OCR_PREPROCESS_MIN_BYTES:
+        return image_bytes
+    with _preprocess_pool_lock:
+        if _preprocess_pool is None:
+            import multiprocessing
+            _preprocess_pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.OCR_PREPROCESS_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return await asyncio.get_running_loop().run_in_executor(_preprocess_pool, preprocess_image, image_bytes)
+
+
+def shutdown_preprocess_pool() -> None:
+    global _preprocess_pool
+    with _preprocess_pool_lock:
+        if _preprocess_pool is not None:
+            _preprocess_pool.shutdown(wait=False, cancel_futures=True)
+            _preprocess_pool = None
+
+
 # ── Google Vision OCR ──────────────────────────────────────────────────────────
 
-class GoogleVisionOCRService:
+class VisionClientPool:
     """
-    Wraps Google Vision DOCUMENT_TEXT_DETECTION.
-    Use this, not TEXT_DETECTION — it preserves spatial word structure via boundingPoly.
+    Process-wide Google Vision clients, created lazily on first use.
+
+    The SDK import and service-account credentials are resolved once per process;
+    clients (one gRPC channel each) are reused across jobs and handed out
+    round-robin. A client whose call fails at the transport level is discarded
+    and rebuilt on next use. Async clients are bound to their event loop, so one
+    is kept per loop.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, size: int) -> None:
+        self.size = max(1, size)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._vision: Any = None
+        self._credentials: Any = None
+        self._clients: list[Any] = []
+        self._next = 0
+        self._async_clients: weakref.WeakKeyDictionary[Any, Any] = weakref.WeakKeyDictionary()
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
         try:
             from google.cloud import vision  # type: ignore[import]
-            credentials = None
             creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
             if creds_json:
                 from google.oauth2 import service_account  # type: ignore[import]
                 info = json.loads(creds_json)
-                credentials = service_account.Credentials.from_service_account_info(
+                self._credentials = service_account.Credentials.from_service_account_info(
                     info,
                     scopes=["https://www.googleapis.com/auth/cloud-platform"],
                 )
-            self._client = vision.ImageAnnotatorClient(credentials=credentials)
             self._vision = vision
         except ImportError:
-            self._client = None
             self._vision = None
+        self._loaded = True
+
+    @property
+    def vision(self) -> Any:
+        with self._lock:
+            self._load()
+            return self._vision
+
+    def acquire(self) -> Any:
+        """Return a shared sync client, or None when google-cloud-vision is not installed."""
+        with self._lock:
+            self._load()
+            if self._vision is None:
+                return None
+            if len(self._clients) < self.size:
+                client = self._vision.ImageAnnotatorClient(credentials=self._credentials)
+                self._clients.append(client)
+                return client
+            self._next = (self._next + 1) % len(self._clients)
+            return self._clients[self._next]
+
+    def acquire_async(self, loop: Any) -> Any:
+        """Return the async client for `loop`, or None when the SDK is not installed."""
+        with self._lock:
+            self._load()
+            if self._vision is None:
+                return None
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._vision.ImageAnnotatorAsyncClient(credentials=self._credentials)
+                self._async_clients[loop] = client
+            return client
+
+    def discard(self, client: Any) -> None:
+        """Drop an unhealthy client (broken channel); the next acquire builds a fresh one."""
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+            for loop, async_client in list(self._async_clients.items()):
+                if async_client is client:
+                    del self._async_clients[loop]
+        transport = getattr(client, "transport", None)
+        try:
+            if transport is not None and hasattr(transport, "close"):
+                transport.close()
+        except Exception:
+            pass
+
+    def reset(self) -> None:
+        with self._lock:
+            self._clients.clear()
+            self._async_clients.clear()
+            self._next = 0
+            self._loaded = False
+            self._vision = None
+            self._credentials = None
+
+
+vision_clients = VisionClientPool(settings.OCR_VISION_CLIENT_POOL_SIZE)
+
+
+# google.api_core exceptions for a broken or stalled channel (matched by name — optional dependency)
+_TRANSPORT_ERRORS = ("ServiceUnavailable", "DeadlineExceeded")
+_TRANSPORT_GRPC_CODES = ("UNAVAILABLE", "DEADLINE_EXCEEDED")
+
+
+def is_transport_error(e: Exception) -> bool:
+    """
+    A broken channel rather than a bad request: ServiceUnavailable / DeadlineExceeded,
+    raw gRPC errors with those status codes, and connection errors. InvalidArgument
+    (bad image), PermissionDenied, ResourceExhausted etc. keep the client.
+    """
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    if any(cls.__name__ in _TRANSPORT_ERRORS for cls in type(e).__mro__):
+        return True
+    code = getattr(e, "code", None)
+    if callable(code) and (type(e).__module__ or "").startswith("grpc"):
+        try:
+            return getattr(code(), "name", "") in _TRANSPORT_GRPC_CODES
+        except Exception:
+            return False
+    return False
+
+
+def _parse_document_response(response: Any) -> OCRResult:
+    if response.error.message:
+        raise RuntimeError(f"Google Vision error: {response.error.message}")
+
+    words = OCRWordTable()
+    for page in response.full_text_annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    x_min = y_min = float("inf")
+                    x_max = y_max = float("-inf")
+                    for v in word.bounding_box.vertices:
+                        x_min, x_max = min(x_min, v.x), max(x_max, v.x)
+                        y_min, y_max = min(y_min, v.y), max(y_max, v.y)
+                    words.append(
+                        "".join(symbol.text for symbol in word.symbols),
+                        x_min, y_min, x_max, y_max,
+                        getattr(word, "confidence", 1.0),
+                    )
+
+    return OCRResult(
+        words=words,
+        raw_text=response.full_text_annotation.text,
+        source_engine="google_vision_document",
+    )
+
+
+_NOT_INSTALLED = (
+    "google-cloud-vision is not installed. "
+    "Add it to requirements.txt and set GOOGLE_APPLICATION_CREDENTIALS."
+)
+
+
+class GoogleVisionOCRService:
+    """
+    Wraps Google Vision DOCUMENT_TEXT_DETECTION.
+    Use this, not TEXT_DETECTION — it preserves spatial word structure via boundingPoly.
+    Cheap to construct: the client comes from the shared vision_clients pool.
+    """
+
+    def __init__(self) -> None:
+        self._client = vision_clients.acquire()
+        self._vision = vision_clients.vision if self._client is not None else None
 
     @property
     def available(self) -> bool:
@@ -97,86 +457,109 @@ class GoogleVisionOCRService:
 
     def extract(self, image_bytes: bytes) -> OCRResult:
         if not self._client or not self._vision:
-            raise RuntimeError(
-                "google-cloud-vision is not installed. "
-                "Add it to requirements.txt and set GOOGLE_APPLICATION_CREDENTIALS."
-            )
+            raise RuntimeError(_NOT_INSTALLED)
 
         image = self._vision.Image(content=image_bytes)
-        response = self._client.document_text_detection(image=image)  # type: ignore[attr-defined]
-
-        if response.error.message:
-            raise RuntimeError(f"Google Vision error: {response.error.message}")
-
-        words: list[OCRWord] = []
-        for page in response.full_text_annotation.pages:
-            for block in page.blocks:
-                for paragraph in block.paragraphs:
-                    for word in paragraph.words:
-                        text = "".join(symbol.text for symbol in word.symbols)
-                        verts = word.bounding_box.vertices
-                        xs = [v.x for v in verts]
-                        ys = [v.y for v in verts]
-                        bbox = BoundingBox(
-                            x_min=min(xs), y_min=min(ys),
-                            x_max=max(xs), y_max=max(ys),
-                        )
-                        words.append(OCRWord(
-                            text=text,
-                            bounding_box=bbox,
-                            confidence=getattr(word, "confidence", 1.0),
-                        ))
-
-        return OCRResult(
-            words=words,
-            raw_text=response.full_text_annotation.text,
-            source_engine="google_vision_document",
+        try:
+            response = self._client.document_text_detection(image=image)  # type: ignore[attr-defined]
+        except Exception as e:
+            if is_transport_error(e):
+                vision_clients.discard(self._client)
+            raise
+
+        return _parse_document_response(response)
+
+
+class AsyncGoogleVisionOCRService:
+    """
+    DOCUMENT_TEXT_DETECTION through the Vision async client — the event loop can
+    drive several OCR calls concurrently without executor threads.
+    """
+
+    async def extract(self, image_bytes: bytes) -> OCRResult:
+        client = vision_clients.acquire_async(asyncio.get_running_loop())
+        vision = vision_clients.vision
+        if client is None or vision is None:
+            raise RuntimeError(_NOT_INSTALLED)
+
+        request = vision.AnnotateImageRequest(
+            image=vision.Image(content=image_bytes),
+            features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
         )
+        try:
+            batch = await client.batch_annotate_images(requests=[request])
+        except Exception as e:
+            if is_transport_error(e):
+                vision_clients.discard(client)
+            raise
+
+        return _parse_document_response(batch.responses[0])
 
 
 # ── Line Reconstruction ────────────────────────────────────────────────────────
 
-def reconstruct_lines(words: list[OCRWord], y_tolerance: Optional[float] = None) -> list[str]:
+def reconstruct_lines(words: Union[Sequence[OCRWord], OCRWordTable], y_tolerance: Optional[float] = None) -> list[str]:
     """
     Reconstruct text lines from bounding box geometry.
 
-    Algorithm:
+    Algorithm (O(n log n)):
       1. Sort words by center_y (top to bottom)
       2. Group into lines: a word joins current line if |center_y - line_avg_y| <= tolerance
+         (line_avg_y maintained incrementally)
       3. Sort words within each line by x_min (left to right)
       4. Join with spaces
 
     y_tolerance defaults to 50% of average word height — tight for clean PNGs (~5-8px),
     auto-relaxed for photos where lines are less perfectly aligned.
+
+    An OCRWordTable is read column-wise, without building OCRWord views.
     """
     if not words:
         return []
 
+    if isinstance(words, OCRWordTable):
+        texts = words.texts
+        x_mins: Sequence[float] = words.column(0)
+        y_mins: Sequence[float] = words.column(1)
+        y_maxs: Sequence[float] = words.column(3)
+    else:
+        boxes = [w.bounding_box for w in words]
+        texts = [w.text for w in words]
+        x_mins = [b.x_min for b in boxes]
+        y_mins = [b.y_min for b in boxes]
+        y_maxs = [b.y_max for b in boxes]
+
     if y_tolerance is None:
-        heights = [w.bounding_box.height for w in words if w.bounding_box.height > 0]
+        heights = [y1 - y0 for y0, y1 in zip(y_mins, y_maxs) if y1 > y0]
         avg_height = sum(heights) / len(heights) if heights else 10.0
         y_tolerance = max(5.0, avg_height * 0.5)
 
-    sorted_words = sorted(words, key=lambda w: w.bounding_box.center_y)
+    # Centers computed once; line centroid kept as a running sum (identical
+    # arithmetic to re-summing the line, without the per-word O(line) pass).
+    centers = [(y0 + y1) / 2 for y0, y1 in zip(y_mins, y_maxs)]
+    order = sorted(range(len(texts)), key=centers.__getitem__)
 
-    lines: list[list[OCRWord]] = []
-    current_line: list[OCRWord] = []
+    lines: list[list[int]] = []
+    current_line: list[int] = []
+    line_sum = 0.0
     current_y: Optional[float] = None
 
-    for word in sorted_words:
-        cy = word.bounding_box.center_y
+    for i in order:
+        cy = centers[i]
         if current_y is None or abs(cy - current_y) <= y_tolerance:
-            current_line.append(word)
-            current_y = sum(w.bounding_box.center_y for w in current_line) / len(current_line)
+            current_line.append(i)
+            line_sum += cy
+            current_y = line_sum / len(current_line)
         else:
-            lines.append(sorted(current_line, key=lambda w: w.bounding_box.x_min))
-            current_line = [word]
+            lines.append(current_line)
+            current_line = [i]
+            line_sum = cy
             current_y = cy
 
     if current_line:
-        lines.append(sorted(current_line, key=lambda w: w.bounding_box.x_min))
+        lines.append(current_line)
 
-    return [" ".join(w.text for w in line) for line in lines]
+    return [" ".join(texts[i] for i in sorted(line, key=x_mins.__getitem__)) for line in lines]
 
 
 # ── Format Detector ────────────────────────────────────────────────────────────
@@ -208,13 +591,173 @@ MERCHANT_SIGNATURES: dict[str, list[str]] = {
 }
 
 
+@dataclass(slots=True, frozen=True)
+class MerchantMatch:
+    merchant: str
+    confidence: float   # 0..1 — see MerchantDetector.detect
+    signature: str      # the MERCHANT_SIGNATURES pattern matched first in the header
+
+
+def _literal_anchor(pattern: str) -> Optional[str]:
+    """Longest literal run (≥ 3 chars) every match of `pattern` must contain, lower-cased.
+
+    None for patterns this simple scan cannot reason about (groups, alternation)
+    — those are always run.
+    """
+    if "(" in pattern or "|" in pattern:
+        return None
+    runs: list[str] = []
+    current = ""
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            runs.append(current)
+            current = ""
+            i += 2
+            continue
+        if ch == "[":
+            runs.append(current)
+            current = ""
+            i = pattern.find("]", i + 1) + 1 or len(pattern)
+            continue
+        if ch in "?*{":
+            # The preceding character is optional (or repeated a variable number of times)
+            runs.append(current[:-1])
+            current = ""
+            if ch == "{":
+                i = pattern.find("}", i + 1) + 1 or len(pattern)
+                continue
+        elif ch == "+":
+            runs.append(current)
+            current = ""
+        elif ch.isalnum() or ch == " ":
+            current += ch
+        else:
+            runs.append(current)
+            current = ""
+        i += 1
+    runs.append(current)
+    best = max((r.strip() for r in runs), key=len)
+    return best.lower() if len(best) >= 3 else None
+
+
+class MerchantDetector:
+    """
+    Single-pass merchant detection over the receipt header.
+
+    Every signature is compiled once. An Aho-Corasick automaton over their
+    literal anchors ("lidl", "jeronimo", "biedronka", ...) scans the lower-cased
+    header in one pass, and only signatures whose anchor occurs are run as
+    regexes, so cost grows with the header length, not the number of merchants.
+    """
+
+    def __init__(self, signatures: dict[str, list[str]]) -> None:
+        self._order = {merchant: i for i, merchant in enumerate(signatures)}
+        self._counts = {merchant: len(patterns) for merchant, patterns in signatures.items()}
+        self._signatures: list[tuple[str, str, re.Pattern[str]]] = []
+        self._unanchored: list[int] = []
+        # Aho-Corasick: goto transitions, failure links and signature ids per state
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[int]] = [[]]
+
+        for merchant, patterns in signatures.items():
+            for pattern in patterns:
+                sig_id = len(self._signatures)
+                self._signatures.append((merchant, pattern, re.compile(pattern, re.IGNORECASE)))
+                anchor = _literal_anchor(pattern)
+                if anchor is None:
+                    self._unanchored.append(sig_id)
+                else:
+                    self._add_anchor(anchor, sig_id)
+        self._build_failure_links()
+
+    def _add_anchor(self, anchor: str, sig_id: int) -> None:
+        state = 0
+        for ch in anchor:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(sig_id)
+
+    def _build_failure_links(self) -> None:
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _candidates(self, text: str) -> set[int]:
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        found = set(self._unanchored)
+        state = 0
+        for ch in text:
+            if state:
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(ch, 0)
+            else:
+                # Fast path: most header characters start no anchor
+                state = root.get(ch, 0)
+                if not state:
+                    continue
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def detect(self, lines: list[str]) -> Optional[MerchantMatch]:
+        """
+        Best merchant for the header, or None.
+
+        The merchant with the most distinct matching signatures wins (ties: the
+        MERCHANT_SIGNATURES order). confidence is 0.5 for one matching
+        signature, 1.0 for two or more (or for the merchant's only one), scaled
+        down by the share of matches belonging to other merchants.
+        """
+        header = "\n".join(lines[:_HEADER_LINES])
+        hits: dict[str, list[tuple[int, str]]] = {}
+        for sig_id in self._candidates(header.lower()):
+            merchant, pattern, regex = self._signatures[sig_id]
+            m = regex.search(header)
+            if m:
+                hits.setdefault(merchant, []).append((m.start(), pattern))
+        if not hits:
+            return None
+
+        merchant = min(hits, key=lambda name: (-len(hits[name]), self._order[name]))
+        matched = len(hits[merchant])
+        total = sum(len(h) for h in hits.values())
+        evidence = 1.0 if matched >= min(2, self._counts[merchant]) else 0.5
+        return MerchantMatch(
+            merchant=merchant,
+            confidence=evidence * matched / total,
+            signature=min(hits[merchant])[1],
+        )
+
+
+merchant_detector = MerchantDetector(MERCHANT_SIGNATURES)
+
+
+def detect_merchant_match(lines: list[str]) -> Optional[MerchantMatch]:
+    return merchant_detector.detect(lines)
+
+
 def detect_merchant(lines: list[str]) -> Optional[str]:
     """
     Return merchant key ('lidl', 'biedronka', ...) or None if unknown.
     None → caller should fall back to AI structurizer.
     """
-    header = "\n".join(lines[:_HEADER_LINES])
-    for merchant, patterns in MERCHANT_SIGNATURES.items():
-        if any(re.search(p, header, re.IGNORECASE) for p in patterns):
-            return merchant
-    return None
+    match = merchant_detector.detect(lines)
+    return match.merchant if match else None
@@ -0,0 +1,134 @@
+# backend/app/parser_engine.py
+"""
+Declarative engine for deterministic receipt parsers.
+
+A merchant is described by class attributes only — regexes for the section
+boundaries, the date and the total, and an ordered list of LineRule for the
+products section — and RuleBasedParser runs them through the same
+HEADER → PRODUCTS → SUMMARY state machine LidlReceiptParser uses.
+
+Rule patterns use named groups:
+  ITEM      total (required), name, qty, unit — without `name` the item takes
+            the pending name (the previous unmatched line)
+  DISCOUNT  amount (negative), name — emitted as its own item, like Lidl
+  SKIP      the line carries nothing new (e.g. the price after a discount)
+Lines matching no rule are product names. Money is Decimal throughout.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from decimal import Decimal
+from enum import Enum, auto
+from typing import ClassVar, Optional
+
+from .lidl_parser import BaseDeterministicParser, ParsedItem, ParsedReceipt, _parse_decimal
+
+
+class RuleAction(Enum):
+    ITEM = auto()
+    DISCOUNT = auto()
+    SKIP = auto()
+
+
+@dataclass(frozen=True)
+class LineRule:
+    pattern: re.Pattern[str]
+    action: RuleAction
+
+
+class _State(Enum):
+    HEADER = auto()
+    PRODUCTS = auto()
+    SUMMARY = auto()
+
+
+class RuleBasedParser(BaseDeterministicParser):
+    """Base for declarative parsers; subclasses only set the class attributes below."""
+
+    merchant_name: ClassVar[str]
+    currency: ClassVar[str] = "PLN"
+    # First line of the products section (the line itself is not a product)
+    products_start: ClassVar[re.Pattern[str]]
+    # First line after the products section
+    summary_start: ClassVar[re.Pattern[str]]
+    # Searched on every line; the first match wins. Groups: total
+    total_pattern: ClassVar[re.Pattern[str]]
+    # Searched on every line; the first match wins. Groups: y, m, d
+    date_patterns: ClassVar[tuple[re.Pattern[str], ...]]
+    product_rules: ClassVar[tuple[LineRule, ...]]
+
+    def _extract_date(self, lines: list[str]) -> str:
+        for line in lines:
+            for pattern in self.date_patterns:
+                m = pattern.search(line)
+                if m:
+                    return f"{m.group('y')}-{m.group('m')}-{m.group('d')}"
+        return ""
+
+    def _extract_total(self, lines: list[str]) -> Decimal:
+        for line in lines:
+            m = self.total_pattern.search(line)
+            if m:
+                return _parse_decimal(m.group("total"))
+        return Decimal("0")
+
+    def _match(self, line: str) -> Optional[tuple[RuleAction, re.Match[str]]]:
+        for rule in self.product_rules:
+            m = rule.pattern.match(line)
+            if m:
+                return rule.action, m
+        return None
+
+    def parse(self, lines: list[str]) -> ParsedReceipt:
+        state = _State.HEADER
+        items: list[ParsedItem] = []
+        pending_name: Optional[str] = None
+
+        for raw_line in lines:
+            line = raw_line.strip()
+            if not line:
+                continue
+
+            if state == _State.HEADER:
+                if self.products_start.search(line):
+                    state = _State.PRODUCTS
+                continue
+
+            if state == _State.SUMMARY:
+                break
+
+            if self.summary_start.match(line):
+                state = _State.SUMMARY
+                continue
+
+            matched = self._match(line)
+            if matched is None:
+                pending_name = line
+                continue
+
+            action, m = matched
+            groups = m.groupdict()
+            if action == RuleAction.ITEM:
+                name = (groups.get("name") or "").strip() or pending_name
+                if name:
+                    items.append(ParsedItem(
+                        name=name,
+                        price=_parse_decimal(groups["total"]),
+                        quantity=_parse_decimal(groups["qty"]) if groups.get("qty") else Decimal("1"),
+                    ))
+                pending_name = None
+            elif action == RuleAction.DISCOUNT:
+                items.append(ParsedItem(
+                    name=(groups.get("name") or "Rabat").strip(),
+                    price=_parse_decimal(groups["amount"]),
+                    quantity=Decimal("1"),
+                ))
+
+        return ParsedReceipt(
+            merchant_name=self.merchant_name,
+            date=self._extract_date(lines),
+            total_amount=self._extract_total(lines),
+            currency=self.currency,
+            items=items,
+        )
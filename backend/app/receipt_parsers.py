@@ -0,0 +1,36 @@
+# backend/app/receipt_parsers.py
+"""
+Registry of deterministic receipt parsers, keyed by the merchant key
+ocr_pipeline.detect_merchant() returns. AIService.parse_lines dispatches here
+and only falls back to the AI structurizer for merchants without a parser, or
+when their parser finds no items.
+
+Adding a merchant: write a RuleBasedParser (parser_engine.py) or a
+BaseDeterministicParser subclass and decorate it with @register_parser("<key>").
+"""
+from __future__ import annotations
+
+from typing import Callable, Optional, TypeVar
+
+from .biedronka_parser import BiedronkaReceiptParser
+from .lidl_parser import BaseDeterministicParser, LidlReceiptParser
+
+_P = TypeVar("_P", bound=type[BaseDeterministicParser])
+
+PARSERS: dict[str, type[BaseDeterministicParser]] = {}
+
+
+def register_parser(merchant: str) -> Callable[[_P], _P]:
+    def decorator(parser_cls: _P) -> _P:
+        PARSERS[merchant] = parser_cls
+        return parser_cls
+    return decorator
+
+
+def get_parser(merchant: Optional[str]) -> Optional[BaseDeterministicParser]:
+    parser_cls = PARSERS.get(merchant) if merchant else None
+    return parser_cls() if parser_cls else None
+
+
+register_parser("lidl")(LidlReceiptParser)
+register_parser("biedronka")(BiedronkaReceiptParser)
@@ -0,0 +1,219 @@
+# backend/app/reparse.py
+"""
+Bulk re-parse of historical receipts from stored OCR words — no OCR call, no AI call.
+
+Replays the stored OCR result of each scan (keyed by ReceiptScan.content_hash)
+through reconstruct_lines → detect_merchant → deterministic parser →
+ReceiptValidator, and reports how outcomes moved (e.g. needs_review → clean).
+Scans are streamed in id-ordered batches, so memory stays bounded.
+
+OCR words come from the durable OCR archive, falling back to the (LRU-evicted)
+OCR cache — a cache hit is copied into the archive. Scans OCR'd before results
+were stored at all, or whose cache entry was evicted before the archive existed,
+have no words anywhere: they are reported as skipped_no_ocr and only a retry
+(a new OCR call) makes them re-parseable.
+
+With apply=True, unverified scans (NEEDS_REVIEW / FAILED) are rewritten by
+apply_parsed_receipt — the same write a fresh OCR job does. Verified scans are
+never touched.
+
+Used by scripts/reparse_receipts.py and POST /api/transactions/reparse.
+"""
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlmodel import Session, col, select
+
+from .category_classifier import suggest_item_categories
+from .corrections import merchant_aliases
+from .models import Category, ReceiptScan, ScanStatus, Transaction, TransactionLine
+from .ocr_cache import OCRArchive, OCRResultCache, get_ocr_archive, get_ocr_cache
+from .services import AIService
+
+logger = logging.getLogger(__name__)
+
+_APPLICABLE = {"clean", "needs_review", "failed"}
+
+
+@dataclass
+class ReparseReport:
+    scanned: int = 0
+    reparsed: int = 0
+    applied: int = 0
+    skipped_no_ocr: int = 0
+    skipped_no_parser: int = 0
+    # "<before>-><after>" → count, outcomes: clean | needs_review | failed | verified | pending
+    transitions: Counter = field(default_factory=Counter)
+
+    def to_dict(self) -> dict:
+        return {
+            "scanned": self.scanned,
+            "reparsed": self.reparsed,
+            "applied": self.applied,
+            "skipped_no_ocr": self.skipped_no_ocr,
+            "skipped_no_parser": self.skipped_no_parser,
+            "transitions": dict(sorted(self.transitions.items())),
+        }
+
+
+def scan_outcome(scan: ReceiptScan) -> str:
+    status = ScanStatus(scan.status)
+    if status == ScanStatus.CATEGORIZATION_OK:
+        return "verified"
+    if status == ScanStatus.FAILED:
+        return "failed"
+    if status == ScanStatus.NEEDS_REVIEW:
+        return "needs_review" if scan.validation_message else "clean"
+    return "pending"
+
+
+def result_outcome(data: dict) -> str:
+    validation = data.get("_validation", {})
+    if not validation.get("is_valid", True):
+        return "failed"
+    return "needs_review" if validation.get("issues") else "clean"
+
+
+def apply_parsed_receipt(
+    session: Session,
+    scan: ReceiptScan,
+    transaction: Transaction,
+    data: dict,
+    cat_name_to_id: dict[str, Optional[int]],
+) -> bool:
+    """
+    Write a parse result onto a scan and its transaction — shared by a fresh OCR
+    job (api._process_scan) and re-parse, so both store the same fields.
+
+    Merchant names go through learned aliases. A result that fails validation only
+    updates the header (merchant, total, currency) and marks the scan FAILED.
+    Otherwise the date and lines are replaced too — lines the parser left
+    uncategorized get categories suggested from verified lines — and the scan
+    goes to NEEDS_REVIEW. Returns whether the result passed validation. Caller commits.
+    """
+    validation = data.get("_validation", {})
+    merchant = data.get("merchant_name") or "Unknown"
+    if data.get("merchant_name") and transaction.budget_id is not None:
+        merchant = merchant_aliases(session, transaction.budget_id, [merchant]).get(merchant, merchant)
+    transaction.merchant_name = merchant
+    transaction.total_amount = data.get("total_amount", 0.0)
+    transaction.currency = data.get("currency", "PLN")
+    session.add(transaction)
+    session.add(scan)
+
+    if not validation.get("is_valid", True):
+        scan.status = ScanStatus.FAILED
+        scan.validation_message = validation.get("message")
+        return False
+
+    scan.status = ScanStatus.NEEDS_REVIEW
+    scan.validation_message = validation.get("message") if validation.get("issues") else None
+
+    if data.get("date"):
+        try:
+            transaction.date = datetime.strptime(data["date"], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        except (ValueError, TypeError):
+            logger.warning("Could not parse receipt date", extra={"scan_id": scan.id, "date": data["date"]})
+
+    items = data.get("items", [])
+    # Deterministic parsers leave categories empty — suggest them from verified lines, no AI
+    uncategorized = [
+        item.get("name") for item in items
+        if item.get("name") and cat_name_to_id.get((item.get("category") or "").lower()) is None
+    ]
+    suggested = (
+        suggest_item_categories(session, transaction.budget_id, uncategorized)
+        if uncategorized and transaction.budget_id is not None else {}
+    )
+    for line in transaction.lines:
+        session.delete(line)
+    for item_raw in items:
+        category_name = item_raw.get("category") or ""
+        cat_id = cat_name_to_id.get(category_name.lower()) if category_name else None
+        if cat_id is None:
+            cat_id = suggested.get(item_raw.get("name"))
+        session.add(TransactionLine(
+            name=item_raw.get("name", "Unknown item"),
+            price=float(item_raw.get("price", 0.0)),
+            quantity=float(item_raw.get("quantity", 1.0)),
+            category_id=cat_id,
+            transaction_id=transaction.id,
+        ))
+    return True
+
+
+def reparse_scans(
+    session: Session,
+    budget_id: Optional[int] = None,
+    batch_size: int = 200,
+    apply: bool = False,
+    cache: Optional[OCRResultCache] = None,
+    archive: Optional[OCRArchive] = None,
+) -> ReparseReport:
+    cache = cache or get_ocr_cache()
+    archive = archive or get_ocr_archive()
+    if cache is None and archive is None:
+        raise RuntimeError("OCR archive and cache are disabled — nothing to re-parse from")
+
+    report = ReparseReport()
+    categories_by_budget: dict[Optional[int], dict[str, Optional[int]]] = {}
+    last_id = 0
+
+    while True:
+        stmt = (
+            select(ReceiptScan, Transaction.budget_id)
+            .join(Transaction, col(Transaction.id) == ReceiptScan.transaction_id)
+            .where(col(ReceiptScan.id) > last_id, col(ReceiptScan.content_hash).is_not(None))
+            .order_by(col(ReceiptScan.id))
+            .limit(batch_size)
+        )
+        if budget_id is not None:
+            stmt = stmt.where(Transaction.budget_id == budget_id)
+        batch = session.exec(stmt).all()
+        if not batch:
+            break
+
+        for scan, scan_budget_id in batch:
+            report.scanned += 1
+            assert scan.content_hash is not None
+            ocr = archive.get(scan.content_hash) if archive else None
+            if ocr is None and cache is not None:
+                ocr = cache.get(scan.content_hash)
+                if ocr is not None and archive is not None:
+                    archive.put(scan.content_hash, ocr)
+            if ocr is None:
+                report.skipped_no_ocr += 1
+                continue
+
+            data = AIService.parse_ocr_result(ocr, use_ai=False)
+            if data is None:
+                report.skipped_no_parser += 1
+                continue
+
+            report.reparsed += 1
+            before = scan_outcome(scan)
+            report.transitions[f"{before}->{result_outcome(data)}"] += 1
+
+            if apply and before in _APPLICABLE:
+                if scan_budget_id not in categories_by_budget:
+                    cats = session.exec(
+                        select(Category).where((Category.budget_id == scan_budget_id) | (Category.is_system))
+                    ).all()
+                    categories_by_budget[scan_budget_id] = {c.name.lower(): c.id for c in cats}
+                transaction = session.get(Transaction, scan.transaction_id)
+                if transaction:
+                    apply_parsed_receipt(session, scan, transaction, data, categories_by_budget[scan_budget_id])
+                    report.applied += 1
+
+        last_id = batch[-1][0].id or last_id
+        if apply:
+            session.commit()
+        # Drop loaded rows so memory stays flat across batches
+        session.expunge_all()
+
+    return report
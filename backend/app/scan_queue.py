@@ -0,0 +1,463 @@
+# backend/app/scan_queue.py
+"""
+Durable OCR job queue backed by the `receiptscan` table.
+
+A scan in QUEUED status is a pending job. Workers claim jobs by flipping them to
+RUNNING with a lease (`locked_by` + `lease_expires_at`) and keep the lease alive
+with heartbeats. A scan in progress (RUNNING, OCR_OK or PARSING_OK) whose lease
+expired (worker crashed, container restarted) becomes claimable again — that is
+the visibility timeout.
+
+Any process can enqueue (it is just a row update); draining is done by
+ScanQueueWorker instances, and the number of leased in-progress scans is capped
+globally by settings.OCR_GLOBAL_CONCURRENCY regardless of how many processes run:
+the cap is re-checked inside each claim UPDATE, which SQLite serializes.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+from uuid import uuid4
+
+from sqlalchemy import and_, case, func, or_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, col, select
+
+from .config import settings
+from .database import operations_engine
+from .models import ReceiptScan, ScanStatus
+
+logger = logging.getLogger(__name__)
+
+# (transaction_id, scan_id, image_path) — same signature as api.process_transaction_in_background
+ScanHandler = Callable[[int, int, str], Awaitable[None]]
+
+
+@dataclass
+class ScanJob:
+    scan_id: int
+    transaction_id: int
+    image_path: str
+    attempts: int
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+# ── Queue primitives ───────────────────────────────────────────────────────────
+
+def enqueue_scan(session: Session, scan: ReceiptScan) -> None:
+    """Mark a scan as a pending job. Caller commits."""
+    scan.status = ScanStatus.QUEUED
+    scan.error_message = None
+    scan.attempts = 0
+    scan.locked_by = None
+    scan.lease_expires_at = None
+    scan.heartbeat_at = None
+    session.add(scan)
+
+
+# Statuses a worker moves a claimed scan through before a terminal one
+IN_PROGRESS = (ScanStatus.RUNNING, ScanStatus.OCR_OK, ScanStatus.PARSING_OK)
+
+
+def _in_progress(scan=ReceiptScan):
+    return col(scan.status).in_([status.value for status in IN_PROGRESS])
+
+
+def _under_global_cap(now: datetime):
+    """Fewer than OCR_GLOBAL_CONCURRENCY scans hold a live lease. Counted over an alias so
+    the subquery is not correlated with the row being claimed."""
+    leased = aliased(ReceiptScan)
+    running = (
+        select(func.count()).select_from(leased)
+        .where(_in_progress(leased), col(leased.lease_expires_at) >= now)
+        .scalar_subquery()
+    )
+    return running < settings.OCR_GLOBAL_CONCURRENCY
+
+
+def _claimable(now: datetime):
+    lease_expired = and_(
+        _in_progress(),
+        or_(col(ReceiptScan.lease_expires_at).is_(None), col(ReceiptScan.lease_expires_at) < now),
+    )
+    return and_(
+        or_(col(ReceiptScan.status) == ScanStatus.QUEUED, lease_expired),
+        col(ReceiptScan.attempts) < settings.OCR_QUEUE_MAX_ATTEMPTS,
+        col(ReceiptScan.image_path).is_not(None),
+    )
+
+
+def fail_exhausted(session: Session, now: Optional[datetime] = None) -> int:
+    """Bulk-fail abandoned in-progress scans that used up all attempts. Caller commits."""
+    now = now or _utcnow()
+    result = session.execute(
+        update(ReceiptScan)
+        .where(
+            _in_progress(),
+            col(ReceiptScan.lease_expires_at) < now,
+            col(ReceiptScan.attempts) >= settings.OCR_QUEUE_MAX_ATTEMPTS,
+        )
+        .values(
+            status=ScanStatus.FAILED,
+            error_message="max attempts exceeded",
+            locked_by=None,
+            lease_expires_at=None,
+        )
+    )
+    return result.rowcount or 0  # type: ignore[attr-defined]
+
+
+def _leased_count(session: Session, now: datetime) -> int:
+    return session.exec(
+        select(func.count()).select_from(ReceiptScan).where(
+            _in_progress(),
+            col(ReceiptScan.lease_expires_at) >= now,
+        )
+    ).one()
+
+
+def claim_scans(session: Session, worker_id: str, limit: int, now: Optional[datetime] = None) -> list[ScanJob]:
+    """
+    Lease up to `limit` jobs for `worker_id`, oldest first.
+
+    Each claim is a conditional UPDATE re-checking the claimable predicate and the
+    global cap, so two workers racing for the same row cannot both win (rowcount
+    tells who did) and racing workers cannot together exceed OCR_GLOBAL_CONCURRENCY:
+    the first claim UPDATE takes SQLite's write lock until the commit, so the next
+    worker's cap subquery sees its claims. The count below only avoids a useless scan.
+    """
+    now = now or _utcnow()
+    fail_exhausted(session, now)
+
+    slots = min(limit, settings.OCR_GLOBAL_CONCURRENCY - _leased_count(session, now))
+    if slots <= 0:
+        session.commit()
+        return []
+
+    candidates = session.exec(
+        select(ReceiptScan.id, ReceiptScan.transaction_id, ReceiptScan.image_path, ReceiptScan.attempts)
+        .where(_claimable(now))
+        .order_by(col(ReceiptScan.created_at))
+        .limit(slots * 2)
+    ).all()
+
+    lease_until = now + timedelta(seconds=settings.OCR_QUEUE_LEASE_SECONDS)
+    jobs: list[ScanJob] = []
+    for scan_id, transaction_id, image_path, attempts in candidates:
+        result = session.execute(
+            update(ReceiptScan)
+            .where(col(ReceiptScan.id) == scan_id, _claimable(now), _under_global_cap(now))
+            .values(
+                status=ScanStatus.RUNNING,
+                locked_by=worker_id,
+                lease_expires_at=lease_until,
+                heartbeat_at=now,
+                attempts=ReceiptScan.attempts + 1,
+            )
+        )
+        if result.rowcount == 1:  # type: ignore[attr-defined]
+            jobs.append(ScanJob(scan_id, transaction_id, image_path, attempts + 1))
+            if len(jobs) >= slots:
+                break
+
+    session.commit()
+    return jobs
+
+
+def heartbeat(session: Session, scan_ids: list[int], worker_id: str, now: Optional[datetime] = None) -> int:
+    """
+    Extend the leases this worker holds, in one UPDATE.
+    Returns how many were extended — fewer than len(scan_ids) means some leases were lost.
+    """
+    if not scan_ids:
+        return 0
+    now = now or _utcnow()
+    result = session.execute(
+        update(ReceiptScan)
+        .where(col(ReceiptScan.id).in_(scan_ids), col(ReceiptScan.locked_by) == worker_id)
+        .values(
+            heartbeat_at=now,
+            lease_expires_at=now + timedelta(seconds=settings.OCR_QUEUE_LEASE_SECONDS),
+        )
+    )
+    session.commit()
+    return result.rowcount or 0  # type: ignore[attr-defined]
+
+
+def release(session: Session, scan_id: int, worker_id: str, error_message: Optional[str] = None) -> None:
+    """
+    Drop the lease after the handler returned. A scan still in progress at this
+    point never reached a terminal status, so it is marked FAILED.
+    """
+    owned = and_(col(ReceiptScan.id) == scan_id, col(ReceiptScan.locked_by) == worker_id)
+    session.execute(
+        update(ReceiptScan)
+        .where(owned, _in_progress())
+        .values(status=ScanStatus.FAILED, error_message=error_message or "worker finished without result")
+    )
+    session.execute(update(ReceiptScan).where(owned).values(locked_by=None, lease_expires_at=None))
+    session.commit()
+
+
+def requeue(session: Session, scan_ids: list[int], worker_id: str) -> None:
+    """Hand leased scans back to the queue (prefetched or interrupted on shutdown)."""
+    if not scan_ids:
+        return
+    session.execute(
+        update(ReceiptScan)
+        .where(
+            col(ReceiptScan.id).in_(scan_ids),
+            col(ReceiptScan.locked_by) == worker_id,
+            _in_progress(),
+        )
+        .values(status=ScanStatus.QUEUED, locked_by=None, lease_expires_at=None)
+    )
+    session.commit()
+
+
+# ── Orphan sweeper ─────────────────────────────────────────────────────────────
+
+@dataclass
+class SweepResult:
+    requeued: int = 0
+    failed: int = 0
+
+
+def _stale(now: datetime):
+    cutoff = now - timedelta(seconds=settings.OCR_SWEEP_STALE_SECONDS)
+    lease = col(ReceiptScan.lease_expires_at)
+    return or_(
+        and_(col(ReceiptScan.status) == ScanStatus.QUEUED, col(ReceiptScan.created_at) < cutoff),
+        and_(
+            _in_progress(),
+            or_(
+                lease < now,
+                # Rows left RUNNING before the queue existed have no lease
+                and_(lease.is_(None), func.coalesce(ReceiptScan.heartbeat_at, ReceiptScan.created_at) < cutoff),
+            ),
+        ),
+    )
+
+
+def sweep_stale_scans(session: Session, now: Optional[datetime] = None) -> SweepResult:
+    """
+    Recover scans orphaned by a restart: stale QUEUED rows and in-progress rows
+    (RUNNING, OCR_OK, PARSING_OK) whose lease (or, for legacy rows,
+    heartbeat/created_at) ran out.
+
+    Scans whose image still exists and have attempts left go back to QUEUED, the
+    rest become FAILED — applied with a single UPDATE ... SET status = CASE ... .
+    """
+    now = now or _utcnow()
+    rows = session.exec(
+        select(ReceiptScan.id, ReceiptScan.image_path, ReceiptScan.attempts).where(_stale(now))
+    ).all()
+    if not rows:
+        return SweepResult()
+
+    stale_ids = [scan_id for scan_id, _, _ in rows]
+    requeue_ids = [
+        scan_id for scan_id, image_path, attempts in rows
+        if image_path and attempts < settings.OCR_QUEUE_MAX_ATTEMPTS and os.path.exists(image_path)
+    ]
+    requeue_this = col(ReceiptScan.id).in_(requeue_ids)
+
+    session.execute(
+        update(ReceiptScan)
+        # Re-check staleness so a scan claimed in the meantime is left alone
+        .where(col(ReceiptScan.id).in_(stale_ids), _stale(now))
+        .values(
+            status=case((requeue_this, ScanStatus.QUEUED.value), else_=ScanStatus.FAILED.value),
+            error_message=case((requeue_this, None), else_="orphaned scan: image missing or attempts exhausted"),
+            locked_by=None,
+            lease_expires_at=None,
+        )
+    )
+    session.commit()
+    return SweepResult(requeued=len(requeue_ids), failed=len(stale_ids) - len(requeue_ids))
+
+
+def _sweep(engine: Engine) -> SweepResult:
+    with Session(engine) as session:
+        return sweep_stale_scans(session)
+
+
+async def run_sweeper(engine: Engine = operations_engine, interval: float = settings.OCR_SWEEP_INTERVAL_SECONDS) -> None:
+    """Periodic sweep loop — started from the API lifespan."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await asyncio.to_thread(_sweep, engine)
+            if result.requeued or result.failed:
+                logger.info("Swept orphaned scans", extra={"requeued": result.requeued, "failed": result.failed})
+        except Exception:
+            logger.exception("Orphaned scan sweep failed")
+
+
+# ── Worker ─────────────────────────────────────────────────────────────────────
+
+class ScanQueueWorker:
+    """
+    Polls the queue and runs up to `concurrency` jobs at a time through `handler`.
+
+    `prefetch` extra jobs are leased ahead of time so a finished slot is refilled
+    without a DB round trip. Every held lease (running or prefetched) is kept
+    alive by a single heartbeat loop.
+
+    Shutdown: stop() ends polling; drain() hands prefetched jobs back, waits for
+    running ones up to a timeout and requeues whatever is still in flight.
+    """
+
+    def __init__(
+        self,
+        handler: ScanHandler,
+        concurrency: int = settings.OCR_WORKER_CONCURRENCY,
+        prefetch: int = 0,
+        worker_id: Optional[str] = None,
+        engine: Engine = operations_engine,
+        poll_interval: float = settings.OCR_QUEUE_POLL_INTERVAL_SECONDS,
+    ) -> None:
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.prefetch = max(0, prefetch)
+        self.worker_id = worker_id or new_worker_id()
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self._pending: deque[ScanJob] = deque()
+        self._running: dict[int, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+
+    @property
+    def held_scan_ids(self) -> list[int]:
+        return [job.scan_id for job in self._pending] + list(self._running)
+
+    # Blocking SQLite writes — the async paths below run them via asyncio.to_thread
+
+    def _claim(self, limit: int) -> list[ScanJob]:
+        with Session(self.engine) as session:
+            return claim_scans(session, self.worker_id, limit)
+
+    def _heartbeat(self, scan_ids: list[int]) -> int:
+        with Session(self.engine) as session:
+            return heartbeat(session, scan_ids, self.worker_id)
+
+    def _release(self, scan_id: int, error_message: Optional[str]) -> None:
+        with Session(self.engine) as session:
+            release(session, scan_id, self.worker_id, error_message)
+
+    def _requeue(self, scan_ids: list[int]) -> None:
+        with Session(self.engine) as session:
+            requeue(session, scan_ids, self.worker_id)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.OCR_QUEUE_HEARTBEAT_SECONDS)
+            held = self.held_scan_ids
+            try:
+                extended = await asyncio.to_thread(self._heartbeat, held)
+            except Exception:
+                logger.exception("Scan queue heartbeat failed", extra={"worker_id": self.worker_id})
+                continue
+            if extended < len(held):
+                logger.warning(
+                    "Lost scan leases",
+                    extra={"worker_id": self.worker_id, "lost": len(held) - extended},
+                )
+
+    async def _run_job(self, job: ScanJob) -> None:
+        error: Optional[str] = None
+        try:
+            await self.handler(job.transaction_id, job.scan_id, job.image_path)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self._requeue, [job.scan_id])
+            raise
+        except Exception as e:
+            logger.exception("OCR job crashed", extra={"scan_id": job.scan_id})
+            error = str(e) or type(e).__name__
+        await asyncio.to_thread(self._release, job.scan_id, error)
+
+    def _on_done(self, scan_id: int) -> None:
+        self._running.pop(scan_id, None)
+        self._wakeup.set()
+
+    def _start_pending(self) -> None:
+        while self._pending and len(self._running) < self.concurrency:
+            job = self._pending.popleft()
+            task = asyncio.create_task(self._run_job(job))
+            self._running[job.scan_id] = task
+            task.add_done_callback(lambda _t, sid=job.scan_id: self._on_done(sid))
+
+    async def run(self) -> None:
+        logger.info(
+            "Scan queue worker started",
+            extra={"worker_id": self.worker_id, "concurrency": self.concurrency, "prefetch": self.prefetch},
+        )
+        beat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            while not self._stopping.is_set():
+                self._wakeup.clear()
+                want = self.concurrency + self.prefetch - len(self._pending) - len(self._running)
+                if want > 0:
+                    try:
+                        self._pending.extend(await asyncio.to_thread(self._claim, want))
+                    except Exception:
+                        logger.exception("Failed to claim scan jobs")
+                if self._stopping.is_set():
+                    break  # stopped while claiming — the finally below hands the new leases back
+                self._start_pending()
+
+                stop = asyncio.create_task(self._stopping.wait())
+                wake = asyncio.create_task(self._wakeup.wait())
+                await asyncio.wait({stop, wake}, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED)
+                stop.cancel()
+                wake.cancel()
+        finally:
+            beat.cancel()
+            await self._requeue_pending()
+
+    async def _requeue_pending(self) -> None:
+        if self._pending:
+            scan_ids = [job.scan_id for job in self._pending]
+            self._pending.clear()
+            await asyncio.to_thread(self._requeue, scan_ids)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def drain(self, timeout: float) -> None:
+        """Give prefetched jobs back, let running jobs finish for up to `timeout` seconds, requeue the rest."""
+        self.stop()
+        await self._requeue_pending()
+
+        running = list(self._running.values())
+        if not running:
+            return
+        logger.info("Draining scan jobs", extra={"worker_id": self.worker_id, "running": len(running)})
+        beat = asyncio.create_task(self._heartbeat_loop())
+        try:
+            _, still_running = await asyncio.wait(running, timeout=timeout)
+        finally:
+            beat.cancel()
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            await asyncio.gather(*still_running, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Stop immediately — in-flight jobs are cancelled and requeued."""
+        await self.drain(timeout=0)
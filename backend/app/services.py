@@ -2,9 +2,19 @@
 import os
 import json
 import base64
-from typing import Optional
+import asyncio
+import hashlib
+import re
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
+import httpx
+
+from .config import settings
+
+if TYPE_CHECKING:
+    from .ocr_pipeline import OCRResult, ReceiptSource
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "dummy_key_for_tests")
 client = OpenAI(api_key=OPENAI_API_KEY)
@@ -12,6 +22,154 @@ client = OpenAI(api_key=OPENAI_API_KEY)
 MODEL_NAME = "gpt-4o-mini"
 
 
+# ── Requests (shared by AIService and AsyncAIService) ──────────────────────────
+
+def _structurize_request(receipt_text: str, categories: Optional[list[dict]], fragment: bool) -> dict:
+    cat_context = ""
+    if categories:
+        cat_list = ", ".join(f'"{c["name"]}"' for c in categories)
+        cat_context = f"\nCRITICAL: Assign a category to each item using ONLY names from this list: [{cat_list}]. Do NOT invent new categories."
+    if fragment:
+        cat_context += """
+FRAGMENT: The text is a part of a longer receipt. Each line starts with its line number as "N| ".
+- Add "line": N to every item — the number of the line where the item name appears.
+- merchant_name, date or total_amount may not be in this part — use null for missing ones."""
+
+    system_prompt = f"""You are an expert receipt parser.
+Extract structured data from the following receipt text.
+
+Return ONLY valid JSON with this structure:
+{{
+    "merchant_name": "Store Name",
+    "date": "YYYY-MM-DD",
+    "total_amount": 123.45,
+    "currency": "PLN",
+    "items": [
+        {{"name": "Product name", "price": 3.50, "quantity": 1, "category": "Food"}}
+    ]
+}}
+
+Rules:
+- date: YYYY-MM-DD format. Use today if missing.
+- total_amount: the final sum paid (after discounts).
+- Each item price is the unit price. quantity defaults to 1.
+- Include discounts as negative-price items if visible.
+{cat_context}"""
+
+    return {
+        "model": MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": receipt_text},
+        ],
+        "response_format": {"type": "json_object"},
+        "max_tokens": 8000,
+    }
+
+
+def _vision_transcribe_request(image_bytes: bytes) -> dict:
+    system_prompt = """You are a receipt OCR engine. Transcribe the receipt image line by line, top to bottom.
+Keep each printed line as one string — item name, quantity and price stay on the same line, left to right.
+Copy text exactly (including Polish characters, commas in prices and tax letters). Do not summarize or skip lines.
+Return ONLY valid JSON: {"lines": ["...", "..."]}"""
+
+    b64 = base64.b64encode(image_bytes).decode("utf-8")
+    return {
+        "model": MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": [
+                {"type": "text", "text": "Transcribe this receipt."},
+                {"type": "image_url", "image_url": {
+                    "url": f"data:image/jpeg;base64,{b64}",
+                    "detail": "high",
+                }},
+            ]},
+        ],
+        "response_format": {"type": "json_object"},
+        "max_tokens": 8000,
+    }
+
+
+def _transcribed_lines(content: Optional[str]) -> list[str]:
+    lines = json.loads(content or "{}").get("lines") or []
+    return [str(line) for line in lines if str(line).strip()]
+
+
+def _categorize_request(descriptions: list[str], categories: list[dict]) -> dict:
+    cat_list_str = ", ".join(f'"{c["name"]}"' for c in categories)
+
+    system_prompt = f"""You are a financial assistant. Categorize each bank transaction description.
+For each description pick EXACTLY ONE category from: [{cat_list_str}].
+If no category fits, use the closest match.
+Return ONLY a JSON object: {{"Description": "Category", ...}}"""
+
+    return {
+        "model": MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": "\n".join(descriptions)},
+        ],
+        "response_format": {"type": "json_object"},
+        "max_tokens": 1500,
+    }
+
+
+def _bank_statement_request(raw_text: str, fragment: bool = False) -> dict:
+    fragment_context = ""
+    if fragment:
+        fragment_context = """
+FRAGMENT: The text is a part of a longer statement. Each line starts with its line number as "N| ".
+- Add "line": N to every transaction — the number of the line where the transaction starts."""
+
+    system_prompt = f"""You are a financial data extractor. Extract ALL transactions from this bank statement text.
+
+For each transaction return:
+- date: YYYY-MM-DD
+- merchant: receiver or sender name (clean)
+- title: full transaction description
+- amount: number — expenses NEGATIVE, incomes POSITIVE
+- currency: e.g. "PLN"
+
+Guidelines for Polish banks (ING, mBank, PKO, Santander):
+- "Obciążenie" / "-" = expense (negative)
+- "Uznanie" / "+" = income (positive)
+- Skip headers, footers, balance rows.{fragment_context}
+
+Return ONLY valid JSON: {{"transactions": [...]}}"""
+
+    return {
+        "model": MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": raw_text},
+        ],
+        "response_format": {"type": "json_object"},
+        "max_tokens": 4000,
+    }
+
+
+class BankStatementError(RuntimeError):
+    """A part of the statement could not be extracted; the import is refused rather than left with a gap."""
+
+
+class _TruncatedOutput(ValueError):
+    """The response stopped at max_tokens, so its JSON is cut off."""
+
+
+def _bank_transactions(choice: Any) -> list[dict]:
+    if choice.finish_reason == "length":
+        raise _TruncatedOutput("bank statement response hit max_tokens")
+    parsed = json.loads(choice.message.content or "{}")
+    if isinstance(parsed, list):
+        return parsed
+    return parsed.get("transactions", [])
+
+
+# A statement transaction starts with its (operation) date
+_STATEMENT_ROW_START = re.compile(r"\s*(?:\d{2}[.-]\d{2}[.-]\d{4}|\d{4}-\d{2}-\d{2})")
+
+
 class AIService:
 
     # ── Receipt parsing ────────────────────────────────────────────────────────
@@ -20,8 +178,10 @@ class AIService:
     def parse_receipt(image_path: str, categories: Optional[list[dict]] = None) -> Optional[dict]:
         """
         Entry point for receipt parsing.
-        Pipeline: Google Vision OCR → line reconstruction → merchant detection → parser | AI fallback.
+        Pipeline: Google Vision OCR | PDF text layer → line reconstruction → merchant detection → parser | AI fallback.
         """
+        from .ocr_pipeline import ReceiptSourceDetector
+
         try:
             with open(image_path, "rb") as f:
                 image_bytes = f.read()
@@ -29,38 +189,128 @@ class AIService:
             print(f"❌ Error reading image: {e}")
             return None
 
-        return AIService._run_ocr_pipeline(image_bytes, categories)
+        return AIService._run_ocr_pipeline(image_bytes, categories, ReceiptSourceDetector.detect(image_path))
 
     @staticmethod
-    def _run_ocr_pipeline(image_bytes: bytes, categories: Optional[list[dict]] = None) -> Optional[dict]:
-        from .ocr_pipeline import GoogleVisionOCRService, reconstruct_lines, detect_merchant
-
-        try:
-            ocr = GoogleVisionOCRService()
-            result = ocr.extract(image_bytes)
-            lines = reconstruct_lines(result.words)
-            merchant = detect_merchant(lines)
-            print(f"🔍 [Pipeline] Detected merchant: {merchant or 'unknown'}")
-
-            if merchant == "lidl":
-                from .lidl_parser import LidlReceiptParser
-                parsed = LidlReceiptParser().parse(lines)
-                data = parsed.to_dict()
+    def _extract_ocr(image_bytes: bytes, source: Optional["ReceiptSource"] = None) -> tuple["OCRResult", bool]:
+        """
+        Google Vision OCR (or the PDF text layer) behind the content-hash cache. Returns (result, cache_hit).
+        PDFs with a text layer never reach Vision; image-only PDFs are OCR'd from their embedded page image.
+        """
+        from .ocr_pipeline import GoogleVisionOCRService, PDFTextLayerAdapter, ReceiptSource, preprocess_image
+        from .ocr_cache import archive_ocr_result, get_ocr_cache
+
+        cache = get_ocr_cache()
+        content_hash = hashlib.sha256(image_bytes).hexdigest()
+        if cache:
+            cached = cache.get(content_hash)
+            if cached is not None:
+                archive_ocr_result(content_hash, cached)
+                return cached, True
+
+        result: Optional["OCRResult"] = None
+        ocr_input: Optional[bytes] = image_bytes
+        if source == ReceiptSource.PDF_TEXT:
+            result = PDFTextLayerAdapter.extract(image_bytes)
+            if result is not None:
+                print(f"📄 [Pipeline] PDF text layer: {len(result.words)} words, OCR skipped")
             else:
-                # AI structurizer fallback for all unknown / not-yet-parsed merchants.
-                data = AIService._ai_structurize("\n".join(lines), categories)
+                print("📄 [Pipeline] PDF without text layer, OCR on embedded page image")
+                ocr_input = PDFTextLayerAdapter.page_image(image_bytes)
+
+        if result is None:
+            if ocr_input is None:
+                raise ValueError("PDF has neither a text layer nor an embedded page image")
+            # Cache stays keyed by the original upload (ReceiptScan.content_hash)
+            result = GoogleVisionOCRService().extract(preprocess_image(ocr_input))
+        if cache:
+            try:
+                cache.put(content_hash, result)
+            except OSError as e:
+                print(f"⚠️ [Pipeline] Could not store OCR result in cache: {e}")
+        archive_ocr_result(content_hash, result)
+        return result, False
 
-            return AIService._validate_and_annotate(data)
+    @staticmethod
+    def _run_ocr_pipeline(
+        image_bytes: bytes,
+        categories: Optional[list[dict]] = None,
+        source: Optional["ReceiptSource"] = None,
+    ) -> Optional[dict]:
+        try:
+            result, cache_hit = AIService._extract_ocr(image_bytes, source)
+            print(f"🔍 [Pipeline] OCR cache {'hit' if cache_hit else 'miss'}")
+            data = AIService.parse_ocr_result(result, categories)
+            if data is not None:
+                # Read by the job runner for the stage-level cache counters
+                data["_ocr_cache"] = "hit" if cache_hit else "miss"
+            return data
 
         except RuntimeError as e:
-            # Google Vision not configured — fall back to direct AI vision (legacy path)
+            # Google Vision not configured or rejected the image — fall back to direct AI vision (legacy path)
             print(f"⚠️ [Pipeline] OCR unavailable ({e}), falling back to AI vision")
-            data = AIService._ai_vision_fallback(image_bytes, categories)
-            return AIService._validate_and_annotate(data)
+            return AIService.ai_vision_fallback_for_upload(image_bytes, categories, source)
         except Exception as e:
             print(f"❌ OCR Pipeline Error: {e}")
             return None
 
+    @staticmethod
+    def ai_vision_fallback_for_upload(
+        image_bytes: bytes,
+        categories: Optional[list[dict]] = None,
+        source: Optional["ReceiptSource"] = None,
+    ) -> Optional[dict]:
+        """_ai_vision_fallback on an uploaded file: preprocessed, a PDF by its embedded page image."""
+        from .ocr_pipeline import PDFTextLayerAdapter, ReceiptSource, preprocess_image
+        if source == ReceiptSource.PDF_TEXT:
+            page_image = PDFTextLayerAdapter.page_image(image_bytes)
+            if page_image is None:
+                return None
+            image_bytes = page_image
+        return AIService._ai_vision_fallback(preprocess_image(image_bytes), categories)
+
+    @staticmethod
+    def parse_ocr_result(
+        result: "OCRResult",
+        categories: Optional[list[dict]] = None,
+        use_ai: bool = True,
+    ) -> Optional[dict]:
+        """
+        Post-OCR stages: line reconstruction → merchant detection → parser | AI structurizer → validation.
+        use_ai=False returns None for merchants without a deterministic parser (used by bulk re-parse).
+        """
+        from .ocr_pipeline import reconstruct_lines
+
+        return AIService.parse_lines(reconstruct_lines(result.words), categories, use_ai)
+
+    @staticmethod
+    def parse_lines(lines: list[str], categories: Optional[list[dict]] = None, use_ai: bool = True) -> Optional[dict]:
+        """Merchant detection → parser | AI structurizer → validation, on reconstructed receipt lines."""
+        from .ocr_pipeline import detect_merchant_match
+
+        match = detect_merchant_match(lines)
+        merchant = match.merchant if match else None
+        if match:
+            print(f"🔍 [Pipeline] Detected merchant: {merchant} (confidence {match.confidence:.2f}, /{match.signature}/)")
+        else:
+            print("🔍 [Pipeline] Detected merchant: unknown")
+
+        from .receipt_parsers import get_parser
+
+        parser = get_parser(merchant)
+        data = parser.parse(lines).to_dict() if parser is not None else None
+        if data is not None and not data["items"] and use_ai:
+            # Layout the parser does not know (new till software, unusual OCR) — let the AI try
+            print(f"⚠️ [Pipeline] {merchant} parser found no items, using AI structurizer")
+            data = None
+        if data is None:
+            if not use_ai:
+                return None
+            # AI structurizer fallback for unknown merchants and receipts their parser could not read.
+            data = AIService._ai_structurize_lines(lines, categories)
+
+        return AIService._validate_and_annotate(data)
+
     @staticmethod
     def _validate_and_annotate(data: Optional[dict]) -> Optional[dict]:
         """Run ReceiptValidator and attach validation metadata to the result dict."""
@@ -90,161 +340,333 @@ class AIService:
         return data
 
     @staticmethod
-    def _ai_structurize(receipt_text: str, categories: Optional[list[dict]] = None) -> Optional[dict]:
-        """AI structurizer — called for unknown merchant formats after OCR + line reconstruction."""
-        cat_context = ""
-        if categories:
-            cat_list = ", ".join(f'"{c["name"]}"' for c in categories)
-            cat_context = f"\nCRITICAL: Assign a category to each item using ONLY names from this list: [{cat_list}]. Do NOT invent new categories."
-
-        system_prompt = f"""You are an expert receipt parser.
-Extract structured data from the following receipt text.
-
-Return ONLY valid JSON with this structure:
-{{
-    "merchant_name": "Store Name",
-    "date": "YYYY-MM-DD",
-    "total_amount": 123.45,
-    "currency": "PLN",
-    "items": [
-        {{"name": "Product name", "price": 3.50, "quantity": 1, "category": "Food"}}
-    ]
-}}
-
-Rules:
-- date: YYYY-MM-DD format. Use today if missing.
-- total_amount: the final sum paid (after discounts).
-- Each item price is the unit price. quantity defaults to 1.
-- Include discounts as negative-price items if visible.
-{cat_context}"""
-
+    def _ai_structurize(
+        receipt_text: str,
+        categories: Optional[list[dict]] = None,
+        fragment: bool = False,
+    ) -> Optional[dict]:
+        """
+        AI structurizer — called for unknown merchant formats after OCR + line reconstruction.
+        fragment=True: the text is a numbered window of a longer receipt (see _ai_structurize_lines).
+        """
         try:
             response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": receipt_text},
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=8000,
+                **_structurize_request(receipt_text, categories, fragment),
+                timeout=settings.AI_TIMEOUT_STRUCTURIZE_SECONDS,
             )
             return json.loads(response.choices[0].message.content or "{}")
         except Exception as e:
             print(f"❌ AI Structurize Error: {e}")
             return None
 
+    @staticmethod
+    def _ai_structurize_lines(lines: list[str], categories: Optional[list[dict]] = None) -> Optional[dict]:
+        """
+        AI structurizer for receipt lines. Long receipts are split into windows of
+        AI_STRUCTURIZE_WINDOW_LINES lines (plus AI_STRUCTURIZE_OVERLAP_LINES of context on
+        each side) structured concurrently, so no single response hits max_tokens and
+        latency follows the window size. Items are numbered by line and kept only by the
+        window that owns their line, which drops duplicates from the overlaps.
+        """
+        window = max(1, settings.AI_STRUCTURIZE_WINDOW_LINES)
+        if len(lines) <= window:
+            return AIService._ai_structurize("\n".join(lines), categories)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        cores, texts = AIService._line_windows(lines, window)
+        print(f"🧩 [Pipeline] Structuring {len(lines)} lines in {len(cores)} windows")
+        with ThreadPoolExecutor(max_workers=max(1, settings.AI_STRUCTURIZE_CONCURRENCY)) as pool:
+            parts = list(pool.map(lambda text: AIService._ai_structurize(text, categories, fragment=True), texts))
+
+        if any(part is None for part in parts):
+            print("❌ [Pipeline] A receipt window failed to structure")
+            return None
+        return AIService._merge_windows(parts, cores)
+
+    @staticmethod
+    def _line_windows(lines: list[str], window: int) -> tuple[list[tuple[int, int]], list[str]]:
+        """Owned [start, end) line ranges and their numbered texts including AI_STRUCTURIZE_OVERLAP_LINES of context."""
+        overlap = max(0, settings.AI_STRUCTURIZE_OVERLAP_LINES)
+        cores = [(start, min(start + window, len(lines))) for start in range(0, len(lines), window)]
+        texts = [
+            "\n".join(f"{i}| {lines[i]}" for i in range(max(0, start - overlap), min(len(lines), end + overlap)))
+            for start, end in cores
+        ]
+        return cores, texts
+
+    @staticmethod
+    def _merge_windows(parts: list[dict], cores: list[tuple[int, int]]) -> dict:
+        """Header fields from the first window that has them (total from the last); items from the owning window."""
+        def first(key: str, windows: list[dict]) -> Optional[object]:
+            return next((p[key] for p in windows if p.get(key)), None)
+
+        items: list[tuple[int, dict]] = []
+        for part, (start, end) in zip(parts, cores):
+            for item in part.get("items") or []:
+                try:
+                    line = int(item.pop("line"))
+                except (KeyError, TypeError, ValueError):
+                    line = start  # unnumbered — keep, attributed to this window
+                if start <= line < end:
+                    items.append((line, item))
+
+        return {
+            "merchant_name": first("merchant_name", parts),
+            "date": first("date", parts),
+            "total_amount": first("total_amount", parts[::-1]) or 0.0,
+            "currency": first("currency", parts) or "PLN",
+            "items": [item for _, item in sorted(items, key=lambda pair: pair[0])],
+        }
+
     @staticmethod
     def _ai_vision_fallback(image_bytes: bytes, categories: Optional[list[dict]] = None) -> Optional[dict]:
         """
         Direct AI vision — used only when Google Vision is not configured.
-        Sends the whole image as-is (no chunking).
+        Sends the whole image as-is (no chunking), but only to transcribe its lines;
+        the lines then go through the same parser | windowed AI structurizer → validation as OCR output.
         """
-        cat_context = ""
-        if categories:
-            cat_list = ", ".join(f'"{c["name"]}"' for c in categories)
-            cat_context = f"\nCRITICAL: Assign categories ONLY from: [{cat_list}]."
-
-        system_prompt = f"""You are an expert receipt parser. Extract data from the receipt image into JSON.
-Return: merchant_name, date (YYYY-MM-DD), total_amount, currency, items (name/price/quantity/category).
-{cat_context}
-Return ONLY valid JSON."""
+        lines = AIService._ai_vision_transcribe(image_bytes)
+        if not lines:
+            return None
+        return AIService.parse_lines(lines, categories)
 
+    @staticmethod
+    def _ai_vision_transcribe(image_bytes: bytes) -> Optional[list[str]]:
+        """Whole-image transcription into text lines, top to bottom — output is plain lines, not item JSON."""
         try:
-            b64 = base64.b64encode(image_bytes).decode("utf-8")
             response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": [
-                        {"type": "text", "text": "Parse this receipt."},
-                        {"type": "image_url", "image_url": {
-                            "url": f"data:image/jpeg;base64,{b64}",
-                            "detail": "high",
-                        }},
-                    ]},
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=4000,
+                **_vision_transcribe_request(image_bytes),
+                timeout=settings.AI_TIMEOUT_VISION_SECONDS,
             )
-            return json.loads(response.choices[0].message.content or "{}")
+            return _transcribed_lines(response.choices[0].message.content)
         except Exception as e:
             print(f"❌ AI Vision Fallback Error: {e}")
             return None
 
-    # ── Categorization ─────────────────────────────────────────────────────────
+    # ── Bank statement chunks (AsyncAIService.parse_bank_statement_text) ───────
 
     @staticmethod
-    def categorize_descriptions(descriptions: list[str], categories: list[dict]) -> dict[str, str]:
+    def _statement_chunks(raw_text: str) -> tuple[list[tuple[int, int]], list[str]]:
         """
-        Assigns a category to each transaction description.
-        Returns {description: category_name}. Processes up to 50 at once.
+        Owned [start, end) line ranges of at most AI_BANK_STATEMENT_CHUNK_CHARS, cut before the
+        last transaction start that fits, and their numbered texts including
+        AI_BANK_STATEMENT_OVERLAP_LINES of context. A transaction longer than a chunk is cut anywhere.
         """
-        if not descriptions:
-            return {}
-
-        cat_list_str = ", ".join(f'"{c["name"]}"' for c in categories)
+        lines = raw_text.splitlines()
+        budget = max(1, settings.AI_BANK_STATEMENT_CHUNK_CHARS)
+        cores: list[tuple[int, int]] = []
+        start, size, cut = 0, 0, None
+        for i, line in enumerate(lines):
+            if i > start and _STATEMENT_ROW_START.match(line):
+                cut = i
+            if i > start and size + len(line) + 1 > budget:
+                end = cut if cut is not None else i
+                cores.append((start, end))
+                # Lines from the cut to here move to the next chunk (none of them but the first starts a row)
+                start, size, cut = end, sum(len(carried) + 1 for carried in lines[end:i]), None
+            size += len(line) + 1
+        cores.append((start, len(lines)))
+        return cores, [AIService._numbered_chunk(lines, core) for core in cores]
 
-        system_prompt = f"""You are a financial assistant. Categorize each bank transaction description.
-For each description pick EXACTLY ONE category from: [{cat_list_str}].
-If no category fits, use the closest match.
-Return ONLY a JSON object: {{"Description": "Category", ...}}"""
-
-        try:
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "\n".join(descriptions)},
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=1500,
-            )
-            return json.loads(response.choices[0].message.content or "{}")
-        except Exception as e:
-            print(f"❌ AI Categorization Error: {e}")
-            return {desc: "Other" for desc in descriptions}
+    @staticmethod
+    def _numbered_chunk(lines: list[str], core: tuple[int, int]) -> str:
+        """The owned lines plus AI_BANK_STATEMENT_OVERLAP_LINES of context, each prefixed "N| "."""
+        start, end = core
+        overlap = max(0, settings.AI_BANK_STATEMENT_OVERLAP_LINES)
+        return "\n".join(f"{i}| {lines[i]}" for i in range(max(0, start - overlap), min(len(lines), end + overlap)))
 
-    # ── Bank statement parsing ─────────────────────────────────────────────────
+    @staticmethod
+    def _split_statement_chunk(lines: list[str], core: tuple[int, int]) -> Optional[list[tuple[int, int]]]:
+        """Two halves of an owned range, cut at the transaction start nearest its middle; None for one line."""
+        start, end = core
+        if end - start < 2:
+            return None
+        middle = (start + end) // 2
+        starts = [i for i in range(start + 1, end) if _STATEMENT_ROW_START.match(lines[i])]
+        cut = min(starts, key=lambda i: abs(i - middle)) if starts else middle
+        return [(start, cut), (cut, end)]
 
     @staticmethod
-    def parse_bank_statement_text(raw_text: str) -> list[dict]:
+    def _merge_statement_chunks(parts: list[list[dict]], cores: list[tuple[int, int]]) -> list[dict]:
         """
-        Parses raw text from a bank statement PDF.
-        Returns [{date, merchant, amount, currency, title}].
+        Transactions of the chunk owning their line, in chunk order. An unnumbered transaction is
+        dropped when the previous chunk already returned one with the same date, amount and merchant
+        (read twice from the overlap).
         """
-        if not raw_text or len(raw_text.strip()) < 50:
-            return []
+        merged: list[dict] = []
+        previous: Counter[tuple[str, str, str]] = Counter()
+        for part, (start, end) in zip(parts, cores):
+            returned: Counter[tuple[str, str, str]] = Counter()
+            for transaction in part if isinstance(part, list) else []:
+                if not isinstance(transaction, dict):
+                    continue
+                key = (str(transaction.get("date")), str(transaction.get("amount")), str(transaction.get("merchant")))
+                try:
+                    line: Optional[int] = int(transaction.pop("line"))
+                except (KeyError, TypeError, ValueError):
+                    line = None
+                if line is None and previous[key] > 0:
+                    previous[key] -= 1
+                    continue
+                if line is not None and not start <= line < end:
+                    continue
+                returned[key] += 1
+                merged.append(transaction)
+            previous = returned
+        return merged
+
+
+# ── Async variant ──────────────────────────────────────────────────────────────
+
+# One AsyncOpenAI client (shared httpx connection pool) and concurrency limit per event loop.
+_async_clients: dict[asyncio.AbstractEventLoop, tuple[AsyncOpenAI, asyncio.Semaphore]] = {}
+
+
+def _get_async_client() -> tuple[AsyncOpenAI, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        for stale in [lp for lp in _async_clients if lp.is_closed()]:
+            del _async_clients[stale]
+        http_client = DefaultAsyncHttpxClient(limits=httpx.Limits(
+            max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+        ))
+        entry = (
+            AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client),
+            asyncio.Semaphore(max(1, settings.AI_MAX_CONCURRENCY)),
+        )
+        _async_clients[loop] = entry
+    return entry
+
+
+async def _acomplete_choice(request: dict, timeout: float) -> Any:
+    async_client, semaphore = _get_async_client()
+    async with semaphore:
+        response = await async_client.chat.completions.create(**request, timeout=timeout)
+    return response.choices[0]
+
+
+async def _acomplete(request: dict, timeout: float) -> Optional[str]:
+    return (await _acomplete_choice(request, timeout)).message.content
+
+
+async def _retry_backoff(attempt: int) -> None:
+    """Pause before retry number attempt + 1 (0.5s doubling, capped at 8s)."""
+    await asyncio.sleep(min(0.5 * 2 ** attempt, 8))
+
+
+async def close_async_clients() -> None:
+    """Close the running loop's AsyncOpenAI client (app shutdown)."""
+    entry = _async_clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[0].close()
+
+
+class AsyncAIService:
+    """
+    AIService on AsyncOpenAI — for callers already on the event loop (API endpoints).
+    Covers categorization and bank statement extraction only; receipt structuring runs in the
+    OCR executor through AIService. Same prompts and return values as AIService; at most
+    AI_MAX_CONCURRENCY requests in flight per loop, each with its operation's AI_TIMEOUT_*_SECONDS.
+    """
 
-        system_prompt = """You are a financial data extractor. Extract ALL transactions from this bank statement text.
+    @staticmethod
+    async def _categorize_batch(descriptions: list[str], categories: list[dict]) -> dict[str, str]:
+        """One categorization request; raises on transport/JSON errors."""
+        content = await _acomplete(_categorize_request(descriptions, categories), settings.AI_TIMEOUT_CATEGORIZE_SECONDS)
+        parsed = json.loads(content or "{}")
+        if not isinstance(parsed, dict):
+            raise ValueError("categorization response is not a JSON object")
+        return parsed
 
-For each transaction return:
-- date: YYYY-MM-DD
-- merchant: receiver or sender name (clean)
-- title: full transaction description
-- amount: number — expenses NEGATIVE, incomes POSITIVE
-- currency: e.g. "PLN"
+    @staticmethod
+    async def categorize_many(
+        descriptions: list[str],
+        categories: list[dict],
+        batch_size: int = 50,
+    ) -> dict[str, str]:
+        """
+        Categorize any number of descriptions: batches of `batch_size` are sent concurrently
+        (at most AI_CATEGORIZE_CONCURRENCY at once) and merged. A failed batch is retried on
+        its own up to AI_CATEGORIZE_RETRIES times; descriptions of a batch that keeps failing are
+        left out of the result (callers default them to "Other", and they are not memoized).
+        """
+        batches = [descriptions[i:i + batch_size] for i in range(0, len(descriptions), batch_size)]
+        if not batches:
+            return {}
+        limit = asyncio.Semaphore(max(1, settings.AI_CATEGORIZE_CONCURRENCY))
+
+        async def run(batch: list[str]) -> dict[str, str]:
+            for attempt in range(settings.AI_CATEGORIZE_RETRIES + 1):
+                try:
+                    async with limit:
+                        return await AsyncAIService._categorize_batch(batch, categories)
+                except Exception as e:
+                    print(f"⚠️ AI Categorization batch failed (attempt {attempt + 1}): {e}")
+                    if attempt < settings.AI_CATEGORIZE_RETRIES:
+                        await _retry_backoff(attempt)
+            print(f"❌ AI Categorization gave up on {len(batch)} descriptions")
+            return {}
 
-Guidelines for Polish banks (ING, mBank, PKO, Santander):
-- "Obciążenie" / "-" = expense (negative)
-- "Uznanie" / "+" = income (positive)
-- Skip headers, footers, balance rows.
+        mapping: dict[str, str] = {}
+        for result in await asyncio.gather(*(run(batch) for batch in batches)):
+            mapping.update(result)
+        return mapping
 
-Return ONLY valid JSON: {"transactions": [...]}"""
+    @staticmethod
+    async def _extract_statement_chunk(text: str, fragment: bool) -> list[dict]:
+        """One bank statement request; raises on transport/JSON errors and on a truncated response."""
+        choice = await _acomplete_choice(
+            _bank_statement_request(text, fragment), settings.AI_TIMEOUT_BANK_STATEMENT_SECONDS,
+        )
+        return _bank_transactions(choice)
 
-        try:
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": raw_text[:30000]},
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=4000,
-            )
-            parsed = json.loads(response.choices[0].message.content or "{}")
-            if isinstance(parsed, list):
-                return parsed
-            return parsed.get("transactions", [])
-        except Exception as e:
-            print(f"❌ AI Bank Statement Parse Error: {e}")
+    @staticmethod
+    async def parse_bank_statement_text(raw_text: str) -> list[dict]:
+        """
+        Statements longer than AI_BANK_STATEMENT_CHUNK_CHARS are cut at transaction starts
+        (AIService._statement_chunks); the chunks are sent concurrently (at most
+        AI_BANK_STATEMENT_CONCURRENCY at once), so latency stays near one chunk's, and merged
+        without the overlap duplicates. A chunk whose response hits max_tokens is split in two
+        and sent again. Any other failure is retried up to AI_BANK_STATEMENT_RETRIES times,
+        then raises BankStatementError: AI rows are hashed on model-written text, so a
+        re-import cannot be relied on to fill a gap, and nothing is imported instead.
+        """
+        if not raw_text or len(raw_text.strip()) < 50:
             return []
+        lines = raw_text.splitlines()
+        cores, texts = AIService._statement_chunks(raw_text)
+        fragment = len(texts) > 1
+        if not fragment:
+            texts = [raw_text]
+        else:
+            print(f"🧩 [Import] Extracting a {len(raw_text)}-char statement in {len(texts)} chunks")
+        limit = asyncio.Semaphore(max(1, settings.AI_BANK_STATEMENT_CONCURRENCY))
+        retries = settings.AI_BANK_STATEMENT_RETRIES
+
+        async def run(core: tuple[int, int], text: str, fragment: bool) -> list[tuple[tuple[int, int], list[dict]]]:
+            for attempt in range(retries + 1):
+                try:
+                    async with limit:
+                        return [(core, await AsyncAIService._extract_statement_chunk(text, fragment))]
+                except _TruncatedOutput:
+                    halves = AIService._split_statement_chunk(lines, core)
+                    if halves is None:
+                        raise BankStatementError(f"lines {core[0]}-{core[1]}: response truncated")
+                    print(f"✂️ [Import] Lines {core[0]}-{core[1]} hit max_tokens, splitting the chunk")
+                    nested = await asyncio.gather(*(
+                        run(half, AIService._numbered_chunk(lines, half), True) for half in halves
+                    ))
+                    return [part for parts in nested for part in parts]
+                except Exception as e:
+                    print(f"⚠️ AI Bank Statement chunk failed (attempt {attempt + 1}): {e}")
+                    if attempt < retries:
+                        await _retry_backoff(attempt)
+            print(f"❌ AI Bank Statement Parse Error: gave up on lines {core[0]}-{core[1]}")
+            raise BankStatementError(f"lines {core[0]}-{core[1]}: extraction failed")
+
+        nested = await asyncio.gather(*(run(core, text, fragment) for core, text in zip(cores, texts)))
+        chunks = [part for parts in nested for part in parts]
+        return AIService._merge_statement_chunks([part for _, part in chunks], [core for core, _ in chunks])
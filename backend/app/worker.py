@@ -0,0 +1,63 @@
+# backend/app/worker.py
+"""
+Standalone OCR worker — drains the receiptscan queue outside the API process.
+
+    python -m app.worker [--concurrency N] [--prefetch N] [--drain-timeout SECONDS]
+
+Runs the same job handler as the embedded API worker (api._process_scan via
+process_transaction_in_background), so receipt bursts no longer compete with
+request handling for the API event loop and thread pool. Run as many of these
+as needed; the global cap on RUNNING scans is enforced by the queue.
+Set OCR_EMBEDDED_WORKER=false on the API when dedicated workers are deployed.
+
+SIGTERM / SIGINT: stop claiming, hand prefetched jobs back, let running jobs
+finish for up to --drain-timeout seconds, requeue the rest.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import signal
+
+from .api import process_transaction_in_background
+from .config import settings
+from .ocr_executor import shutdown_ocr_executor
+from .ocr_pipeline import shutdown_preprocess_pool
+from .scan_queue import ScanQueueWorker
+
+logger = logging.getLogger("app.worker")
+
+
+async def serve(concurrency: int, prefetch: int, drain_timeout: float) -> None:
+    worker = ScanQueueWorker(
+        process_transaction_in_background,
+        concurrency=concurrency,
+        prefetch=prefetch,
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+
+    await worker.run()
+    logger.info("Shutdown requested, draining", extra={"worker_id": worker.worker_id})
+    await worker.drain(drain_timeout)
+    shutdown_ocr_executor()
+    shutdown_preprocess_pool()
+    logger.info("Worker stopped", extra={"worker_id": worker.worker_id})
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Receipt OCR queue worker")
+    parser.add_argument("--concurrency", type=int, default=settings.OCR_WORKER_CONCURRENCY)
+    parser.add_argument("--prefetch", type=int, default=settings.OCR_WORKER_PREFETCH)
+    parser.add_argument("--drain-timeout", type=float, default=settings.OCR_WORKER_DRAIN_SECONDS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    asyncio.run(serve(args.concurrency, args.prefetch, args.drain_timeout))
+
+
+if __name__ == "__main__":
+    main()
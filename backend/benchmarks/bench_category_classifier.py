@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: local category classifier (category_classifier.py) — accuracy,
+coverage per confidence threshold and learn/predict latency.
+
+Run from backend/:
+    python benchmarks/bench_category_classifier.py --budget <id>     # history from DATABASE_URL
+    python benchmarks/bench_category_classifier.py --csv <file>      # rows: description;category
+
+History is split chronologically: the model learns the first --train share and
+predicts the rest, learning each answer afterwards (as successive imports do).
+"Coverage" is the share of test descriptions answered locally at the threshold,
+"accuracy" the share of those answers matching the stored category.
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.category_classifier import CategoryClassifier  # noqa: E402
+from app.category_memo import import_description  # noqa: E402
+
+THRESHOLDS = [0.0, 0.5, 0.6, 0.7, 0.75, 0.8, 0.9]
+
+
+def history_from_db(budget_id: int) -> list[tuple[str, str]]:
+    from sqlmodel import Session, col, select
+    from app.database import operations_engine
+    from app.models import Category, Transaction, TransactionLine
+
+    with Session(operations_engine) as session:
+        names = {c.id: c.name for c in session.exec(select(Category)).all()}
+        rows = []
+        for tx in session.exec(
+            select(Transaction).where(Transaction.budget_id == budget_id, col(Transaction.category_id).is_not(None))
+            .order_by(col(Transaction.id))
+        ).all():
+            rows.append((import_description(tx) or tx.merchant_name, names[tx.category_id]))
+        for name, category_id in session.exec(
+            select(TransactionLine.name, TransactionLine.category_id)
+            .join(Transaction, col(Transaction.id) == col(TransactionLine.transaction_id))
+            .where(Transaction.budget_id == budget_id, col(TransactionLine.category_id).is_not(None))
+            .order_by(col(TransactionLine.id))
+        ).all():
+            rows.append((name, names[category_id]))
+    return rows
+
+
+def history_from_csv(path: str) -> list[tuple[str, str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return [(row[0], row[1]) for row in csv.reader(f, delimiter=";") if len(row) >= 2 and row[0].strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--budget", type=int, help="budget id in DATABASE_URL")
+    source.add_argument("--csv", help="description;category file in chronological order")
+    parser.add_argument("--train", type=float, default=0.7, help="training share (default 0.7)")
+    args = parser.parse_args()
+
+    rows = history_from_db(args.budget) if args.budget is not None else history_from_csv(args.csv)
+    if len(rows) < 10:
+        sys.exit(f"need at least 10 labelled rows, got {len(rows)}")
+    label_ids = {name: i for i, name in enumerate(sorted({c for _, c in rows}))}
+    split = int(len(rows) * args.train)
+    train, test = rows[:split], rows[split:]
+
+    model = CategoryClassifier()
+    start = time.perf_counter()
+    for text, category in train:
+        model.learn(text, label_ids[category])
+    build = time.perf_counter() - start
+
+    predictions = []
+    predict_time = 0.0
+    for text, category in test:
+        start = time.perf_counter()
+        prediction = model.predict(text)
+        predict_time += time.perf_counter() - start
+        predictions.append((prediction, label_ids[category]))
+        model.learn(text, label_ids[category])
+
+    blob = gzip.compress(json.dumps(model.to_dict(), ensure_ascii=False).encode())
+    start = time.perf_counter()
+    CategoryClassifier.from_dict(json.loads(gzip.decompress(blob)))
+    load = time.perf_counter() - start
+
+    print(f"{len(rows)} rows ({len(label_ids)} categories): train {len(train)}, test {len(test)}, "
+          f"{len(model)} unique descriptions")
+    print(f"learn {build / max(len(train), 1) * 1e6:.0f} µs/row, predict {predict_time / len(test) * 1e6:.0f} µs/row, "
+          f"model {len(blob) / 1024:.0f} KB gzip, load {load * 1000:.0f} ms\n")
+    print(f"{'threshold':>9} {'coverage':>9} {'accuracy':>9} {'AI calls saved':>15}")
+    for threshold in THRESHOLDS:
+        answered = [(p[0], truth) for p, truth in predictions if p is not None and p[1] >= threshold]
+        correct = sum(1 for predicted, truth in answered if predicted == truth)
+        accuracy = correct / len(answered) if answered else 0.0
+        print(f"{threshold:>9.2f} {len(answered) / len(test):>9.1%} {accuracy:>9.1%} {len(answered):>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: merchant detection — MerchantDetector (compiled signatures + Aho-Corasick
+anchor prefilter) vs. the original loop of re.search over every pattern string,
+for the shipped MERCHANT_SIGNATURES and synthetic registries of 100-1000 merchants.
+
+Run from backend/: python benchmarks/bench_detect_merchant.py
+"""
+import random
+import re
+import string
+import sys
+import os
+import timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ocr_pipeline import MERCHANT_SIGNATURES, MerchantDetector  # noqa: E402
+
+_HEADER_LINES = 30
+
+
+def detect_merchant_original(signatures: dict[str, list[str]], lines: list[str]):
+    header = "\n".join(lines[:_HEADER_LINES])
+    for merchant, patterns in signatures.items():
+        if any(re.search(p, header, re.IGNORECASE) for p in patterns):
+            return merchant
+    return None
+
+
+def synthetic_signatures(n: int, seed: int = 0) -> dict[str, list[str]]:
+    rng = random.Random(seed)
+    signatures = dict(MERCHANT_SIGNATURES)
+    while len(signatures) < n:
+        name = "".join(rng.choice(string.ascii_uppercase) for _ in range(8))
+        signatures[name.lower()] = [
+            rf"{name}\s+sp\.?\s*z\s*o\.?\s*o\.",
+            rf"{name[:6]}\s+Polska",
+            rf"ul\.\s*{name.title()}\s+\d+",
+        ]
+    return signatures
+
+
+def receipt(first_line: str) -> list[str]:
+    return [first_line, "ul. Warszawska 12, 00-001 Warszawa", "NIP 123-456-78-90",
+            "2025-03-02 nr wydr. 118842", "PARAGON FISKALNY"] + [
+        f"Produkt {i} C 1 x3,49 3,49C" for i in range(25)]
+
+
+def main() -> None:
+    cases = {"biedronka": receipt("JERONIMO MARTINS POLSKA S.A. BIEDRONKA NR 3312"),
+             "unknown": receipt("SKLEP SPOŻYWCZY U ANI")}
+    print(f"{'merchants':>9} {'receipt':>9} {'original ms':>12} {'detector ms':>12} {'speedup':>8}")
+    for n in [len(MERCHANT_SIGNATURES), 100, 300, 1000]:
+        signatures = synthetic_signatures(n)
+        detector = MerchantDetector(signatures)
+        for label, lines in cases.items():
+            match = detector.detect(lines)
+            assert (match.merchant if match else None) == detect_merchant_original(signatures, lines)
+            runs = 50 if n < 300 else 5
+            old = min(timeit.repeat(lambda: detect_merchant_original(signatures, lines), number=runs, repeat=3)) / runs
+            new = min(timeit.repeat(lambda: detector.detect(lines), number=runs, repeat=3)) / runs
+            print(f"{n:>9} {label:>9} {old * 1000:>12.3f} {new * 1000:>12.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ING statement parser (bank_import.parse_ing_pdf_text) vs. the original
+implementation (noise pattern list rebuilt and re.match'ed per line), rows/sec
+on a synthetic statement.
+
+Run from backend/: python benchmarks/bench_ing_parser.py [--rows 10000]
+"""
+import argparse
+import random
+import re
+import sys
+import os
+import timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.bank_import import parse_ing_pdf_text  # noqa: E402
+
+
+def parse_ing_pdf_text_original(text: str) -> list[dict]:
+    transactions = []
+    pattern = re.compile(
+        r"(\d{2}\.\d{2}\.\d{4})\s+(\d{2}\.\d{2}\.\d{4})\s+(.*?)\s+(-?\d{1,3}(?:[\s\xa0]\d{3})*[.,]\d{2})\s+PLN",
+        re.DOTALL | re.MULTILINE
+    )
+    for match in pattern.finditer(text):
+        date_str, posting_date, mid_text, amount_str = match.groups()
+        clean_amount = amount_str.replace(",", ".").replace(" ", "").replace("\xa0", "")
+        try:
+            amount = float(clean_amount)
+        except ValueError:
+            continue
+        try:
+            d_parts = date_str.split(".")
+            iso_date = f"{d_parts[2]}-{d_parts[1]}-{d_parts[0]}"
+        except IndexError:
+            continue
+        lines = [line.strip() for line in mid_text.split("\n") if line.strip()]
+        noise_patterns = [
+            r"^\d{8}-\d+.*",
+            r"^\d{10,}.*",
+            r"^\d{2}[\s\xa0]\d{4}.*",
+            r"^Nazwa i adres.*",
+            r"^Data księgowania.*",
+            r"^Szczegóły / nr.*",
+            r"^(TR\.KART|TR\.BLIK|PRZELEW|P\.BLIK|ST\.ZLEC)$",
+        ]
+        clean_lines = []
+        for line in lines:
+            is_noise = any(re.match(p, line, re.IGNORECASE) for p in noise_patterns)
+            if not is_noise:
+                line = re.sub(r"Nazwa i adres (odbiorcy|płatnika):\s*", "", line, flags=re.IGNORECASE)
+                clean_lines.append(line.strip())
+        if not clean_lines:
+            merchant = "Przelew/Transakcja"
+            title = mid_text.strip().replace("\n", " ")[:100]
+        else:
+            merchant = clean_lines[0]
+            title = " ".join(clean_lines[1:]) if len(clean_lines) > 1 else merchant
+        transactions.append({
+            "date": iso_date, "merchant": merchant[:100], "title": title[:200], "amount": amount, "currency": "PLN",
+        })
+    return transactions
+
+
+def make_statement(n_rows: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    kinds = ["TR.KART", "TR.BLIK", "PRZELEW", "P.BLIK", "ST.ZLEC"]
+    shops = ["BIEDRONKA 3312", "LIDL SP. Z O.O.", "ORLEN STACJA 77", "ALLEGRO.PL", "ZABKA Z1234"]
+    out = ["ING Bank Śląski S.A.", "Wyciąg z rachunku", "Data księgowania Data transakcji Szczegóły / nr"]
+    for i in range(n_rows):
+        day = f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2025"
+        amount = rng.choice([f"-{rng.randint(1, 999)},{rng.randint(0, 99):02d}",
+                             f"-{rng.randint(1, 9)} {rng.randint(100, 999)},{rng.randint(0, 99):02d}",
+                             f"{rng.randint(1, 99)} {rng.randint(100, 999)},00"])
+        out += [f"{day} {day}", rng.choice(kinds)]
+        if rng.random() < 0.4:
+            out.append(f"Nazwa i adres odbiorcy: {rng.choice(shops)}")
+        else:
+            out.append(rng.choice(shops))
+        out += [f"Płatność kartą {day} Nr karty 4246xx{i % 10000:04d}",
+                f"{rng.randint(10000000, 99999999)}-{rng.randint(1000, 9999)}",
+                f"{rng.randint(10, 99)} 1050 0031 {rng.randint(1000, 9999)} 0000 0000 0000",
+                f"{amount} PLN", f"{rng.randint(1, 20)} 000,00 PLN"]
+    return "\n".join(out) + "\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    text = make_statement(args.rows)
+    expected = parse_ing_pdf_text_original(text)
+    assert parse_ing_pdf_text(text) == expected
+    runs = 3
+    old = min(timeit.repeat(lambda: parse_ing_pdf_text_original(text), number=runs, repeat=3)) / runs
+    new = min(timeit.repeat(lambda: parse_ing_pdf_text(text), number=runs, repeat=3)) / runs
+    n = len(expected)
+    print(f"{n} rows, {len(text) / 2**20:.1f} MB of text")
+    print(f"original: {old * 1000:>7.0f} ms  {n / old:>9,.0f} rows/s")
+    print(f"new:      {new * 1000:>7.0f} ms  {n / new:>9,.0f} rows/s  ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
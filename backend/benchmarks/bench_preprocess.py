@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark: image pre-processing before OCR — bytes, OpenAI image tokens, Vision
+latency and parse accuracy, original upload vs preprocess_image().
+
+Run from backend/:
+    python benchmarks/bench_preprocess.py <fixture_dir>          # size / token / CPU only
+    python benchmarks/bench_preprocess.py <fixture_dir> --ocr    # + Google Vision on both variants
+
+<fixture_dir> holds receipt photos (*.jpg, *.jpeg, *.png). With --ocr, accuracy is
+the line-level similarity of the reconstructed text (difflib) and, where a
+deterministic parser exists, whether total_amount and item count match.
+Needs Pillow; --ocr needs google-cloud-vision credentials.
+"""
+import argparse
+import difflib
+import math
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings  # noqa: E402
+from app.ocr_pipeline import GoogleVisionOCRService, preprocess_image, reconstruct_lines  # noqa: E402
+from app.services import AIService  # noqa: E402
+
+
+def openai_high_detail_tokens(image_bytes: bytes) -> int:
+    """Image token estimate for detail=high: fit 2048², shortest side 768, 170 per 512px tile + 85."""
+    import io
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        w, h = img.size
+    scale = min(1.0, 2048 / max(w, h))
+    w, h = w * scale, h * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
+
+
+def ocr(service: GoogleVisionOCRService, image_bytes: bytes) -> tuple[list[str], float, dict | None]:
+    start = time.perf_counter()
+    result = service.extract(image_bytes)
+    elapsed = time.perf_counter() - start
+    return reconstruct_lines(result.words), elapsed, AIService.parse_ocr_result(result, use_ai=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("fixture_dir")
+    parser.add_argument("--ocr", action="store_true", help="also run Google Vision on both variants")
+    args = parser.parse_args()
+
+    settings.OCR_PREPROCESS_MIN_BYTES = 0  # measure every fixture
+    paths = sorted(
+        os.path.join(args.fixture_dir, n) for n in os.listdir(args.fixture_dir)
+        if n.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+    service = GoogleVisionOCRService() if args.ocr else None
+    if service is not None and not service.available:
+        sys.exit("google-cloud-vision is not installed/configured")
+
+    totals = {"orig_bytes": 0, "new_bytes": 0, "orig_tokens": 0, "new_tokens": 0, "cpu": 0.0,
+              "orig_ocr": 0.0, "new_ocr": 0.0, "similarity": 0.0, "parsed": 0, "parse_match": 0}
+    print(f"{'file':<28} {'orig KB':>8} {'new KB':>7} {'tok':>9} {'prep ms':>8}" + (
+        f" {'ocr ms':>11} {'lines sim':>9} {'parse':>6}" if service else ""))
+
+    for path in paths:
+        with open(path, "rb") as f:
+            original = f.read()
+        start = time.perf_counter()
+        processed = preprocess_image(original)
+        cpu = time.perf_counter() - start
+        tok_orig, tok_new = openai_high_detail_tokens(original), openai_high_detail_tokens(processed)
+
+        totals["orig_bytes"] += len(original)
+        totals["new_bytes"] += len(processed)
+        totals["orig_tokens"] += tok_orig
+        totals["new_tokens"] += tok_new
+        totals["cpu"] += cpu
+        row = (f"{os.path.basename(path)[:28]:<28} {len(original) / 1024:>8.0f} {len(processed) / 1024:>7.0f} "
+               f"{tok_orig:>4}→{tok_new:<4} {cpu * 1000:>8.0f}")
+
+        if service:
+            lines_orig, t_orig, parsed_orig = ocr(service, original)
+            lines_new, t_new, parsed_new = ocr(service, processed)
+            similarity = difflib.SequenceMatcher(None, lines_orig, lines_new).ratio()
+            totals["orig_ocr"] += t_orig
+            totals["new_ocr"] += t_new
+            totals["similarity"] += similarity
+            verdict = "-"
+            if parsed_orig is not None:
+                totals["parsed"] += 1
+                same = parsed_new is not None and (
+                    parsed_orig.get("total_amount") == parsed_new.get("total_amount")
+                    and len(parsed_orig.get("items", [])) == len(parsed_new.get("items", []))
+                )
+                totals["parse_match"] += int(same)
+                verdict = "same" if same else "DIFF"
+            row += f" {t_orig * 1000:>5.0f}→{t_new * 1000:<5.0f} {similarity:>9.3f} {verdict:>6}"
+        print(row)
+
+    n = len(paths) or 1
+    print(f"\n{len(paths)} images: {totals['orig_bytes'] / 2**20:.1f} MB → {totals['new_bytes'] / 2**20:.1f} MB, "
+          f"image tokens {totals['orig_tokens']} → {totals['new_tokens']}, "
+          f"pre-processing {totals['cpu'] / n * 1000:.0f} ms/image")
+    if service:
+        print(f"Vision latency {totals['orig_ocr'] / n * 1000:.0f} → {totals['new_ocr'] / n * 1000:.0f} ms/image, "
+              f"mean line similarity {totals['similarity'] / n:.3f}, "
+              f"parser agreement {totals['parse_match']}/{totals['parsed']}")
+
+
+if __name__ == "__main__":
+    main()
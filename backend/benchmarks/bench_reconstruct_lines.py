@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reconstruct_lines on long receipts vs. the original implementation
+(re-summing the line centroid on every appended word).
+
+Run from backend/: python benchmarks/bench_reconstruct_lines.py
+"""
+import random
+import sys
+import os
+import timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ocr_pipeline import BoundingBox, OCRWord, reconstruct_lines  # noqa: E402
+
+
+def reconstruct_lines_original(words: list[OCRWord], y_tolerance: float) -> list[str]:
+    sorted_words = sorted(words, key=lambda w: w.bounding_box.center_y)
+    lines: list[list[OCRWord]] = []
+    current_line: list[OCRWord] = []
+    current_y = None
+    for word in sorted_words:
+        cy = word.bounding_box.center_y
+        if current_y is None or abs(cy - current_y) <= y_tolerance:
+            current_line.append(word)
+            current_y = sum(w.bounding_box.center_y for w in current_line) / len(current_line)
+        else:
+            lines.append(sorted(current_line, key=lambda w: w.bounding_box.x_min))
+            current_line = [word]
+            current_y = cy
+    if current_line:
+        lines.append(sorted(current_line, key=lambda w: w.bounding_box.x_min))
+    return [" ".join(w.text for w in line) for line in lines]
+
+
+def make_receipt(n_words: int, words_per_line: int, seed: int = 0) -> list[OCRWord]:
+    rng = random.Random(seed)
+    words = []
+    for i in range(n_words):
+        row = i // words_per_line
+        y = row * 14 + rng.uniform(-2, 2)
+        x = (i % words_per_line) * 40 + rng.uniform(0, 5)
+        words.append(OCRWord(text=f"w{i}", bounding_box=BoundingBox(x, y, x + 35, y + 10)))
+    rng.shuffle(words)
+    return words
+
+
+def main() -> None:
+    print(f"{'words':>6} {'per line':>8} {'original ms':>12} {'new ms':>8} {'speedup':>8}")
+    for n_words, per_line in [(100, 4), (600, 6), (600, 60), (2000, 8), (2000, 200)]:
+        words = make_receipt(n_words, per_line)
+        assert reconstruct_lines(words, 5.0) == reconstruct_lines_original(words, 5.0)
+        runs = 20
+        old = min(timeit.repeat(lambda: reconstruct_lines_original(words, 5.0), number=runs, repeat=3)) / runs
+        new = min(timeit.repeat(lambda: reconstruct_lines(words, 5.0), number=runs, repeat=3)) / runs
+        print(f"{n_words:>6} {per_line:>8} {old * 1000:>12.2f} {new * 1000:>8.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Re-parse historical receipts from stored OCR words (no Google Vision, no AI).
+
+OCR words come from the OCR archive (OCR_ARCHIVE_DIR), falling back to the OCR
+cache. Scans whose words were never archived and have been evicted from the
+cache are reported as skipped_no_ocr; retry them to OCR them again.
+
+Run from backend/:
+    python scripts/reparse_receipts.py                 # dry run, all budgets
+    python scripts/reparse_receipts.py --budget-id 3   # one budget
+    python scripts/reparse_receipts.py --apply         # rewrite unverified scans
+"""
+import argparse
+import json
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlmodel import Session  # noqa: E402
+from app.database import operations_engine  # noqa: E402
+from app.reparse import reparse_scans  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-parse receipts from stored OCR words")
+    parser.add_argument("--budget-id", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--apply", action="store_true", help="write new results to unverified scans")
+    args = parser.parse_args()
+
+    print(f"🔁 Re-parsing receipts ({'apply' if args.apply else 'dry run'})...")
+    with Session(operations_engine) as session:
+        report = reparse_scans(session, budget_id=args.budget_id, batch_size=args.batch_size, apply=args.apply)
+
+    print(json.dumps(report.to_dict(), indent=2))
+    print(f"✅ Done: {report.reparsed}/{report.scanned} re-parsed, {report.applied} applied.")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ from app.database import get_session, get_ops_session
 from app.models import User, Budget, BudgetMember
 from app.auth import get_current_user
 from app.api import get_current_budget
+from app.config import settings
+from app.category_classifier import reset_classifiers
 
 # In-memory database for testing
 sqlite_url = "sqlite:///:memory:"
@@ -17,6 +19,22 @@ engine = create_engine(
     poolclass=StaticPool,
 )
 
+@pytest.fixture(autouse=True)
+def isolated_ocr_cache(tmp_path, monkeypatch):
+    """Keep the on-disk OCR cache and archive out of ./data during tests."""
+    monkeypatch.setattr(settings, "OCR_CACHE_DIR", str(tmp_path / "ocr_cache"))
+    monkeypatch.setattr(settings, "OCR_ARCHIVE_DIR", str(tmp_path / "ocr_archive"))
+
+
+@pytest.fixture(autouse=True)
+def isolated_category_classifier(tmp_path, monkeypatch):
+    """Per-test classifier directory and no models cached from a previous test's database."""
+    monkeypatch.setattr(settings, "CATEGORY_CLASSIFIER_DIR", str(tmp_path / "category_classifier"))
+    reset_classifiers()
+    yield
+    reset_classifiers()
+
+
 @pytest.fixture(name="session")
 def session_fixture():
     SQLModel.metadata.create_all(engine)
@@ -58,8 +58,7 @@ def test_manual_transaction_receipt_scan_is_null(client: TestClient, session: Se
 
 @patch("app.api.shutil.copyfileobj")
 @patch("builtins.open", new_callable=mock_open)
-@patch("app.api.process_transaction_in_background")
-def test_scan_creates_transaction_and_scan(mock_bg, mock_file_open, mock_copy, client: TestClient, session: Session):
+def test_scan_creates_transaction_and_scan(mock_file_open, mock_copy, client: TestClient, session: Session):
     file_content = b"fake_receipt_image_data"
     expected_hash = hashlib.sha256(file_content).hexdigest()
 
@@ -78,6 +77,9 @@ def test_scan_creates_transaction_and_scan(mock_bg, mock_file_open, mock_copy, c
     scan = session.exec(select(ReceiptScan).where(ReceiptScan.transaction_id == data["id"])).first()
     assert scan is not None
     assert scan.content_hash == expected_hash
+    assert scan.status == ScanStatus.QUEUED
+    assert scan.attempts == 0
+    assert scan.locked_by is None
 
 
 def test_scan_duplicate_returns_409(client: TestClient, session: Session):
@@ -106,8 +108,7 @@ def test_scan_duplicate_returns_409(client: TestClient, session: Session):
 
 
 @patch("app.api.os.path.exists", return_value=True)
-@patch("app.api.process_transaction_in_background")
-def test_retry_uses_scan_status(mock_bg, mock_exists, client: TestClient, session: Session):
+def test_retry_uses_scan_status(mock_exists, client: TestClient, session: Session):
     test_user = session.exec(select(User).where(User.email == "test@example.com")).first()
     assert test_user is not None
     test_budget = session.exec(select(Budget).where(Budget.name == "Domowy")).first()
@@ -118,18 +119,20 @@ def test_retry_uses_scan_status(mock_bg, mock_exists, client: TestClient, sessio
     session.refresh(transaction)
 
     assert transaction.id is not None
-    scan = ReceiptScan(transaction_id=transaction.id, status=ScanStatus.FAILED, image_path="/fake/path/image.jpg")
+    scan = ReceiptScan(
+        transaction_id=transaction.id, status=ScanStatus.FAILED, image_path="/fake/path/image.jpg",
+        error_message="timeout", attempts=3,
+    )
     session.add(scan)
     session.commit()
-    session.refresh(scan)
-    scan_id = scan.id
 
     response = client.post(f"/api/transactions/{transaction.id}/retry")
     assert response.status_code == 200
 
     session.refresh(scan)
     assert scan.status == ScanStatus.QUEUED
-    mock_bg.assert_called_once_with(transaction.id, scan_id, "/fake/path/image.jpg")
+    assert scan.error_message is None
+    assert scan.attempts == 0
 
 
 def test_delete_removes_receipt_scan(client: TestClient, session: Session):
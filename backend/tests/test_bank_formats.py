@@ -0,0 +1,138 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.bank_formats import (
+    PdfBankFormat, coerce_rows, detect_pdf_format, iso_date, parse_amount, parse_csv_statement, parse_statement,
+)
+from app.services import BankStatementError
+
+ING_CSV = """\
+"Lista transakcji";
+"Dokument nr 0123456/2025";
+"Wygenerowany dnia:";"2025-04-01";
+"Data transakcji";"Data księgowania";"Dane kontrahenta";"Tytuł";"Nr rachunku";"Nazwa banku";"Szczegóły";"Nr transakcji";"Kwota transakcji (waluta)";"Waluta";"Kwota blokady/zwolnienie blokady";"Waluta";"Saldo po transakcji";"Waluta"
+2025-03-03;2025-03-04;"BIEDRONKA 3312 WARSZAWA";"Płatność kartą";;;"TR.KART";"'202503030001'";-45,20;PLN;;;"1 000,00";PLN
+2025-03-05;;"JAN KOWALSKI";"Zwrot za bilety";"'12 1050 0031'";"ING";"PRZELEW";"'202503050002'";120,00;PLN;;;"1 120,00";PLN
+"Dokument ma charakter informacyjny";
+"""
+
+MBANK_CSV = """\
+mBank S.A. Bankowość Detaliczna;
+#Za okres:;
+01.03.2025;31.03.2025;
+
+#Data operacji;#Opis operacji;#Rachunek;#Kategoria;#Kwota;
+2025-03-02;"LIDL MARYWILSKA  ZAKUP PRZY UŻYCIU KARTY";"eKonto 1234";"Żywność";-67,89 PLN;
+2025-03-10;"PRZELEW PRZYCHODZĄCY WYNAGRODZENIE";"eKonto 1234";"Wpływy";"5 432,10 PLN";
+"""
+
+PKO_CSV = """\
+"Data operacji","Data waluty","Typ transakcji","Kwota","Waluta","Saldo po transakcji","Opis transakcji","",""
+"2025-03-04","2025-03-04","Płatność kartą","-12.34","PLN","+987.66","Tytuł: 000498849 74230783","Lokalizacja: Adres: ZABKA Z1234 Miasto: KRAKOW Kraj: POLSKA",""
+"2025-03-06","2025-03-06","Przelew na rachunek","+250.00","PLN","+1237.66","Rachunek nadawcy: 12 1020","Nazwa nadawcy: ANNA NOWAK","Tytuł: Obiad"
+"""
+
+SANTANDER_CSV = """\
+Data operacji,Data waluty,Opis transakcji,Rachunek nadawcy/odbiorcy,Nazwa nadawcy/odbiorcy,Kwota,Saldo
+07-03-2025,07-03-2025,"DOP. VISA 4246 PŁATNOŚĆ KARTĄ",,"ORLEN STACJA 77","-210,50","789,50"
+"""
+
+
+def _rows(text):
+    name, rows = parse_csv_statement(text)
+    return name, [(r["date"], r["merchant"], r["title"], r["amount"], r["currency"]) for r in rows]
+
+
+def test_ing_csv_header_found_below_account_summary():
+    assert _rows(ING_CSV) == ("ing_csv", [
+        ("2025-03-03", "BIEDRONKA 3312 WARSZAWA", "Płatność kartą", -45.2, "PLN"),
+        ("2025-03-05", "JAN KOWALSKI", "Zwrot za bilety", 120.0, "PLN"),
+    ])
+
+
+def test_mbank_csv_amount_carries_currency():
+    assert _rows(MBANK_CSV) == ("mbank_csv", [
+        ("2025-03-02", "LIDL MARYWILSKA  ZAKUP PRZY UŻYCIU KARTY", "LIDL MARYWILSKA  ZAKUP PRZY UŻYCIU KARTY", -67.89, "PLN"),
+        ("2025-03-10", "PRZELEW PRZYCHODZĄCY WYNAGRODZENIE", "PRZELEW PRZYCHODZĄCY WYNAGRODZENIE", 5432.1, "PLN"),
+    ])
+
+
+def test_pko_csv_merchant_from_labelled_description_cells():
+    assert _rows(PKO_CSV) == ("pko_csv", [
+        ("2025-03-04", "ZABKA Z1234", "000498849 74230783", -12.34, "PLN"),
+        ("2025-03-06", "ANNA NOWAK", "Obiad", 250.0, "PLN"),
+    ])
+
+
+def test_santander_csv_day_first_dates():
+    assert _rows(SANTANDER_CSV) == ("santander_csv", [
+        ("2025-03-07", "ORLEN STACJA 77", "DOP. VISA 4246 PŁATNOŚĆ KARTĄ", -210.5, "PLN"),
+    ])
+
+
+def test_generic_csv_keeps_historical_aliases():
+    name, rows = _rows("Data;Kontrahent;Opis;Kwota\n01.03.2025;Sklep;Zakupy;-1,50\n")
+    assert (name, rows) == ("generic_csv", [("2025-03-01", "Sklep", "Zakupy", -1.5, "PLN")])
+
+
+def test_unrecognised_files_are_left_for_ai():
+    statement = parse_statement("foo,bar\n1,2\n".encode(), "export.csv")
+    assert (statement.format, statement.rows, statement.text) == (None, [], "foo,bar\n1,2\n")
+    assert detect_pdf_format("Wyciąg z rachunku\nSaldo początkowe 100,00") is None
+    assert detect_pdf_format("ING Bank Śląski S.A.\nWyciąg").name == "ing_pdf"
+
+
+def test_pdf_fingerprint_ignores_row_shapes_of_other_banks():
+    pko_page = "PKO BP\nHistoria rachunku\n03.03.2025 03.03.2025 Płatność kartą ZABKA -12,34 PLN"
+    assert detect_pdf_format(pko_page) is None
+    ing_page = "Data księgowania Data transakcji Dane kontrahenta Tytuł Kwota\n03.03.2025 03.03.2025 LIDL -1,00 PLN"
+    assert detect_pdf_format(ing_page).name == "ing_pdf"
+
+
+def test_pdf_format_must_implement_iter_rows():
+    class Incomplete(PdfBankFormat):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_legacy_dedup_key_keeps_raw_cells():
+    _, rows = parse_csv_statement("Data;Kontrahent;Opis;Kwota\n2025-03-01; Sklep ;Zakupy ;-1,50\n")
+    row = next(rows)
+    assert (row["merchant"], row["title"]) == ("Sklep", "Zakupy")
+    # The string the import hashed before the format registry
+    assert row["dedup_key"] == "2025-03-01_-1.5_ Sklep _Zakupy "
+    assert "dedup_key" not in next(parse_csv_statement(PKO_CSV)[1])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("-1 234,56", (-1234.56, None)),
+    ("+1234.56", (1234.56, None)),
+    ("1.234,56 PLN", (1234.56, "PLN")),
+    ("1,234.56", (1234.56, None)),
+    ("-12,34\xa0EUR", (-12.34, "EUR")),
+])
+def test_parse_amount(text, expected):
+    assert parse_amount(text) == expected
+
+
+def test_iso_date_and_ai_rows():
+    assert iso_date("2025-03-01 12:30") == iso_date("01.03.2025") == iso_date("01-03-2025") == "2025-03-01"
+    rows = list(coerce_rows([
+        {"date": "2025-03-01", "merchant": "A", "amount": -1.5},
+        {"date": "bad", "amount": 1},
+        {"date": "02.03.2025", "amount": "-2,00 PLN", "title": "B"},
+        "junk",
+    ]))
+    assert [(r["date"], r["amount"], r["currency"]) for r in rows] == [("2025-03-01", -1.5, "PLN"), ("2025-03-02", -2.0, "PLN")]
+
+
+def test_import_refused_when_ai_extraction_is_incomplete(client: TestClient):
+    failing = AsyncMock(side_effect=BankStatementError("lines 40-80: extraction failed"))
+    with patch("app.api.AsyncAIService.parse_bank_statement_text", failing):
+        response = client.post("/api/transactions/import", files={"file": ("export.csv", b"foo,bar\n1,2\n")})
+
+    assert response.status_code == 502
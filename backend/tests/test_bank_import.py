@@ -0,0 +1,120 @@
+import random
+
+from app.bank_import import extract_pdf_pages, iter_ing_pdf_rows, parse_ing_pdf_text, shutdown_pdf_pool
+from app.config import settings
+
+
+def _statement_rows(n: int) -> list[str]:
+    rng = random.Random(3)
+    rows = []
+    for i in range(n):
+        day = f"{i % 28 + 1:02d}.03.2025"
+        rows += [
+            f"{day} {day}",
+            "TR.KART",
+            f"SKLEP {i} WARSZAWA",
+            f"Płatność kartą {day} Nr karty 4246xx{i:04d}",
+            f"-{rng.randint(1, 999)},{rng.randint(0, 99):02d} PLN",
+            "Saldo po transakcji 1 000,00 PLN",
+        ]
+    return rows
+
+
+def _pages(lines: list[str], sizes: list[int]) -> list[str]:
+    pages, i = [], 0
+    for size in sizes:
+        pages.append("\n".join(lines[i:i + size]))
+        i += size
+    pages.append("\n".join(lines[i:]))
+    return pages
+
+
+def test_streaming_rows_match_whole_document_parse_across_page_breaks():
+    lines = _statement_rows(40)
+    rng = random.Random(11)
+    for _ in range(20):
+        # Page breaks at arbitrary lines, including inside a transaction
+        pages = _pages(lines, [rng.randint(1, 17) for _ in range(12)])
+        assert list(iter_ing_pdf_rows(pages)) == parse_ing_pdf_text("\n".join(pages) + "\n")
+    assert len(parse_ing_pdf_text("\n".join(lines))) == 40
+
+
+def test_row_split_by_page_break_is_kept():
+    pages = ["Wyciąg ING\n05.03.2025 05.03.2025\nTR.KART\nBIEDRONKA 1234", "Strona 2\n-45,20 PLN\nkoniec"]
+
+    rows = list(iter_ing_pdf_rows(pages))
+
+    assert [(r["date"], r["merchant"], r["amount"]) for r in rows] == [("2025-03-05", "BIEDRONKA 1234", -45.2)]
+
+
+def test_noise_lines_and_labels_are_dropped():
+    text = "\n".join([
+        "07.03.2025 07.03.2025",
+        "przelew",
+        "NAZWA I ADRES ODBIORCY: Jan Kowalski",
+        "10500031-1234 ref",
+        "12 1050 0031 0000 0000 0000 0000",
+        "Czynsz marzec",
+        "Wspólnota Nazwa i adres odbiorcy: ul. Polna 1",
+        "-1 250,00 PLN",
+    ])
+
+    [row] = parse_ing_pdf_text(text)
+
+    assert (row["date"], row["merchant"], row["title"], row["amount"]) == (
+        "2025-03-07", "Czynsz marzec", "Wspólnota ul. Polna 1", -1250.0,
+    )
+
+
+def test_carry_is_trimmed_on_pages_without_rows():
+    pages = ["x" * 10_000, "Podsumowanie\n" * 500, "01.03.2025 01.03.2025\nSKLEP\n-1,00 PLN"]
+    assert len(list(iter_ing_pdf_rows(pages))) == 1
+
+
+def _pdf(pages: list[list[str]]) -> bytes:
+    """Minimal multi-page text PDF, one Helvetica line per string."""
+    n = len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(n)), n),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        content = "".join(
+            f"BT /F1 10 Tf 20 {780 - 14 * j} Td ({text}) Tj ET\n" for j, text in enumerate(lines)
+        ).encode("latin-1")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> >> >>" % (5 + 2 * i)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+_PAGES = [[f"Strona {p}", f"{p + 1:02d}.03.2025 {p + 1:02d}.03.2025", f"SKLEP {p}", f"-{p + 1},00 PLN"] for p in range(6)]
+
+
+def test_extract_pdf_pages_in_process(monkeypatch):
+    monkeypatch.setattr(settings, "BANK_PDF_PARALLEL_MIN_PAGES", 1000)
+    pages = list(extract_pdf_pages(_pdf(_PAGES)))
+    assert [p.splitlines()[0] for p in pages] == [f"Strona {p}" for p in range(6)]
+
+
+def test_extract_pdf_pages_on_process_pool_keeps_page_order(monkeypatch):
+    monkeypatch.setattr(settings, "BANK_PDF_PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(settings, "BANK_PDF_WORKERS", 2)
+    try:
+        rows = list(iter_ing_pdf_rows(extract_pdf_pages(_pdf(_PAGES))))
+    finally:
+        shutdown_pdf_pool()
+    assert [r["amount"] for r in rows] == [-1.0, -2.0, -3.0, -4.0, -5.0, -6.0]
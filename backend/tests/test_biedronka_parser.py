@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+from app.biedronka_parser import BiedronkaReceiptParser
+from app.lidl_parser import ParsedReceipt
+
+HEADER = [
+    "JERONIMO MARTINS POLSKA S.A.",
+    "BIEDRONKA NR 3312",
+    "ul. Marszałkowska 10, 00-001 Warszawa",
+    "NIP 779-10-11-327",
+    "2025-03-02 nr wydr. 118842",
+    "PARAGON FISKALNY",
+]
+
+
+def _parse(lines: list[str]) -> ParsedReceipt:
+    return BiedronkaReceiptParser().parse(lines)
+
+
+def test_parses_header_date_and_total():
+    receipt = _parse(HEADER + ["Chleb Baltonowski C 1 x4,29 4,29C", "SUMA PLN 4,29"])
+    assert receipt.merchant_name == "Biedronka"
+    assert receipt.date == "2025-03-02"
+    assert receipt.total_amount == Decimal("4.29")
+
+
+def test_dotted_date():
+    receipt = _parse(["BIEDRONKA", "02.03.2025 12:41", "PARAGON FISKALNY", "SUMA PLN 0,00"])
+    assert receipt.date == "2025-03-02"
+
+
+def test_item_on_one_line_with_quantity():
+    receipt = _parse(HEADER + ["Mleko UHT 3,2% 1L C 2 x3,49 6,98C", "SUMA PLN 6,98"])
+    assert len(receipt.items) == 1
+    item = receipt.items[0]
+    assert (item.name, item.price, item.quantity) == ("Mleko UHT 3,2% 1L", Decimal("6.98"), Decimal("2"))
+
+
+def test_price_on_line_below_name_with_weight():
+    receipt = _parse(HEADER + ["Banany luz", "C 0,842 x5,99 5,04C", "SUMA PLN 5,04"])
+    assert receipt.items[0].name == "Banany luz"
+    assert receipt.items[0].quantity == Decimal("0.842")
+    assert receipt.items[0].price == Decimal("5.04")
+
+
+def test_discount_is_own_item_and_price_after_discount_skipped():
+    receipt = _parse(HEADER + [
+        "Serek Wiejski 200g C 2 x2,99 5,98C",
+        "Rabat -1,00C",
+        "4,98C",
+        "Masło Extra 200g C 1 x7,49 7,49C",
+        "SUMA PLN 12,47",
+    ])
+    assert [(i.name, i.price) for i in receipt.items] == [
+        ("Serek Wiejski 200g", Decimal("5.98")),
+        ("Rabat", Decimal("-1.00")),
+        ("Masło Extra 200g", Decimal("7.49")),
+    ]
+    assert sum(i.price for i in receipt.items) == receipt.total_amount
+
+
+def test_summary_section_is_not_parsed_as_products():
+    receipt = _parse(HEADER + [
+        "Woda 1,5L A 6 x1,99 11,94A",
+        "SPRZEDAŻ OPODATKOWANA A 11,94",
+        "PTU A 23,00% 2,23",
+        "SUMA PTU 2,23",
+        "SUMA PLN 11,94",
+        "Karta płatnicza 11,94",
+    ])
+    assert [i.name for i in receipt.items] == ["Woda 1,5L"]
+    assert receipt.total_amount == Decimal("11.94")
+
+
+def test_lines_before_paragon_fiskalny_are_header():
+    receipt = _parse(["BIEDRONKA", "Chleb C 1 x4,29 4,29C", "PARAGON FISKALNY", "Mleko C 1 x2,99 2,99C"])
+    assert [i.name for i in receipt.items] == ["Mleko"]
@@ -0,0 +1,220 @@
+import os
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.api import _process_scan
+from app.category_classifier import (
+    CategoryClassifier, ItemCategoryIndex, classify_descriptions, flush_classifiers, get_classifier, learn_examples,
+    load_classifier, reset_classifiers, save_classifier, suggest_item_categories,
+)
+from app.category_memo import remember_categories
+from app.config import settings
+from app.models import Budget, Category, ReceiptScan, ScanStatus, Transaction, TransactionLine
+
+FOOD, FUEL, HOME = 1, 2, 3
+
+
+def _model() -> CategoryClassifier:
+    model = CategoryClassifier()
+    for text, category_id in [
+        ("BIEDRONKA 1234 Płatność kartą 02.03.2025", FOOD),
+        ("LIDL SP. Z O.O. Płatność kartą 05.03.2025", FOOD),
+        ("ORLEN STACJA 77 Płatność kartą 05.03.2025", FUEL),
+        ("SHELL 4411 Płatność BLIK", FUEL),
+        ("CASTORAMA WARSZAWA Płatność kartą 09.03.2025", HOME),
+    ]:
+        model.learn(text, category_id)
+    return model
+
+
+def test_predicts_known_merchant_with_new_date():
+    category_id, confidence = _model().predict("BIEDRONKA 551 Płatność kartą 14.04.2025")
+    assert category_id == FOOD
+    assert confidence > 0.75
+
+
+def test_unknown_merchant_has_low_confidence():
+    prediction = _model().predict("ZABKA Z1234 Płatność kartą 14.04.2025")
+    assert prediction is None or prediction[1] < 0.75
+
+
+def test_conflicting_labels_lower_confidence():
+    model = _model()
+    _, before = model.predict("ORLEN STACJA 77")
+    model.learn("ORLEN STACJA 77 Płatność kartą 05.03.2025", FOOD)
+    _, after = model.predict("ORLEN STACJA 77")
+    assert after < before
+
+
+def test_roundtrip_preserves_predictions():
+    model = _model()
+    model.learn("ORLEN STACJA 77 Płatność kartą 06.03.2025", FUEL)
+    restored = CategoryClassifier.from_dict(model.to_dict())
+    for text in ["ORLEN 12", "castorama", "lidl sklep"]:
+        assert restored.predict(text) == model.predict(text)
+
+
+def _history(session: Session) -> tuple[int, Category, Category]:
+    budget = Budget(name="Classifier")
+    session.add(budget)
+    session.commit()
+    assert budget.id is not None
+    food, fuel = Category(name="Food", budget_id=budget.id), Category(name="Fuel", budget_id=budget.id)
+    session.add(food)
+    session.add(fuel)
+    session.commit()
+    tx = Transaction(merchant_name="ORLEN STACJA 77", note="Płatność kartą 05.03.2025",
+                     import_hash="h1", budget_id=budget.id, category_id=fuel.id)
+    receipt = Transaction(merchant_name="Lidl", budget_id=budget.id, category_id=food.id)
+    session.add(tx)
+    session.add(receipt)
+    remember_categories(session, budget.id, {"ORLEN STACJA 77 Płatność kartą 05.03.2025": fuel.id}, source="user")
+    session.commit()
+    session.add(TransactionLine(name="Mleko UHT 3,2% 1L", price=3.5, transaction_id=receipt.id, category_id=food.id))
+    session.commit()
+    return budget.id, food, fuel
+
+
+def test_builds_from_trusted_history_and_persists(session: Session):
+    budget_id, food, fuel = _history(session)
+    # AI answer and the "Other" default of a failed AI batch: imported, never confirmed
+    session.add(Transaction(merchant_name="SHELL 4411", note="Płatność BLIK", import_hash="h2",
+                            budget_id=budget_id, category_id=fuel.id))
+    session.add(Transaction(merchant_name="ALLEGRO 998", import_hash="h3", budget_id=budget_id, category_id=food.id))
+    session.commit()
+
+    model = get_classifier(session, budget_id)
+    assert sorted(model.docs) == ["lidl", "mleko uht #,#% #l", "orlen stacja # płatność kartą #.#.#"]
+    assert os.path.exists(os.path.join(settings.CATEGORY_CLASSIFIER_DIR, f"budget_{budget_id}.json.gz"))
+
+    learn_examples(session, budget_id, [("SHELL 4411 Płatność BLIK", fuel.id)])
+    assert flush_classifiers() == 1
+    reset_classifiers()
+    restored = load_classifier(budget_id)
+    assert len(restored) == 4
+    assert restored.built
+
+
+def test_learned_examples_are_saved_at_most_once_per_interval(session: Session, monkeypatch):
+    budget_id, food, fuel = _history(session)
+    monkeypatch.setattr(settings, "CATEGORY_CLASSIFIER_SAVE_SECONDS", 3600)
+    get_classifier(session, budget_id)  # built from history and saved
+    saves = []
+    monkeypatch.setattr("app.category_classifier.save_classifier", lambda budget_id, model: saves.append(len(model)))
+
+    learn_examples(session, budget_id, [("SHELL 4411 Płatność BLIK", fuel.id)])
+    learn_examples(session, budget_id, [("ALLEGRO 998", food.id)])
+
+    assert saves == []
+    assert flush_classifiers() == 1
+    assert saves == [5]
+    assert flush_classifiers() == 0
+
+
+def test_unsaved_examples_survive_a_reload(session: Session, monkeypatch):
+    budget_id, food, fuel = _history(session)
+    monkeypatch.setattr(settings, "CATEGORY_CLASSIFIER_SAVE_SECONDS", 3600)
+    model = get_classifier(session, budget_id)
+    learn_examples(session, budget_id, [("SHELL 4411 Płatność BLIK", fuel.id)])
+    save_classifier(budget_id, load_classifier(budget_id))  # another process writes the file
+    os.utime(os.path.join(settings.CATEGORY_CLASSIFIER_DIR, f"budget_{budget_id}.json.gz"), (1, 1))
+
+    reloaded = get_classifier(session, budget_id)
+
+    assert reloaded is not model
+    assert classify_descriptions(session, budget_id, ["SHELL 12 Płatność BLIK"]) == {"SHELL 12 Płatność BLIK": fuel.id}
+
+
+def test_category_set_later_by_user_is_learned(client: TestClient, session: Session):
+    budget = session.exec(select(Budget)).first()
+    assert budget is not None and budget.id is not None
+    fuel = Category(name="Fuel", budget_id=budget.id)
+    tx = Transaction(merchant_name="SHELL 4411", note="Płatność BLIK", import_hash="h1", budget_id=budget.id)
+    session.add(fuel)
+    session.add(tx)
+    session.commit()
+    assert classify_descriptions(session, budget.id, ["SHELL 12 Płatność BLIK"]) == {}
+
+    response = client.patch(f"/api/transactions/{tx.id}", json={"category_id": fuel.id})
+
+    assert response.status_code == 200
+    assert classify_descriptions(session, budget.id, ["SHELL 12 Płatność BLIK"]) == {"SHELL 12 Płatność BLIK": fuel.id}
+
+
+def test_classify_descriptions_applies_threshold(session: Session):
+    budget_id, food, fuel = _history(session)
+
+    found = classify_descriptions(
+        session, budget_id, ["ORLEN STACJA 12 Płatność kartą 01.04.2025", "mleko uht 2% 1l", "ALLEGRO 998"],
+    )
+
+    assert found == {"ORLEN STACJA 12 Płatność kartą 01.04.2025": fuel.id, "mleko uht 2% 1l": food.id}
+
+
+# ── Item categories ───────────────────────────────────────────────────────────
+
+def _receipt(session: Session, budget_id: int, status: ScanStatus, lines: list[tuple[str, int | None]]) -> Transaction:
+    tx = Transaction(merchant_name="Lidl", budget_id=budget_id)
+    session.add(tx)
+    session.commit()
+    assert tx.id is not None
+    session.add(ReceiptScan(transaction_id=tx.id, status=status))
+    for name, category_id in lines:
+        session.add(TransactionLine(name=name, price=1.0, transaction_id=tx.id, category_id=category_id))
+    session.commit()
+    return tx
+
+
+def test_item_index_learns_only_verified_lines(session: Session):
+    budget_id, food, fuel = _history(session)
+    _receipt(session, budget_id, ScanStatus.CATEGORIZATION_OK, [("Chleb żytni 500g", food.id)])
+    _receipt(session, budget_id, ScanStatus.NEEDS_REVIEW, [("Płyn do spryskiwaczy 5L", fuel.id)])
+
+    index = get_classifier(session, budget_id, ItemCategoryIndex)
+
+    # The manual Lidl transaction's line counts as verified; the unreviewed scan's line does not
+    assert sorted(index.docs) == ["chleb żytni #g", "mleko uht #,#% #l"]
+    assert suggest_item_categories(session, budget_id, ["CHLEB ŻYTNI 400G", "Płyn do spryskiwaczy 5L"]) == {
+        "CHLEB ŻYTNI 400G": food.id,
+    }
+
+
+def test_verify_feeds_item_index(client: TestClient, session: Session):
+    budget = session.exec(select(Budget)).first()
+    assert budget is not None and budget.id is not None
+    food = Category(name="Food", budget_id=budget.id)
+    session.add(food)
+    session.commit()
+    tx = _receipt(session, budget.id, ScanStatus.NEEDS_REVIEW, [("Ser gouda plastry", None)])
+    assert suggest_item_categories(session, budget.id, ["Ser gouda plastry 150g"]) == {}
+
+    response = client.post(f"/api/transactions/{tx.id}/verify", json={
+        "transaction_update": {},
+        "lines_update": [{"name": "Ser gouda plastry", "price": 1.0, "category_id": food.id}],
+    })
+
+    assert response.status_code == 200
+    assert suggest_item_categories(session, budget.id, ["Ser gouda plastry 150g"]) == {"Ser gouda plastry 150g": food.id}
+
+
+async def test_process_scan_fills_item_categories_without_ai(session: Session):
+    budget_id, food, fuel = _history(session)
+    tx = _receipt(session, budget_id, ScanStatus.QUEUED, [])
+    scan = session.exec(select(ReceiptScan).where(ReceiptScan.transaction_id == tx.id)).one()
+    parsed = {
+        "merchant_name": "Lidl", "total_amount": 7.0, "currency": "PLN",
+        "items": [
+            {"name": "Mleko UHT 2% 1L", "price": 3.5, "quantity": 1.0, "category": None},
+            {"name": "Baterie AA", "price": 3.5, "quantity": 1.0, "category": None},
+        ],
+    }
+
+    with patch("app.api.operations_engine", session.get_bind()), \
+            patch("app.api._run_receipt_pipeline", new_callable=AsyncMock, return_value=parsed):
+        await _process_scan(scan.id, tx.id, "receipt.jpg")
+
+    session.expire_all()
+    lines = session.exec(select(TransactionLine).where(TransactionLine.transaction_id == tx.id)).all()
+    assert {line.name: line.category_id for line in lines} == {"Mleko UHT 2% 1L": food.id, "Baterie AA": None}
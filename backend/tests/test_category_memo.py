@@ -0,0 +1,86 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.category_memo import lookup_categories, normalize_description, remember_categories
+from app.models import Budget, Category, CategoryMemo, Transaction
+
+
+def _budget_with_categories(session: Session) -> tuple[Budget, Category, Category]:
+    budget = Budget(name="Memo")
+    session.add(budget)
+    session.commit()
+    session.refresh(budget)
+    food, fuel = Category(name="Food", budget_id=budget.id), Category(name="Fuel", budget_id=budget.id)
+    session.add(food)
+    session.add(fuel)
+    session.commit()
+    session.refresh(food)
+    session.refresh(fuel)
+    return budget, food, fuel
+
+
+def test_normalize_description_ignores_case_spacing_and_numbers():
+    assert normalize_description("BIEDRONKA 1234  Płatność kartą 02.03.2025") == \
+        normalize_description("Biedronka 987 Płatność kartą 14.04.2025")
+
+
+def test_lookup_counts_hits(session: Session):
+    budget, food, _ = _budget_with_categories(session)
+    assert budget.id is not None and food.id is not None
+    remember_categories(session, budget.id, {"BIEDRONKA 1234 zakupy": food.id}, source="ai")
+    session.commit()
+
+    assert lookup_categories(session, budget.id, ["BIEDRONKA 55 zakupy", "LIDL"]) == {"BIEDRONKA 55 zakupy": food.id}
+    session.commit()
+
+    memo = session.exec(select(CategoryMemo)).one()
+    assert memo.hit_count == 1
+
+
+def test_ai_answer_does_not_replace_user_correction(session: Session):
+    budget, food, fuel = _budget_with_categories(session)
+    assert budget.id is not None and food.id is not None and fuel.id is not None
+    remember_categories(session, budget.id, {"ORLEN 1": fuel.id}, source="user")
+    session.commit()
+
+    remember_categories(session, budget.id, {"ORLEN 2": food.id}, source="ai")
+    session.commit()
+
+    memo = session.exec(select(CategoryMemo)).one()
+    assert (memo.category_id, memo.source) == (fuel.id, "user")
+
+
+def test_category_change_on_imported_transaction_is_remembered(client: TestClient, session: Session):
+    budget = session.exec(select(Budget)).first()
+    assert budget is not None and budget.id is not None
+    fuel = Category(name="Fuel", budget_id=budget.id)
+    session.add(fuel)
+    tx = Transaction(
+        merchant_name="ORLEN STACJA 77", note="Płatność kartą 05.03.2025",
+        budget_id=budget.id, import_hash="abc",
+    )
+    session.add(tx)
+    session.commit()
+
+    response = client.patch(f"/api/transactions/{tx.id}", json={"category_id": fuel.id})
+
+    assert response.status_code == 200
+    memo = session.exec(select(CategoryMemo)).one()
+    assert (memo.category_id, memo.source) == (fuel.id, "user")
+    assert memo.normalized_description == normalize_description("ORLEN STACJA 77 Płatność kartą 05.03.2025")
+
+
+def test_deleting_category_forgets_its_memo_entries(client: TestClient, session: Session):
+    budget = session.exec(select(Budget)).first()
+    assert budget is not None and budget.id is not None
+    fuel, food = Category(name="Fuel", budget_id=budget.id), Category(name="Food", budget_id=budget.id)
+    session.add(fuel)
+    session.add(food)
+    session.commit()
+    remember_categories(session, budget.id, {"ORLEN 1": fuel.id, "LIDL 2": food.id}, source="user")
+    session.commit()
+
+    response = client.delete(f"/api/categories/{fuel.id}")
+
+    assert response.status_code == 204
+    assert lookup_categories(session, budget.id, ["ORLEN 1", "LIDL 2"]) == {"LIDL 2": food.id}
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from app.category_classifier import classify_descriptions
+from app.corrections import diff_snapshots, merchant_aliases
+from app.models import Budget, Category, ReceiptScan, ScanStatus, Transaction, TransactionLine, VerificationCorrection
+
+
+def _scanned(session: Session, budget_id: int, merchant: str = "LIDL SP Z O O") -> Transaction:
+    tx = Transaction(merchant_name=merchant, budget_id=budget_id, total_amount=7.0,
+                     date=datetime(2025, 3, 2, tzinfo=timezone.utc))
+    session.add(tx)
+    session.commit()
+    assert tx.id is not None
+    session.add(ReceiptScan(transaction_id=tx.id, status=ScanStatus.NEEDS_REVIEW))
+    session.add(TransactionLine(name="Mleko UHT", price=3.5, transaction_id=tx.id))
+    session.add(TransactionLine(name="Chleb", price=3.5, transaction_id=tx.id))
+    session.commit()
+    return tx
+
+
+def _budget(session: Session) -> Budget:
+    budget = session.exec(select(Budget)).first()
+    assert budget is not None and budget.id is not None
+    return budget
+
+
+def test_diff_reports_changed_fields_and_lines():
+    before = {"merchant_name": "LIDL", "total_amount": 7.0, "date": None, "category_id": None,
+              "lines": [{"name": "Mleko", "price": 3.5, "quantity": 1.0, "category_id": None}]}
+    after = {**before, "merchant_name": "Lidl", "lines": [
+        {"name": "Mleko", "price": 3.5, "quantity": 1.0, "category_id": 4},
+        {"name": "Torba", "price": 0.5, "quantity": 1.0, "category_id": None},
+    ]}
+
+    assert diff_snapshots(before, after) == [
+        ("merchant_name", None, "LIDL", "Lidl"),
+        ("line.category_id", 0, None, "4"),
+        ("line.name", 1, None, "Torba"),
+        ("line.price", 1, None, "0.5"),
+        ("line.quantity", 1, None, "1.0"),
+    ]
+
+
+def test_verify_records_only_changed_values(client: TestClient, session: Session):
+    budget = _budget(session)
+    food = Category(name="Food", budget_id=budget.id)
+    session.add(food)
+    session.commit()
+    tx = _scanned(session, budget.id)
+
+    response = client.post(f"/api/transactions/{tx.id}/verify", json={
+        "transaction_update": {"merchant_name": "Lidl", "total_amount": 7.0},
+        "lines_update": [{"category_id": food.id}, {}],
+    })
+
+    assert response.status_code == 200
+    rows = session.exec(select(VerificationCorrection).order_by(VerificationCorrection.id)).all()
+    assert [(r.field, r.line_index, r.original, r.corrected) for r in rows] == [
+        ("merchant_name", None, "LIDL SP Z O O", "Lidl"),
+        ("line.category_id", 0, None, str(food.id)),
+    ]
+
+
+def test_repeated_merchant_corrections_become_an_alias(client: TestClient, session: Session):
+    budget = _budget(session)
+    for _ in range(2):
+        assert merchant_aliases(session, budget.id, ["LIDL SP Z O O"]) == {}
+        tx = _scanned(session, budget.id)
+        client.post(f"/api/transactions/{tx.id}/verify", json={"transaction_update": {"merchant_name": "Lidl"}})
+
+    assert merchant_aliases(session, budget.id, ["LIDL SP Z O O", "BIEDRONKA"]) == {"LIDL SP Z O O": "Lidl"}
+
+
+def test_category_set_at_verification_teaches_import_classifier(client: TestClient, session: Session):
+    budget = _budget(session)
+    food = Category(name="Food", budget_id=budget.id)
+    session.add(food)
+    session.commit()
+    tx = _scanned(session, budget.id, merchant="BIEDRONKA")
+    # The model is built while the receipt is still unverified and uncategorized
+    assert classify_descriptions(session, budget.id, ["BIEDRONKA"]) == {}
+
+    client.post(f"/api/transactions/{tx.id}/verify", json={"transaction_update": {"category_id": food.id}})
+
+    assert classify_descriptions(session, budget.id, ["BIEDRONKA"]) == {"BIEDRONKA": food.id}
+
+
+def test_deleting_verified_transaction_keeps_unlinked_corrections(client: TestClient, session: Session):
+    budget = _budget(session)
+    tx = _scanned(session, budget.id)
+    client.post(f"/api/transactions/{tx.id}/verify", json={"transaction_update": {"merchant_name": "Lidl"}})
+    session.exec(text("PRAGMA foreign_keys=ON"))  # enforced as on Postgres
+    try:
+        response = client.delete(f"/api/transactions/{tx.id}")
+    finally:
+        session.exec(text("PRAGMA foreign_keys=OFF"))
+
+    assert response.status_code in (200, 204)
+    rows = session.exec(select(VerificationCorrection)).all()
+    assert [(r.field, r.transaction_id) for r in rows] == [("merchant_name", None)]
+    assert merchant_aliases(session, budget.id, ["LIDL SP Z O O"]) == {}  # still counted, below the threshold
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.api import _run_receipt_pipeline
+from app.ocr_batcher import VisionBatcher, extract_ocr_batched
+from app.ocr_pipeline import VisionClientPool
+
+
+def _response(text: str, error: str = ""):
+    response = MagicMock()
+    response.error.message = error
+    response.full_text_annotation.text = text
+    response.full_text_annotation.pages = []
+    return response
+
+
+@pytest.fixture
+def vision_calls(monkeypatch):
+    """Fake Vision SDK: batch_annotate_images echoes each image's bytes as its text."""
+    calls: list[list[bytes]] = []
+    vision = MagicMock()
+    vision.Image.side_effect = lambda content: content
+    vision.AnnotateImageRequest.side_effect = lambda image, features: image
+
+    async def batch_annotate_images(requests):
+        calls.append(list(requests))
+        await asyncio.sleep(0)
+        return MagicMock(responses=[
+            _response("", error="bad image") if image == b"broken" else _response(image.decode())
+            for image in requests
+        ])
+
+    vision.ImageAnnotatorAsyncClient.return_value = MagicMock(batch_annotate_images=batch_annotate_images)
+    pool = VisionClientPool(size=1)
+    pool._vision, pool._loaded = vision, True
+    monkeypatch.setattr("app.ocr_batcher.vision_clients", pool)
+    return calls
+
+
+async def test_full_batch_is_sent_as_one_request(vision_calls):
+    batcher = VisionBatcher(max_batch_size=3, max_wait=10)
+
+    results = await asyncio.gather(*(batcher.submit(f"r{i}".encode()) for i in range(3)))
+
+    assert vision_calls == [[b"r0", b"r1", b"r2"]]
+    assert [r.raw_text for r in results] == ["r0", "r1", "r2"]
+
+
+async def test_partial_batch_flushed_after_max_wait(vision_calls):
+    batcher = VisionBatcher(max_batch_size=16, max_wait=0.01)
+
+    results = await asyncio.gather(batcher.submit(b"a"), batcher.submit(b"b"))
+
+    assert vision_calls == [[b"a", b"b"]]
+    assert [r.raw_text for r in results] == ["a", "b"]
+
+
+async def test_image_error_fails_only_its_job(vision_calls):
+    batcher = VisionBatcher(max_batch_size=2, max_wait=10)
+
+    ok, broken = await asyncio.gather(batcher.submit(b"ok"), batcher.submit(b"broken"), return_exceptions=True)
+
+    assert ok.raw_text == "ok"
+    assert isinstance(broken, RuntimeError)
+
+
+async def test_cancelled_job_is_not_sent(vision_calls):
+    batcher = VisionBatcher(max_batch_size=16, max_wait=0.01)
+    cancelled = asyncio.create_task(batcher.submit(b"timed-out"))
+    kept = asyncio.create_task(batcher.submit(b"kept"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert (await kept).raw_text == "kept"
+    assert vision_calls == [[b"kept"]]
+
+
+async def test_cache_hit_is_read_off_the_loop(vision_calls, monkeypatch):
+    readers = []
+    cache = MagicMock()
+    cache.get.side_effect = lambda h: readers.append(threading.current_thread()) or "cached"
+    monkeypatch.setattr("app.ocr_batcher.get_ocr_cache", lambda: cache)
+    monkeypatch.setattr("app.ocr_batcher.archive_ocr_result", lambda h, r: None)
+
+    result, cache_hit = await extract_ocr_batched(VisionBatcher(max_batch_size=2, max_wait=10), b"img")
+
+    assert (result, cache_hit) == ("cached", True)
+    assert readers and readers[0] is not threading.main_thread()
+    assert vision_calls == []
+
+
+@pytest.mark.parametrize("error, fallback", [
+    (RuntimeError("Google Vision error: bad image"), "ai_vision_fallback_for_upload"),
+    (ConnectionError("reset by peer"), "parse_receipt"),
+])
+async def test_batch_errors_take_the_single_image_fallbacks(tmp_path, error, fallback):
+    image = tmp_path / "receipt.jpg"
+    image.write_bytes(b"img")
+    executor = MagicMock(run=AsyncMock(return_value={"merchant_name": "Lidl"}))
+
+    with patch("app.api.get_vision_batcher", return_value=MagicMock()), \
+            patch("app.api.get_ocr_executor", return_value=executor), \
+            patch("app.api.extract_ocr_batched", new_callable=AsyncMock, side_effect=error):
+        data = await _run_receipt_pipeline(1, str(image), [])
+
+    # A transport error retries Vision; an image Vision rejected goes to AI vision, never back to Vision
+    (fn, *_), _ = executor.run.await_args
+    assert fn.__name__ == fallback
+    assert data == {"merchant_name": "Lidl"}
@@ -0,0 +1,87 @@
+import gzip
+import json
+import os
+import time
+from unittest.mock import patch
+
+from app.ocr_cache import OCRResultCache, decode_result, encode_result
+from app.ocr_pipeline import BoundingBox, OCRResult, OCRWord, OCRWordTable
+from app.services import AIService
+
+
+def _result(text: str = "LIDL") -> OCRResult:
+    return OCRResult(
+        words=[
+            OCRWord(text=text, bounding_box=BoundingBox(10, 20, 60, 32), confidence=0.98),
+            OCRWord(text="Suma", bounding_box=BoundingBox(10, 40, 50, 52)),
+        ],
+        raw_text=f"{text}\nSuma",
+        source_engine="google_vision_document",
+    )
+
+
+def test_encode_decode_roundtrip():
+    original = _result("Żabka")
+    assert decode_result(encode_result(original)) == original
+
+
+def test_decode_returns_word_table_and_reads_v1_rows():
+    assert isinstance(decode_result(encode_result(_result())).words, OCRWordTable)
+
+    v1 = {
+        "v": 1, "engine": "google_vision_document", "raw_text": "LIDL\nSuma",
+        "words": [["LIDL", 10, 20, 60, 32, 0.98], ["Suma", 10, 40, 50, 52, 1.0]],
+    }
+    assert decode_result(gzip.compress(json.dumps(v1).encode())) == _result()
+
+
+def test_get_miss_then_hit(tmp_path):
+    cache = OCRResultCache(str(tmp_path), max_bytes=1_000_000)
+    assert cache.get("abc") is None
+
+    cache.put("abc", _result())
+
+    assert cache.get("abc") == _result()
+    assert cache.stats()["entries"] == 1
+
+
+def test_corrupt_entry_is_dropped(tmp_path):
+    cache = OCRResultCache(str(tmp_path), max_bytes=1_000_000)
+    with open(os.path.join(tmp_path, "bad.ocr.json.gz"), "wb") as f:
+        f.write(b"not gzip")
+
+    assert cache.get("bad") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    entry_size = len(encode_result(_result("x" * 500)))
+    cache = OCRResultCache(str(tmp_path), max_bytes=int(entry_size * 2.5))
+
+    cache.put("old", _result("x" * 500))
+    cache.put("used", _result("x" * 500))
+    past = time.time() - 100
+    os.utime(os.path.join(tmp_path, "old.ocr.json.gz"), (past, past))
+    os.utime(os.path.join(tmp_path, "used.ocr.json.gz"), (past, past))
+    cache.get("used")  # touch → most recently used
+
+    cache.put("new", _result("x" * 500))
+
+    assert cache.get("old") is None
+    assert cache.get("used") is not None
+    assert cache.get("new") is not None
+
+
+@patch("app.services.AIService._ai_structurize")
+@patch("app.ocr_pipeline.GoogleVisionOCRService.__init__", return_value=None)
+@patch("app.ocr_pipeline.GoogleVisionOCRService.extract")
+def test_pipeline_reuses_cached_ocr_result(mock_extract, mock_init, mock_structurize):
+    mock_extract.return_value = OCRResult(words=[], raw_text="Sklep XYZ", source_engine="test")
+    mock_structurize.side_effect = lambda *a, **k: {"merchant_name": "Sklep XYZ", "total_amount": 3.50, "items": []}
+
+    first = AIService._run_ocr_pipeline(b"same_image_bytes")
+    second = AIService._run_ocr_pipeline(b"same_image_bytes")
+
+    mock_extract.assert_called_once()
+    assert first is not None and first["_ocr_cache"] == "miss"
+    assert second is not None and second["_ocr_cache"] == "hit"
@@ -0,0 +1,79 @@
+import asyncio
+import operator
+import time
+
+import pytest
+
+from app.ocr_executor import OCRExecutor
+
+
+@pytest.fixture(params=["process", "thread"])
+def executor(request):
+    ex = OCRExecutor(max_workers=1, mode=request.param)
+    yield ex
+    ex.shutdown()
+
+
+async def test_run_returns_result(executor: OCRExecutor):
+    assert await executor.run(operator.add, 2, 3) == 5
+
+
+async def test_timeout_raises(executor: OCRExecutor):
+    with pytest.raises(asyncio.TimeoutError):
+        await executor.run(time.sleep, 1, timeout=0.2)
+
+
+async def test_process_mode_kills_timed_out_task_and_recovers():
+    ex = OCRExecutor(max_workers=1, mode="process")
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await ex.run(time.sleep, 30, timeout=0.2)
+        # The only slot was freed by killing its process, so the next task runs right away
+        start = time.monotonic()
+        assert await ex.run(operator.mul, 6, 7, timeout=10) == 42
+        assert time.monotonic() - start < 10
+    finally:
+        ex.shutdown()
+
+
+async def test_process_mode_kills_task_when_caller_is_cancelled():
+    ex = OCRExecutor(max_workers=1, mode="process")
+    try:
+        task = asyncio.create_task(ex.run(time.sleep, 30))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not ex._slots
+    finally:
+        ex.shutdown()
+
+
+async def test_exception_in_task_is_raised(executor: OCRExecutor):
+    with pytest.raises(Exception):
+        await executor.run(operator.truediv, 1, 0)
+
+
+def test_unknown_mode_rejected():
+    with pytest.raises(ValueError):
+        OCRExecutor(max_workers=1, mode="fiber")
+
+
+async def test_process_mode_moves_large_payloads_without_blocking_the_loop():
+    ex = OCRExecutor(max_workers=1, mode="process")
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    tick_task = asyncio.create_task(ticker())
+    try:
+        payload = b"x" * 8_000_000  # far beyond the pipe buffer, both ways
+        assert await ex.run(bytes.upper, payload, timeout=30) == b"X" * 8_000_000
+        assert ticks > 1
+    finally:
+        tick_task.cancel()
+        ex.shutdown()
@@ -0,0 +1,210 @@
+import os
+from datetime import datetime, timezone
+
+from sqlmodel import Session, select
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.models import (
+    Budget, Category, ReceiptScan, ScanStatus, Transaction, TransactionLine, VerificationCorrection,
+)
+from app.ocr_cache import get_ocr_archive, get_ocr_cache
+from app.ocr_pipeline import BoundingBox, OCRResult, OCRWord
+from app.reparse import apply_parsed_receipt, reparse_scans
+
+LIDL_LINES = [
+    "LIDL sp. z o.o. sp.k.",
+    "2024-05-10",
+    "Mleko",
+    "3.49 3.49 C",
+    "Chleb",
+    "4.00 4.00 C",
+    "Suma PLN 7.49",
+]
+
+
+def _ocr(lines: list[str]) -> OCRResult:
+    words = [
+        OCRWord(text=line, bounding_box=BoundingBox(10, 30 * i, 200, 30 * i + 12))
+        for i, line in enumerate(lines)
+    ]
+    return OCRResult(words=words, raw_text="\n".join(lines), source_engine="test")
+
+
+def _scan(session: Session, content_hash: str, status: ScanStatus, validation_message=None, budget_id=None) -> ReceiptScan:
+    tx = Transaction(merchant_name="Lidl", total_amount=7.49, budget_id=budget_id)
+    session.add(tx)
+    session.commit()
+    session.refresh(tx)
+    assert tx.id is not None
+    session.add(TransactionLine(name="Mleko", price=3.49, transaction_id=tx.id))
+    scan = ReceiptScan(
+        transaction_id=tx.id, status=status, content_hash=content_hash, validation_message=validation_message,
+    )
+    session.add(scan)
+    session.commit()
+    session.refresh(scan)
+    return scan
+
+
+def test_dry_run_reports_transitions_without_writing(session: Session):
+    cache = get_ocr_cache()
+    assert cache is not None
+    cache.put("h1", _ocr(LIDL_LINES))
+    scan_id = _scan(session, "h1", ScanStatus.NEEDS_REVIEW, validation_message="RECEIPT_SUM_MISMATCH:4.00").id
+
+    report = reparse_scans(session)
+
+    assert report.scanned == 1
+    assert report.reparsed == 1
+    assert report.transitions["needs_review->clean"] == 1
+    assert report.applied == 0
+    scan = session.exec(select(ReceiptScan).where(ReceiptScan.id == scan_id)).one()
+    assert scan.validation_message == "RECEIPT_SUM_MISMATCH:4.00"
+
+
+def test_apply_rewrites_unverified_scan(session: Session):
+    cache = get_ocr_cache()
+    assert cache is not None
+    cache.put("h1", _ocr(LIDL_LINES))
+    scan_id = _scan(session, "h1", ScanStatus.NEEDS_REVIEW, validation_message="RECEIPT_SUM_MISMATCH:4.00").id
+
+    report = reparse_scans(session, apply=True, batch_size=1)
+
+    assert report.applied == 1
+    scan = session.exec(select(ReceiptScan).where(ReceiptScan.id == scan_id)).one()
+    assert scan.validation_message is None
+    assert scan.status == ScanStatus.NEEDS_REVIEW
+    lines = session.exec(select(TransactionLine).where(TransactionLine.transaction_id == scan.transaction_id)).all()
+    assert sorted(line.name for line in lines) == ["Chleb", "Mleko"]
+
+
+def test_verified_scan_is_never_applied(session: Session):
+    cache = get_ocr_cache()
+    assert cache is not None
+    cache.put("h1", _ocr(LIDL_LINES))
+    _scan(session, "h1", ScanStatus.CATEGORIZATION_OK)
+
+    report = reparse_scans(session, apply=True)
+
+    assert report.transitions["verified->clean"] == 1
+    assert report.applied == 0
+
+
+def test_skips_missing_ocr_and_unknown_merchants(session: Session):
+    cache = get_ocr_cache()
+    assert cache is not None
+    cache.put("unknown", _ocr(["Sklep XYZ", "Chleb 3.50"]))
+    _scan(session, "unknown", ScanStatus.NEEDS_REVIEW)
+    _scan(session, "evicted", ScanStatus.NEEDS_REVIEW)
+
+    report = reparse_scans(session, batch_size=1)
+
+    assert report.scanned == 2
+    assert report.skipped_no_parser == 1
+    assert report.skipped_no_ocr == 1
+
+
+def test_reparse_endpoint_scoped_to_budget(client: TestClient, session: Session):
+    budget = session.exec(select(Budget).where(Budget.name == "Domowy")).one()
+    other = Budget(name="Other")
+    session.add(other)
+    session.commit()
+    cache = get_ocr_cache()
+    assert cache is not None
+    cache.put("h1", _ocr(LIDL_LINES))
+    _scan(session, "h1", ScanStatus.FAILED, budget_id=budget.id)
+    _scan(session, "h1", ScanStatus.FAILED, budget_id=other.id)
+
+    response = client.post("/api/transactions/reparse")
+
+    assert response.status_code == 200
+    assert response.json()["scanned"] == 1
+    assert response.json()["transitions"] == {"failed->clean": 1}
+
+
+def test_reparse_endpoint_requires_stored_ocr(client: TestClient, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_CACHE_MAX_MB", 0)
+    monkeypatch.setattr(settings, "OCR_ARCHIVE_DIR", "")
+    response = client.post("/api/transactions/reparse")
+    assert response.status_code == 400
+
+
+def test_reparse_uses_archive_after_cache_eviction(session: Session):
+    archive = get_ocr_archive()
+    assert archive is not None
+    archive.put("h-archived", _ocr(LIDL_LINES))
+    _scan(session, "h-archived", ScanStatus.NEEDS_REVIEW, validation_message="RECEIPT_SUM_MISMATCH:4.00")
+
+    report = reparse_scans(session)
+
+    assert (report.reparsed, report.skipped_no_ocr) == (1, 0)
+
+
+def test_reparse_backfills_archive_from_cache(session: Session):
+    cache = get_ocr_cache()
+    assert cache is not None
+    cache.put("h-cached", _ocr(LIDL_LINES))
+    _scan(session, "h-cached", ScanStatus.NEEDS_REVIEW)
+
+    reparse_scans(session)
+    os.remove(cache._path("h-cached"))  # evicted
+
+    assert reparse_scans(session).reparsed == 1
+    assert get_ocr_archive().get("h-cached") is not None
+
+
+def test_apply_matches_a_fresh_scan(session: Session):
+    budget = Budget(name="Domowy")
+    session.add(budget)
+    session.commit()
+    assert budget.id is not None
+    food = Category(name="Food", budget_id=budget.id)
+    session.add(food)
+    verified = Transaction(merchant_name="Lidl", budget_id=budget.id)
+    session.add(verified)
+    session.commit()
+    session.add(ReceiptScan(transaction_id=verified.id, status=ScanStatus.CATEGORIZATION_OK))
+    session.add(TransactionLine(name="Chleb", price=4.0, transaction_id=verified.id, category_id=food.id))
+    for _ in range(settings.CORRECTION_ALIAS_MIN_COUNT):
+        session.add(VerificationCorrection(
+            budget_id=budget.id, field="merchant_name", original="LIDL SP Z O O", corrected="Lidl",
+        ))
+    session.commit()
+    scan = _scan(session, "h1", ScanStatus.FAILED, budget_id=budget.id)
+    tx = session.get(Transaction, scan.transaction_id)
+    assert tx is not None
+    data = {
+        "merchant_name": "LIDL SP Z O O",
+        "date": "2024-05-10",
+        "total_amount": 7.49,
+        "items": [{"name": "Mleko", "price": 3.49}, {"name": "Chleb", "price": 4.0}],
+        "_validation": {"is_valid": True, "issues": []},
+    }
+
+    assert apply_parsed_receipt(session, scan, tx, data, {food.name.lower(): food.id})
+
+    assert tx.merchant_name == "Lidl"
+    assert tx.date == datetime(2024, 5, 10, tzinfo=timezone.utc)
+    assert scan.status == ScanStatus.NEEDS_REVIEW
+    session.commit()
+    lines = session.exec(select(TransactionLine).where(TransactionLine.transaction_id == tx.id)).all()
+    assert {line.name: line.category_id for line in lines} == {"Mleko": None, "Chleb": food.id}
+
+
+def test_apply_keeps_lines_when_validation_fails(session: Session):
+    scan = _scan(session, "h1", ScanStatus.NEEDS_REVIEW)
+    tx = session.get(Transaction, scan.transaction_id)
+    assert tx is not None
+    data = {"merchant_name": "Lidl", "total_amount": 9.0, "items": [], "_validation": {"is_valid": False, "message": "NO_TOTAL"}}
+
+    assert not apply_parsed_receipt(session, scan, tx, data, {})
+
+    session.commit()
+    assert (scan.status, scan.validation_message, tx.total_amount) == (ScanStatus.FAILED, "NO_TOTAL", 9.0)
+    assert len(tx.lines) == 1
+
+
+def test_reparse_endpoint_bounds_batch_size(client: TestClient):
+    assert client.post("/api/transactions/reparse", params={"batch_size": 0}).status_code == 422
+    assert client.post("/api/transactions/reparse", params={"batch_size": 100_000}).status_code == 422
@@ -0,0 +1,331 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.config import settings
+from app.models import ReceiptScan, ScanStatus, Transaction
+from app.scan_queue import (
+    ScanQueueWorker, claim_scans, enqueue_scan, heartbeat, release, requeue, sweep_stale_scans,
+)
+
+
+def _queued_scan(session: Session, image_path: str = "/fake/receipt.jpg") -> ReceiptScan:
+    tx = Transaction(merchant_name="Processing...")
+    session.add(tx)
+    session.commit()
+    session.refresh(tx)
+    assert tx.id is not None
+    scan = ReceiptScan(transaction_id=tx.id, image_path=image_path)
+    enqueue_scan(session, scan)
+    session.commit()
+    session.refresh(scan)
+    return scan
+
+
+# ── claim ─────────────────────────────────────────────────────────────────────
+
+def test_claim_leases_queued_scan(session: Session):
+    scan = _queued_scan(session)
+
+    jobs = claim_scans(session, "worker-a", limit=5)
+
+    assert [j.scan_id for j in jobs] == [scan.id]
+    assert jobs[0].attempts == 1
+    session.refresh(scan)
+    assert scan.status == ScanStatus.RUNNING
+    assert scan.locked_by == "worker-a"
+    assert scan.lease_expires_at is not None
+
+
+def test_claimed_scan_is_not_claimed_twice(session: Session):
+    _queued_scan(session)
+
+    assert len(claim_scans(session, "worker-a", limit=5)) == 1
+    assert claim_scans(session, "worker-b", limit=5) == []
+
+
+def test_claim_respects_global_concurrency(session: Session, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_GLOBAL_CONCURRENCY", 2)
+    for _ in range(4):
+        _queued_scan(session)
+
+    assert len(claim_scans(session, "worker-a", limit=5)) == 2
+    # Second process sees both slots taken
+    assert claim_scans(session, "worker-b", limit=5) == []
+
+
+def test_claim_update_rechecks_global_cap(session: Session, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_GLOBAL_CONCURRENCY", 1)
+    for _ in range(2):
+        _queued_scan(session)
+    assert len(claim_scans(session, "worker-a", limit=1)) == 1
+
+    # worker-b counted before worker-a's claim committed
+    monkeypatch.setattr("app.scan_queue._leased_count", lambda session, now: 0)
+
+    assert claim_scans(session, "worker-b", limit=1) == []
+
+
+def test_cap_counts_scans_past_ocr(session: Session, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_GLOBAL_CONCURRENCY", 1)
+    first = _queued_scan(session)
+    _queued_scan(session)
+    claim_scans(session, "worker-a", limit=1)
+    session.refresh(first)
+    first.status = ScanStatus.OCR_OK
+    session.add(first)
+    session.commit()
+
+    assert claim_scans(session, "worker-b", limit=1) == []
+
+
+def test_sweep_requeues_scan_stuck_after_ocr(session: Session, tmp_path):
+    image = tmp_path / "receipt.jpg"
+    image.write_bytes(b"img")
+    scan = _queued_scan(session, image_path=str(image))
+    claim_scans(session, "dead-worker", limit=1)
+    session.refresh(scan)
+    scan.status = ScanStatus.PARSING_OK
+    session.add(scan)
+    session.commit()
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.OCR_QUEUE_LEASE_SECONDS + 1)
+    result = sweep_stale_scans(session, now=later)
+
+    assert (result.requeued, result.failed) == (1, 0)
+    session.refresh(scan)
+    assert scan.status == ScanStatus.QUEUED
+
+
+def test_expired_lease_is_reclaimed(session: Session):
+    scan = _queued_scan(session)
+    claim_scans(session, "worker-a", limit=1)
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.OCR_QUEUE_LEASE_SECONDS + 1)
+    jobs = claim_scans(session, "worker-b", limit=1, now=later)
+
+    assert [j.scan_id for j in jobs] == [scan.id]
+    assert jobs[0].attempts == 2
+    session.refresh(scan)
+    assert scan.locked_by == "worker-b"
+
+
+def test_exhausted_scan_is_failed_not_reclaimed(session: Session, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_QUEUE_MAX_ATTEMPTS", 1)
+    scan = _queued_scan(session)
+    claim_scans(session, "worker-a", limit=1)
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.OCR_QUEUE_LEASE_SECONDS + 1)
+    assert claim_scans(session, "worker-b", limit=1, now=later) == []
+
+    session.refresh(scan)
+    assert scan.status == ScanStatus.FAILED
+    assert scan.error_message == "max attempts exceeded"
+
+
+# ── heartbeat / release ───────────────────────────────────────────────────────
+
+def test_heartbeat_only_for_lease_owner(session: Session):
+    scan = _queued_scan(session)
+    claim_scans(session, "worker-a", limit=1)
+    assert scan.id is not None
+
+    assert heartbeat(session, [scan.id], "worker-a") == 1
+    assert heartbeat(session, [scan.id], "worker-b") == 0
+
+
+def test_release_keeps_terminal_status(session: Session):
+    scan = _queued_scan(session)
+    claim_scans(session, "worker-a", limit=1)
+    assert scan.id is not None
+    session.refresh(scan)
+    scan.status = ScanStatus.NEEDS_REVIEW
+    session.add(scan)
+    session.commit()
+
+    release(session, scan.id, "worker-a")
+
+    session.refresh(scan)
+    assert scan.status == ScanStatus.NEEDS_REVIEW
+    assert scan.locked_by is None
+
+
+def test_release_fails_scan_left_running(session: Session):
+    scan = _queued_scan(session)
+    claim_scans(session, "worker-a", limit=1)
+    assert scan.id is not None
+
+    release(session, scan.id, "worker-a", error_message="boom")
+
+    session.refresh(scan)
+    assert scan.status == ScanStatus.FAILED
+    assert scan.error_message == "boom"
+
+
+def test_requeue_returns_scan_to_queue(session: Session):
+    scan = _queued_scan(session)
+    claim_scans(session, "worker-a", limit=1)
+    assert scan.id is not None
+
+    requeue(session, [scan.id], "worker-a")
+
+    session.refresh(scan)
+    assert scan.status == ScanStatus.QUEUED
+    assert scan.locked_by is None
+
+
+# ── sweep_stale_scans ─────────────────────────────────────────────────────────
+
+def test_sweep_requeues_expired_lease_with_image(session: Session, tmp_path):
+    image = tmp_path / "receipt.jpg"
+    image.write_bytes(b"img")
+    scan = _queued_scan(session, image_path=str(image))
+    claim_scans(session, "dead-worker", limit=1)
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.OCR_QUEUE_LEASE_SECONDS + 1)
+    result = sweep_stale_scans(session, now=later)
+
+    assert (result.requeued, result.failed) == (1, 0)
+    session.refresh(scan)
+    assert scan.status == ScanStatus.QUEUED
+    assert scan.locked_by is None
+
+
+def test_sweep_fails_scans_with_missing_image(session: Session, tmp_path):
+    kept = tmp_path / "kept.jpg"
+    kept.write_bytes(b"img")
+    alive = _queued_scan(session, image_path=str(kept))
+    orphan = _queued_scan(session, image_path=str(tmp_path / "deleted.jpg"))
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.OCR_SWEEP_STALE_SECONDS + 1)
+    result = sweep_stale_scans(session, now=later)
+
+    assert (result.requeued, result.failed) == (1, 1)
+    session.refresh(alive)
+    session.refresh(orphan)
+    assert alive.status == ScanStatus.QUEUED
+    assert orphan.status == ScanStatus.FAILED
+    assert orphan.error_message is not None
+
+
+def test_sweep_recovers_legacy_running_without_lease(session: Session):
+    scan = _queued_scan(session, image_path="/gone/receipt.jpg")
+    scan.status = ScanStatus.RUNNING
+    session.add(scan)
+    session.commit()
+
+    later = datetime.now(timezone.utc) + timedelta(seconds=settings.OCR_SWEEP_STALE_SECONDS + 1)
+    result = sweep_stale_scans(session, now=later)
+
+    assert result.failed == 1
+    session.refresh(scan)
+    assert scan.status == ScanStatus.FAILED
+
+
+def test_sweep_leaves_fresh_and_leased_scans_alone(session: Session):
+    queued = _queued_scan(session)
+    running = _queued_scan(session)
+    claim_scans(session, "live-worker", limit=1)
+
+    result = sweep_stale_scans(session)
+
+    assert (result.requeued, result.failed) == (0, 0)
+    session.refresh(queued)
+    session.refresh(running)
+    assert {queued.status, running.status} == {ScanStatus.QUEUED, ScanStatus.RUNNING}
+
+
+# ── ScanQueueWorker ───────────────────────────────────────────────────────────
+
+@pytest.fixture(name="file_session")
+def file_session_fixture(tmp_path):
+    """
+    A file-backed database: the worker writes from threads, and the shared
+    in-memory connection of the default fixture cannot hold concurrent transactions.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+async def test_worker_runs_jobs_and_releases_leases(file_session: Session):
+    scans = [_queued_scan(file_session) for _ in range(3)]
+    handled: list[int] = []
+
+    async def handler(transaction_id: int, scan_id: int, image_path: str) -> None:
+        handled.append(scan_id)
+        with Session(file_session.get_bind()) as s:
+            scan = s.get(ReceiptScan, scan_id)
+            assert scan is not None
+            scan.status = ScanStatus.NEEDS_REVIEW
+            s.add(scan)
+            s.commit()
+
+    worker = ScanQueueWorker(handler, concurrency=2, engine=file_session.get_bind(), poll_interval=0.01)
+    task = asyncio.create_task(worker.run())
+    while len(handled) < 3:
+        await asyncio.sleep(0.01)
+    await worker.drain(timeout=1)
+    await task
+
+    assert sorted(handled) == sorted(s.id for s in scans)
+    for scan in scans:
+        file_session.refresh(scan)
+        assert scan.status == ScanStatus.NEEDS_REVIEW
+        assert scan.locked_by is None
+
+
+async def test_worker_drain_requeues_prefetched_and_unfinished(file_session: Session):
+    scans = [_queued_scan(file_session) for _ in range(3)]
+    started = asyncio.Event()
+
+    async def handler(transaction_id: int, scan_id: int, image_path: str) -> None:
+        started.set()
+        await asyncio.sleep(10)
+
+    worker = ScanQueueWorker(handler, concurrency=1, prefetch=2, engine=file_session.get_bind(), poll_interval=0.01)
+    task = asyncio.create_task(worker.run())
+    await started.wait()
+    assert len(worker.held_scan_ids) == 3
+
+    await worker.drain(timeout=0.05)
+    await task
+
+    for scan in scans:
+        file_session.refresh(scan)
+        assert scan.status == ScanStatus.QUEUED
+        assert scan.locked_by is None
+
+
+async def test_worker_stopped_mid_claim_hands_leases_back(file_session: Session):
+    scan = _queued_scan(file_session)
+    handled: list[int] = []
+
+    async def handler(transaction_id: int, scan_id: int, image_path: str) -> None:
+        handled.append(scan_id)
+
+    worker = ScanQueueWorker(handler, engine=file_session.get_bind(), poll_interval=0.01)
+    claiming, proceed = threading.Event(), threading.Event()
+    claim = worker._claim
+
+    def slow_claim(limit: int):
+        claiming.set()
+        proceed.wait(5)
+        return claim(limit)
+
+    worker._claim = slow_claim  # type: ignore[method-assign]
+    task = asyncio.create_task(worker.run())
+    await asyncio.to_thread(claiming.wait, 5)  # the claim runs off the loop
+    await worker.drain(timeout=1)
+    proceed.set()
+    await task
+
+    assert handled == []
+    file_session.refresh(scan)
+    assert scan.status == ScanStatus.QUEUED
+    assert scan.locked_by is None
@@ -1,16 +1,29 @@
+import asyncio
 import json
 import pytest
+from types import SimpleNamespace
+from typing import Optional
 from unittest.mock import MagicMock, patch, mock_open
 
 from app.services import AIService
 from app.ocr_pipeline import (
     BoundingBox,
+    AsyncGoogleVisionOCRService,
+    GoogleVisionOCRService,
+    MerchantDetector,
+    MerchantMatch,
     OCRWord,
+    OCRWordTable,
+    PDFTextLayerAdapter,
     ReceiptSource,
     ReceiptSourceDetector,
+    VisionClientPool,
     detect_merchant,
+    detect_merchant_match,
+    preprocess_image,
     reconstruct_lines,
 )
+from app.config import settings
 
 
 # ── Fixtures ──────────────────────────────────────────────────────────────────
@@ -91,6 +104,275 @@ def test_reconstruct_lines_empty():
     assert reconstruct_lines([]) == []
 
 
+def _reconstruct_lines_reference(words: list[OCRWord], y_tolerance: float) -> list[str]:
+    """Original quadratic implementation — the optimized version must match it exactly."""
+    sorted_words = sorted(words, key=lambda w: w.bounding_box.center_y)
+    lines: list[list[OCRWord]] = []
+    current_line: list[OCRWord] = []
+    current_y = None
+    for word in sorted_words:
+        cy = word.bounding_box.center_y
+        if current_y is None or abs(cy - current_y) <= y_tolerance:
+            current_line.append(word)
+            current_y = sum(w.bounding_box.center_y for w in current_line) / len(current_line)
+        else:
+            lines.append(sorted(current_line, key=lambda w: w.bounding_box.x_min))
+            current_line = [word]
+            current_y = cy
+    if current_line:
+        lines.append(sorted(current_line, key=lambda w: w.bounding_box.x_min))
+    return [" ".join(w.text for w in line) for line in lines]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_reconstruct_lines_matches_reference_on_long_receipt(seed):
+    import random
+    rng = random.Random(seed)
+    words = [
+        _make_word(f"w{i}", x=rng.uniform(0, 500), y=rng.randrange(60) * 14 + rng.uniform(-3, 3), h=rng.uniform(8, 12))
+        for i in range(700)
+    ]
+    for tol in (3.0, 5.0, 8.0):
+        assert reconstruct_lines(words, y_tolerance=tol) == _reconstruct_lines_reference(words, tol)
+
+
+def test_reconstruct_lines_reads_word_table_columns():
+    words = [
+        _make_word("Suma", x=10, y=40),
+        _make_word("PLN", x=60, y=41),
+        _make_word("LIDL", x=10, y=10),
+    ]
+    table = OCRWordTable.from_words(words)
+    assert reconstruct_lines(table) == reconstruct_lines(words) == ["LIDL", "Suma PLN"]
+
+
+# ── OCRWordTable ──────────────────────────────────────────────────────────────
+
+def test_word_table_yields_word_objects():
+    table = OCRWordTable()
+    table.append("Chleb", 10, 20, 60, 32, 0.5)
+    table.append("3,50", 200, 20, 240, 32)
+
+    assert len(table) == 2
+    assert table[-1] == OCRWord(text="3,50", bounding_box=BoundingBox(200, 20, 240, 32), confidence=1.0)
+    assert [w.text for w in table] == ["Chleb", "3,50"]
+    assert table.column(1).tolist() == [20.0, 20.0]
+    assert table == [OCRWord("Chleb", BoundingBox(10, 20, 60, 32), 0.5), OCRWord("3,50", BoundingBox(200, 20, 240, 32))]
+
+
+def test_word_table_slices_like_a_list():
+    words = [OCRWord(f"w{i}", BoundingBox(i, i, i + 1, i + 1), 0.5) for i in range(5)]
+    table = OCRWordTable.from_words(words)
+
+    assert isinstance(table[1:3], OCRWordTable)
+    assert table[1:3] == words[1:3]
+    assert table[::-2] == words[::-2]
+    assert table[-2:] == words[-2:]
+    assert len(table[10:]) == 0
+    with pytest.raises(IndexError):
+        table[5]
+
+
+def _vision_response(text: str = "Mleko"):
+    def vertex(x, y):
+        return MagicMock(x=x, y=y)
+
+    word = MagicMock(symbols=[MagicMock(text=text[:3]), MagicMock(text=text[3:])], confidence=0.9)
+    word.bounding_box.vertices = [vertex(12, 30), vertex(50, 31), vertex(51, 44), vertex(11, 43)]
+    response = MagicMock()
+    response.error.message = ""
+    response.full_text_annotation.text = text
+    response.full_text_annotation.pages = [MagicMock(blocks=[MagicMock(paragraphs=[MagicMock(words=[word])])])]
+    return response
+
+
+def test_vision_extract_fills_word_table():
+    service = GoogleVisionOCRService.__new__(GoogleVisionOCRService)
+    service._client = MagicMock(document_text_detection=MagicMock(return_value=_vision_response()))
+    service._vision = MagicMock()
+
+    result = service.extract(b"img")
+
+    assert isinstance(result.words, OCRWordTable)
+    assert result.words.texts == ["Mleko"]
+    assert result.words.coords.tolist()[:4] == [11.0, 30.0, 51.0, 44.0]
+
+
+# ── VisionClientPool ──────────────────────────────────────────────────────────
+
+@pytest.fixture
+def fake_vision_pool(monkeypatch):
+    vision = MagicMock()
+    vision.ImageAnnotatorClient.side_effect = lambda credentials=None: MagicMock(name="client")
+    pool = VisionClientPool(size=1)
+    pool._vision, pool._loaded = vision, True
+    monkeypatch.setattr("app.ocr_pipeline.vision_clients", pool)
+    return pool
+
+
+def test_vision_client_is_shared_across_services(fake_vision_pool):
+    first, second = GoogleVisionOCRService(), GoogleVisionOCRService()
+
+    assert first._client is second._client
+    assert fake_vision_pool.vision.ImageAnnotatorClient.call_count == 1
+
+
+def test_vision_client_rebuilt_after_transport_error(fake_vision_pool):
+    class ServiceUnavailable(Exception):
+        pass
+
+    service = GoogleVisionOCRService()
+    broken = service._client
+    broken.document_text_detection.side_effect = ServiceUnavailable("channel closed")
+
+    with pytest.raises(ServiceUnavailable):
+        service.extract(b"img")
+
+    assert GoogleVisionOCRService()._client is not broken
+
+
+def test_vision_client_kept_after_request_error(fake_vision_pool):
+    InvalidArgument = type("InvalidArgument", (Exception,), {"__module__": "google.api_core.exceptions"})
+    service = GoogleVisionOCRService()
+    healthy = service._client
+    healthy.document_text_detection.side_effect = InvalidArgument("Bad image data")
+
+    with pytest.raises(InvalidArgument):
+        service.extract(b"img")
+
+    assert GoogleVisionOCRService()._client is healthy
+
+
+def test_transport_error_classification():
+    from app.ocr_pipeline import is_transport_error
+    DeadlineExceeded = type("DeadlineExceeded", (Exception,), {"__module__": "google.api_core.exceptions"})
+    PermissionDenied = type("PermissionDenied", (Exception,), {"__module__": "google.api_core.exceptions"})
+
+    def rpc_error(code_name):
+        return type("_InactiveRpcError", (Exception,), {
+            "__module__": "grpc._channel", "code": lambda self: SimpleNamespace(name=code_name),
+        })()
+
+    assert is_transport_error(DeadlineExceeded())
+    assert is_transport_error(ConnectionResetError())
+    assert is_transport_error(rpc_error("UNAVAILABLE"))
+    assert not is_transport_error(PermissionDenied())
+    assert not is_transport_error(rpc_error("INVALID_ARGUMENT"))
+    assert not is_transport_error(ValueError("bad"))
+
+
+async def test_async_vision_extract_uses_loop_client(fake_vision_pool):
+    async_client = MagicMock()
+
+    async def batch_annotate_images(requests):
+        return MagicMock(responses=[_vision_response("Maslo")])
+
+    async_client.batch_annotate_images.side_effect = batch_annotate_images
+    fake_vision_pool.vision.ImageAnnotatorAsyncClient.return_value = async_client
+
+    results = await asyncio.gather(*(AsyncGoogleVisionOCRService().extract(b"img") for _ in range(3)))
+
+    assert [r.raw_text for r in results] == ["Maslo"] * 3
+    assert fake_vision_pool.vision.ImageAnnotatorAsyncClient.call_count == 1
+
+# ── preprocess_image ──────────────────────────────────────────────────────────
+
+def _photo_bytes(width: int, height: int, orientation: int = 1) -> bytes:
+    Image = pytest.importorskip("PIL.Image")
+    import io
+    img = Image.new("RGB", (width, height), (200, 180, 160))
+    exif = img.getexif()
+    exif[0x0112] = orientation
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=100, exif=exif)
+    return out.getvalue()
+
+
+def test_preprocess_image_rotates_downscales_and_grayscales(monkeypatch):
+    from PIL import Image
+    import io
+    monkeypatch.setattr(settings, "OCR_PREPROCESS_MIN_BYTES", 0)
+    monkeypatch.setattr(settings, "OCR_PREPROCESS_MAX_PIXELS", 300 * 400)
+    original = _photo_bytes(800, 600, orientation=6)  # stored landscape, displayed portrait
+
+    processed = preprocess_image(original)
+
+    assert len(processed) < len(original)
+    img = Image.open(io.BytesIO(processed))
+    assert img.mode == "L"
+    assert img.width < img.height
+    assert img.width * img.height <= 300 * 400
+
+
+def test_preprocess_image_keeps_small_or_undecodable_input(monkeypatch):
+    small = _photo_bytes(40, 40)
+    assert preprocess_image(small) is small
+
+    monkeypatch.setattr(settings, "OCR_PREPROCESS_MIN_BYTES", 0)
+    assert preprocess_image(b"not an image") == b"not an image"
+
+# ── PDFTextLayerAdapter ───────────────────────────────────────────────────────
+
+def _text_pdf(rows: list[tuple[float, float, float, str]], width: int = 300, height: int = 500) -> bytes:
+    """Minimal one-page PDF; rows are (x, baseline_y, font_size, text) in PDF user space."""
+    content = "".join(f"BT /F1 {size} Tf {x} {y} Td ({text}) Tj ET\n" for x, y, size, text in rows).encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] /Contents 4 0 R "
+        f"/Resources << /Font << /F1 5 0 R >> >> >>".encode(),
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+_E_RECEIPT_ROWS = [
+    (20, 450, 12, "Sklep XYZ"),
+    (20, 420, 10, "Chleb"),
+    (200, 420, 10, "3,50"),
+    (20, 400, 10, "SUMA PLN 3,50"),
+]
+
+
+def test_pdf_text_layer_words_reconstruct_lines():
+    result = PDFTextLayerAdapter.extract(_text_pdf(_E_RECEIPT_ROWS))
+
+    assert result is not None
+    assert result.source_engine == "pdf_text_layer"
+    assert reconstruct_lines(result.words) == ["Sklep XYZ", "Chleb 3,50", "SUMA PLN 3,50"]
+    first = result.words[0]
+    assert first.bounding_box.y_max == pytest.approx(500 - 450)
+    assert first.bounding_box.height == pytest.approx(12)
+
+
+def test_pdf_without_text_layer_returns_none():
+    assert PDFTextLayerAdapter.extract(_text_pdf([])) is None
+
+
+@patch("app.services.AIService._ai_structurize")
+@patch("app.ocr_pipeline.GoogleVisionOCRService.extract")
+def test_parse_receipt_reads_pdf_text_layer_without_ocr(mock_extract, mock_structurize, tmp_path):
+    pdf = tmp_path / "e-receipt.pdf"
+    pdf.write_bytes(_text_pdf(_E_RECEIPT_ROWS))
+    mock_structurize.return_value = {"merchant_name": "Sklep XYZ", "total_amount": 3.5, "items": []}
+
+    result = AIService.parse_receipt(str(pdf))
+
+    assert result is not None
+    mock_extract.assert_not_called()
+    assert mock_structurize.call_args[0][0] == "Sklep XYZ\nChleb 3,50\nSUMA PLN 3,50"
+
+
 # ── detect_merchant ───────────────────────────────────────────────────────────
 
 def test_detect_merchant_lidl():
@@ -113,6 +395,74 @@ def test_detect_merchant_unknown():
     assert detect_merchant(lines) is None
 
 
+def test_detect_merchant_match_reports_confidence_and_signature():
+    match = detect_merchant_match(["Jeronimo Martins Polska S.A.", "BIEDRONKA 1234"])
+    assert match == MerchantMatch("biedronka", 1.0, r"Jeronimo\s+Martins")
+
+    single = detect_merchant_match(["Lidl Plus voucher -2.00"])
+    assert single is not None and single.confidence == 0.5
+
+
+def test_detect_merchant_conflicting_signatures_lower_confidence():
+    match = detect_merchant_match(["BIEDRONKA", "Jeronimo Martins", "AUCHAN"])
+    assert match is not None
+    assert match.merchant == "biedronka"
+    assert match.confidence == pytest.approx(2 / 3)
+
+
+def test_merchant_detector_agrees_with_naive_scan_on_many_merchants():
+    import random
+    import re
+    import string
+
+    rng = random.Random(7)
+    signatures = {}
+    for i in range(200):
+        name = "".join(rng.choice(string.ascii_uppercase) for _ in range(7))
+        signatures[f"m{i}"] = [rf"{name}\s+sp\.?\s*z\s*o\.?\s*o\.", rf"ul\.\s*{name.title()}\s+\d+"]
+    detector = MerchantDetector(signatures)
+    names = list(signatures)
+    for merchant in rng.sample(names, 20) + [None]:
+        header = ["PARAGON FISKALNY", "NIP 123-456-78-90"]
+        if merchant:
+            literal = signatures[merchant][0].split("\\")[0]
+            header.insert(0, f"{literal} sp. z o.o.")
+        naive = next((m for m, ps in signatures.items() if any(re.search(p, "\n".join(header), re.I) for p in ps)), None)
+        match = detector.detect(header)
+        assert (match.merchant if match else None) == naive == merchant
+
+
+@patch("app.services.AIService._ai_structurize_lines")
+def test_parse_lines_dispatches_biedronka_to_registered_parser(mock_structurize):
+    lines = [
+        "JERONIMO MARTINS POLSKA S.A.", "BIEDRONKA NR 3312", "2025-03-02", "PARAGON FISKALNY",
+        "Chleb Baltonowski C 1 x4,29 4,29C", "Mleko UHT 3,2% 1L C 2 x3,49 6,98C", "SUMA PLN 11,27",
+    ]
+
+    data = AIService.parse_lines(lines, use_ai=False)
+
+    mock_structurize.assert_not_called()
+    assert data is not None
+    assert data["merchant_name"] == "Biedronka"
+    assert data["total_amount"] == 11.27
+    assert data["_validation"]["is_valid"] is True
+
+
+@patch("app.services.AIService._ai_structurize_lines")
+def test_parse_lines_falls_back_to_ai_when_parser_finds_no_items(mock_structurize):
+    lines = ["JERONIMO MARTINS POLSKA S.A.", "BIEDRONKA NR 3312", "2025-03-02", "PARAGON FISKALNY", "SUMA PLN 11,27"]
+    mock_structurize.return_value = {
+        "merchant_name": "Biedronka", "total_amount": 11.27, "currency": "PLN",
+        "items": [{"name": "Chleb", "price": 11.27, "quantity": 1.0, "category": None}],
+    }
+
+    data = AIService.parse_lines(lines)
+
+    mock_structurize.assert_called_once_with(lines, None)
+    assert data is not None
+    assert len(data["items"]) == 1
+
+
 # ── AIService.parse_receipt ───────────────────────────────────────────────────
 
 @patch("builtins.open", mock_open(read_data=b"fake_image_bytes"))
@@ -160,6 +510,54 @@ def test_parse_receipt_falls_back_to_ai_vision_when_ocr_unavailable(mock_extract
     mock_fallback.assert_called_once()
 
 
+def _fake_window_structurize(text: str, categories=None, fragment: bool = False) -> dict:
+    """Stands in for the model: one item per numbered line, total only where SUMA appears."""
+    items, total = [], None
+    for row in text.splitlines():
+        number, _, content = row.partition("| ")
+        if content.startswith("SUMA"):
+            total = float(content.split()[-1])
+        else:
+            items.append({"name": content, "price": 1.0, "quantity": 1, "line": int(number)})
+    return {"merchant_name": "Hiper" if "0| Hiper" in text else None, "date": None, "total_amount": total, "items": items}
+
+
+@patch("app.services.AIService._ai_structurize", side_effect=_fake_window_structurize)
+def test_long_receipt_structured_in_windows_without_overlap_duplicates(mock_structurize, monkeypatch):
+    monkeypatch.setattr(settings, "AI_STRUCTURIZE_WINDOW_LINES", 60)
+    monkeypatch.setattr(settings, "AI_STRUCTURIZE_OVERLAP_LINES", 4)
+    lines = ["Hiper"] + [f"Produkt {i}" for i in range(1, 149)] + ["SUMA 148.0"]
+
+    data = AIService._ai_structurize_lines(lines)
+
+    assert mock_structurize.call_count == 3
+    assert all(call.kwargs["fragment"] for call in mock_structurize.call_args_list)
+    assert [item["name"] for item in data["items"]] == lines[:-1]
+    assert "line" not in data["items"][0]
+    assert (data["merchant_name"], data["total_amount"]) == ("Hiper", 148.0)
+
+
+@patch("app.services.AIService._ai_structurize")
+def test_short_receipt_structured_in_one_call(mock_structurize):
+    AIService._ai_structurize_lines(["Sklep", "Chleb 3,50", "SUMA 3,50"])
+    mock_structurize.assert_called_once_with("Sklep\nChleb 3,50\nSUMA 3,50", None)
+
+
+@patch("app.services.AIService._ai_structurize")
+@patch("app.services.client.chat.completions.create")
+def test_ai_vision_fallback_transcribes_whole_image_then_parses_lines(mock_create, mock_structurize):
+    message = MagicMock()
+    message.content = json.dumps({"lines": ["Sklep XYZ", "Chleb 3,50", "SUMA PLN 3,50"]})
+    mock_create.return_value = MagicMock(choices=[MagicMock(message=message)])
+    mock_structurize.return_value = {"merchant_name": "Sklep XYZ", "total_amount": 3.5, "items": []}
+
+    data = AIService._ai_vision_fallback(b"image")
+
+    assert mock_create.call_count == 1
+    mock_structurize.assert_called_once_with("Sklep XYZ\nChleb 3,50\nSUMA PLN 3,50", None)
+    assert data is not None and "_validation" in data
+
+
 @patch("app.services.client.chat.completions.create")
 def test_ai_structurize_includes_categories_in_prompt(mock_create, ai_response):
     mock_create.return_value = ai_response
@@ -187,26 +585,266 @@ def test_ai_structurize_empty_response_returns_none(mock_create):
     assert not result
 
 
-# ── AIService.categorize_descriptions ────────────────────────────────────────
+# ── AsyncAIService ────────────────────────────────────────────────────────────
 
-@patch("app.services.client.chat.completions.create")
-def test_categorize_descriptions_success(mock_create):
-    msg = MagicMock()
-    msg.content = json.dumps({"BIEDRONKA": "Food", "ALLEGRO": "Shopping"})
-    choice = MagicMock()
-    choice.message = msg
-    resp = MagicMock()
-    resp.choices = [choice]
-    mock_create.return_value = resp
+class _FakeAsyncOpenAI:
+    """Records concurrency and timeouts; replies with {description: "Food"}."""
+
+    def __init__(self, **kwargs):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.timeouts: list[float] = []
+        self.chat = MagicMock()
+        self.chat.completions.create = self.create
+
+    async def create(self, timeout, **request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.timeouts.append(timeout)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        descriptions = request["messages"][1]["content"].split("\n")
+        message = MagicMock(content=json.dumps({d: "Food" for d in descriptions}))
+        return MagicMock(choices=[MagicMock(message=message)])
+
+
+async def test_async_categorize_bounds_concurrency_and_applies_timeout(monkeypatch):
+    from app.services import AsyncAIService
+    clients: list[_FakeAsyncOpenAI] = []
+    monkeypatch.setattr("app.services.AsyncOpenAI", lambda **kw: clients.append(_FakeAsyncOpenAI(**kw)) or clients[-1])
+    monkeypatch.setattr(settings, "AI_MAX_CONCURRENCY", 2)
+
+    monkeypatch.setattr(settings, "AI_CATEGORIZE_CONCURRENCY", 5)
+
+    mapping = await AsyncAIService.categorize_many([f"SHOP {i}" for i in range(5)], [{"id": 1, "name": "Food"}], batch_size=1)
+
+    assert mapping == {f"SHOP {i}": "Food" for i in range(5)}
+    assert len(clients) == 1  # one pooled client per loop
+    assert clients[0].max_in_flight == 2
+    assert clients[0].timeouts == [settings.AI_TIMEOUT_CATEGORIZE_SECONDS] * 5
+
+
+_real_sleep = asyncio.sleep
+
+
+@pytest.fixture
+def backoffs(monkeypatch) -> list[int]:
+    """Replaces the retry pause; records the attempt number of each one."""
+    attempts: list[int] = []
+
+    async def backoff(attempt):
+        attempts.append(attempt)
+        await _real_sleep(0)
+
+    monkeypatch.setattr("app.services._retry_backoff", backoff)
+    return attempts
+
+
+async def test_categorize_many_runs_batches_concurrently_and_retries_failed_only(monkeypatch, backoffs):
+    from app.services import AsyncAIService
+    monkeypatch.setattr(settings, "AI_CATEGORIZE_CONCURRENCY", 3)
+    monkeypatch.setattr(settings, "AI_CATEGORIZE_RETRIES", 1)
+    calls: list[str] = []
+    in_flight = {"now": 0, "max": 0}
+
+    async def batch(descriptions, categories):
+        calls.append(descriptions[0])
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await _real_sleep(0)
+        in_flight["now"] -= 1
+        if descriptions[0] == "D100" and calls.count("D100") == 1:
+            raise TimeoutError("first attempt times out")
+        return {d: "Food" for d in descriptions}
+
+    monkeypatch.setattr(AsyncAIService, "_categorize_batch", staticmethod(batch))
+    descriptions = [f"D{i}" for i in range(120)]
+
+    mapping = await AsyncAIService.categorize_many(descriptions, [], batch_size=50)
+
+    assert mapping == {d: "Food" for d in descriptions}
+    assert sorted(calls) == ["D0", "D100", "D100", "D50"]
+    assert in_flight["max"] == 3
+
+
+async def test_categorize_many_leaves_out_exhausted_batch(monkeypatch, backoffs):
+    from app.services import AsyncAIService
+    monkeypatch.setattr(settings, "AI_CATEGORIZE_RETRIES", 1)
+
+    async def batch(descriptions, categories):
+        if "BAD" in descriptions:
+            raise ValueError("broken JSON")
+        return {d: "Food" for d in descriptions}
+
+    monkeypatch.setattr(AsyncAIService, "_categorize_batch", staticmethod(batch))
+
+    mapping = await AsyncAIService.categorize_many(["OK", "BAD"], [], batch_size=1)
+
+    assert mapping == {"OK": "Food"}
+    assert backoffs == [0]  # no pause after the last attempt
+
+
+# ── Bank statement extraction ─────────────────────────────────────────────────
+
+def _statement(n: int) -> str:
+    lines = ["Wyciąg z rachunku", "Saldo początkowe 1 000,00"]
+    for i in range(n):
+        lines += [f"{i % 28 + 1:02d}.03.2025 Płatność kartą", f"SKLEP {i}", f"-{i + 1},00 PLN"]
+    return "\n".join(lines)
+
+
+def test_bank_statement_request_is_not_truncated():
+    from app.services import _bank_statement_request
+    text = _statement(1000)
+    assert len(text) > 30000
+
+    whole, chunk = _bank_statement_request(text), _bank_statement_request(text, fragment=True)
+
+    assert whole["messages"][1]["content"] == text
+    assert "FRAGMENT" not in whole["messages"][0]["content"]
+    assert '"line": N' in chunk["messages"][0]["content"]
+
+
+def test_statement_chunks_cut_at_transaction_starts(monkeypatch):
+    from app.services import AIService
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_CHUNK_CHARS", 200)
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_OVERLAP_LINES", 1)
+    text = _statement(40)
+    lines = text.splitlines()
+
+    cores, texts = AIService._statement_chunks(text)
+
+    assert len(cores) > 5
+    assert cores[0][0] == 0 and cores[-1][1] == len(lines)
+    assert all(a[1] == b[0] for a, b in zip(cores, cores[1:]))  # contiguous, nothing dropped
+    assert all(lines[start].endswith("Płatność kartą") for start, _ in cores[1:])
+    assert all(sum(len(line) + 1 for line in lines[start:end]) <= 200 for start, end in cores)
+    assert texts[1].splitlines()[0] == f"{cores[1][0] - 1}| {lines[cores[1][0] - 1]}"
+
+
+def _choice(transactions: list[dict], finish_reason: str = "stop") -> SimpleNamespace:
+    content = json.dumps({"transactions": transactions})
+    return SimpleNamespace(finish_reason=finish_reason, message=SimpleNamespace(content=content))
+
+
+def _tx(amount: float, line: Optional[int] = None) -> dict:
+    tx = {"date": "2025-03-01", "merchant": "SKLEP", "amount": amount}
+    if line is not None:
+        tx["line"] = line
+    return tx
+
+
+def test_merge_statement_chunks_drops_overlap_duplicates():
+    from app.services import AIService
+    parts = [
+        [_tx(-1.0, 1), _tx(-2.0, 4), _tx(-3.0)],
+        [_tx(-2.0, 4), _tx(-3.0, 5), _tx(-9.0)],
+        [_tx(-9.0), _tx(-9.0), "junk"],
+    ]
+
+    merged = AIService._merge_statement_chunks(parts, [(0, 5), (5, 10), (10, 15)])
+
+    # -2.0 belongs to the first chunk; -3.0 was read by both (unnumbered, then owned);
+    # one of the unnumbered -9.0 was read twice from the overlap
+    assert [t["amount"] for t in merged] == [-1.0, -2.0, -3.0, -3.0, -9.0, -9.0]
+    assert all("line" not in t for t in merged)
+
+
+async def test_async_bank_statement_chunks_run_concurrently_and_merge_in_order(monkeypatch):
+    from app.services import AsyncAIService
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_CHUNK_CHARS", 2000)
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_OVERLAP_LINES", 3)
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_CONCURRENCY", 3)
+    in_flight = {"now": 0, "max": 0}
+    requests: list[str] = []
+
+    async def complete(request, timeout):
+        """Every transaction fully visible in the chunk, overlap included."""
+        text = request["messages"][1]["content"]
+        requests.append(text)
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await _real_sleep(0.01)
+        in_flight["now"] -= 1
+        numbered = [line.partition("| ") for line in text.splitlines()]
+        found = [
+            {"line": int(n), "date": body[:10], "merchant": numbered[i + 1][2], "amount": numbered[i + 2][2][:-4]}
+            for i, (n, _, body) in enumerate(numbered)
+            if body.endswith("Płatność kartą") and i + 2 < len(numbered)
+        ]
+        return _choice(found)
+
+    monkeypatch.setattr("app.services._acomplete_choice", complete)
+
+    rows = await AsyncAIService.parse_bank_statement_text(_statement(1000))
+
+    assert [r["merchant"] for r in rows] == [f"SKLEP {i}" for i in range(1000)]
+    assert len(requests) > 10
+    assert in_flight["max"] == 3
+
+
+async def test_async_bank_statement_retries_failed_chunk_only(monkeypatch, backoffs):
+    from app.services import AsyncAIService
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_CHUNK_CHARS", 200)
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_RETRIES", 1)
+    calls: list[str] = []
+
+    async def chunk(text, fragment):
+        calls.append(text)
+        if len(calls) == 2:
+            raise TimeoutError("slow")
+        return [_tx(-float(text.partition("|")[0]))]
+
+    monkeypatch.setattr(AsyncAIService, "_extract_statement_chunk", staticmethod(chunk))
+
+    rows = await AsyncAIService.parse_bank_statement_text(_statement(20))
+
+    assert len(calls) == len(set(calls)) + 1  # one chunk sent twice
+    assert len(rows) == len(set(calls))
+    assert backoffs == [0]
+
+
+async def test_async_bank_statement_fails_when_a_chunk_is_given_up(monkeypatch, backoffs):
+    from app.services import AsyncAIService, BankStatementError
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_CHUNK_CHARS", 200)
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_RETRIES", 1)
+
+    async def chunk(text, fragment):
+        if text.startswith("0|"):
+            raise ValueError("broken JSON")
+        return [_tx(-1.0)]
+
+    monkeypatch.setattr(AsyncAIService, "_extract_statement_chunk", staticmethod(chunk))
+
+    with pytest.raises(BankStatementError):
+        await AsyncAIService.parse_bank_statement_text(_statement(20))
+    assert backoffs == [0]  # no pause after the last attempt
+
+
+@pytest.mark.parametrize("chunk_chars", [200, 100_000])
+async def test_async_bank_statement_splits_truncated_chunk(monkeypatch, chunk_chars):
+    from app.services import AsyncAIService
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_CHUNK_CHARS", chunk_chars)
+    monkeypatch.setattr(settings, "AI_BANK_STATEMENT_OVERLAP_LINES", 0)
+    sizes: list[int] = []
 
-    result = AIService.categorize_descriptions(
-        ["BIEDRONKA", "ALLEGRO"],
-        [{"id": 1, "name": "Food"}, {"id": 2, "name": "Shopping"}],
-    )
-    assert result["BIEDRONKA"] == "Food"
-    assert result["ALLEGRO"] == "Shopping"
+    async def complete(request, timeout):
+        """Responses for more than 3 transactions run into max_tokens."""
+        text = request["messages"][1]["content"]
+        rows = [line for line in text.splitlines() if line.endswith("Płatność kartą")]
+        sizes.append(len(rows))
+        if len(rows) > 3:
+            return _choice([], finish_reason="length")
+        numbered = [line.partition("| ") for line in text.splitlines()]
+        return _choice([
+            {"line": int(n), "date": body[:10], "merchant": numbered[i + 1][2], "amount": -1.0}
+            for i, (n, _, body) in enumerate(numbered) if body.endswith("Płatność kartą")
+        ])
 
+    monkeypatch.setattr("app.services._acomplete_choice", complete)
+
+    rows = await AsyncAIService.parse_bank_statement_text(_statement(20))
+
+    assert [r["merchant"] for r in rows] == [f"SKLEP {i}" for i in range(20)]
+    assert max(sizes) > 3
 
-def test_categorize_descriptions_empty():
-    result = AIService.categorize_descriptions([], [{"id": 1, "name": "Food"}])
-    assert result == {}